@@ -0,0 +1,127 @@
+"""
+Trading loop jitter with the gui control plane inline vs on its own thread,
+with and without dashboard load.
+
+    python bench_control_plane.py [seconds] [markets]
+
+No exchange connection: gui's trading-side components run against
+synthetic position/book churn, and a separate process plays the dashboard
+load (tabs following /ws/status plus clients polling /api/status as fast as
+they can). Jitter is LoopLagMonitor's lag on the trading loop.
+"""
+import asyncio
+import multiprocessing
+import random
+import sys
+import time
+
+import aiohttp
+
+import gui
+from control_plane import ControlPlane
+from metrics import LoopLagMonitor
+
+HOST = "127.0.0.1"
+TABS = 8
+POLLERS = 4
+
+
+# ----------------------------------------------------
+# Dashboard load (runs in its own process)
+# ----------------------------------------------------
+async def _load(port: int, seconds: float) -> None:
+    base = f"http://{HOST}:{port}"
+    stop_at = time.monotonic() + seconds
+
+    async def tab(session):
+        async with session.ws_connect(f"{base}/ws/status") as ws:
+            while time.monotonic() < stop_at:
+                try:
+                    await asyncio.wait_for(ws.receive(), 0.5)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def poller(session):
+        while time.monotonic() < stop_at:
+            async with session.get(f"{base}/api/status") as r:
+                await r.read()
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*[tab(session) for _ in range(TABS)],
+                             *[poller(session) for _ in range(POLLERS)])
+
+
+def _load_process(port: int, seconds: float) -> None:
+    asyncio.run(_load(port, seconds))
+
+
+# ----------------------------------------------------
+# Trading side
+# ----------------------------------------------------
+def setup_markets(n: int) -> None:
+    names = [f"M{i:03d}" for i in range(n)]
+    gui.haorzhe.domain_metadata["Markets Metadata"] = [
+        {"name": m, "base": m.lower(), "quote": "QTC", "flat_fee": 0,
+         "taker_fee": 0, "maker_fee": 0, "fee_denom": 1}
+        for m in names
+    ]
+    gui.registry.refresh()
+    gui.markets[:] = names
+    for m in names:
+        gui.configs[m] = gui.MarketConfig(fair=50, spread=4, position_ub=10, position_lb=-10, quoting=True)
+
+
+async def churn(rate: float = 200) -> None:
+    """Position and book updates, as the trading loop would see them."""
+    rng = random.Random(1)
+    while True:
+        m = rng.choice(gui.markets)
+        gui.haorzhe.positions[f"{m.lower()}:main"] = rng.randint(-10, 10)
+        gui.ledger.refresh()
+        gui.publisher.mark(m)
+        await asyncio.sleep(1 / rate)
+
+
+async def measure(mode: str, loaded: bool, seconds: float, port: int) -> dict:
+    gui.control_plane = ControlPlane(gui.build_web_app, HOST, port, threaded=mode == "thread")
+    monitor = LoopLagMonitor(interval=0.005)
+    tasks = [
+        asyncio.create_task(gui.publisher.run()),
+        asyncio.create_task(gui.commands.serve()),
+        asyncio.create_task(churn()),
+    ]
+    await gui.control_plane.start()
+    proc = None
+    if loaded:
+        proc = multiprocessing.get_context("spawn").Process(target=_load_process, args=(port, seconds + 1))
+        proc.start()
+        await asyncio.sleep(1)      # let the load process connect
+    monitor.start()
+    await asyncio.sleep(seconds)
+    await monitor.stop()
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if proc is not None:
+        await asyncio.to_thread(proc.join)
+    await gui.control_plane.stop()
+    return monitor.lag.snapshot()
+
+
+async def main(seconds: float, n_markets: int) -> None:
+    setup_markets(n_markets)
+    print(f"{n_markets} markets, {TABS} tabs + {POLLERS} /api/status pollers when loaded, {seconds}s each")
+    print(f"{'mode':8} {'load':9} {'p50 us':>9} {'p99 us':>9} {'max us':>9}")
+    port = 8765
+    for mode in ("inline", "thread"):
+        for loaded in (False, True):
+            lag = await measure(mode, loaded, seconds, port)
+            port += 1
+            print(f"{mode:8} {'loaded' if loaded else 'unloaded':9} {lag['p50']:9.1f} {lag['p99']:9.1f} {lag['max']:9.1f}")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    n_markets = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(seconds, n_markets))
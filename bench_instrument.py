@@ -0,0 +1,75 @@
+"""
+Per-sample cost of instrument.py, against the 1µs budget.
+
+    python bench_instrument.py
+
+Times N calls of a trivial sync and async method on an OracleClient, bare
+and wrapped by Instrumentation, and LatencyHistogram.record() on its own,
+best of REPEATS. The difference is what instrumenting a call adds; every
+timed order call also settles a pending book update (tick-to-trade).
+"""
+import asyncio
+import time
+
+from huqt_oracle_pysdk import OracleClient
+
+from instrument import Instrumentation
+from metrics import LatencyHistogram
+
+N = 200_000
+REPEATS = 5
+BUDGET_NS = 1_000
+
+
+class _Client(OracleClient):
+    # Trivial stand-ins, so only the wrapper is measured
+    def get_self_positions(self):
+        return None
+
+    async def cancel_order(self, market, order_id):
+        return None
+
+
+def per_call_ns(fn) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter_ns()
+        for _ in range(N):
+            fn()
+        best = min(best, (time.perf_counter_ns() - start) / N)
+    return best
+
+
+async def per_await_ns(fn, ticks: dict) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter_ns()
+        for _ in range(N):
+            ticks["HRVD"] = time.perf_counter_ns()
+            await fn("HRVD", 1)
+        best = min(best, (time.perf_counter_ns() - start) / N)
+    return best
+
+
+def main() -> None:
+    hist = LatencyHistogram()
+    record = per_call_ns(lambda: hist.record(12_345))
+    perf = time.perf_counter_ns
+    timed = per_call_ns(lambda: hist.record(perf() - perf()))
+
+    bare, wrapped = _Client(), _Client()
+    instruments = Instrumentation(wrapped)
+    sync_cost = per_call_ns(wrapped.get_self_positions) - per_call_ns(bare.get_self_positions)
+    async_cost = (asyncio.run(per_await_ns(wrapped.cancel_order, instruments._ticks))
+                  - asyncio.run(per_await_ns(bare.cancel_order, {})))
+
+    print(f"record()                         {record:6.0f} ns")
+    print(f"record(perf() - start)           {timed:6.0f} ns")
+    print(f"wrapped sync call overhead       {sync_cost:6.0f} ns  (1 sample)")
+    print(f"wrapped order call overhead      {async_cost:6.0f} ns  (2 samples: call, tick-to-trade)")
+    worst = max(sync_cost, async_cost / 2)
+    print(f"{worst:.0f} ns per sample, {'within' if worst < BUDGET_NS else 'OVER'} the {BUDGET_NS} ns budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Actions per requote: reconcile.reconcile vs the prune + top-up logic gui
+used before it.
+
+    python bench_reconcile.py [requotes]
+
+Two workloads:
+  - random: each requote starts from a random set of resting orders (some at
+    the wanted prices, some stale) and random position-bound targets
+  - session: one market quoted over time; between requotes some resting
+    size gets filled (moving the position, hence the targets) and the fair
+    occasionally moves, so each planner works from the orders it left behind
+
+Both planners must leave exactly the target size at bid and ask; the
+benchmark then compares how many cancels/places each needed, and how much
+resting size at the wanted prices lost its queue position (was cancelled and
+re-placed).
+"""
+import random
+import sys
+import time
+
+from huqt_oracle_pysdk import Side, Tif
+
+from rate_limiter import OrderAction
+from reconcile import reconcile, ladder, apply
+
+
+# ----------------------------------------------------
+# Previous gui logic: prune wrong prices, then top up, trimming an order by
+# cancelling it and placing a smaller one
+# ----------------------------------------------------
+def legacy_plan(market, orders, bid_price, ask_price, target_bid_sz, target_ask_sz):
+    actions = []
+    for o in orders:
+        if (o["side"] == Side.Buy and o["price"] != bid_price) or (o["side"] == Side.Sell and o["price"] != ask_price):
+            actions.append(OrderAction("cancel", market, oid=o["oid"]))
+    pruned = {a.oid for a in actions}
+    orders = [o for o in orders if o["oid"] not in pruned]
+
+    def handle_side(price, side, target):
+        level_orders = [o for o in orders if o["side"] == side and o["price"] == price]
+        current = sum(o["size"] for o in level_orders)
+        if target < 0:
+            actions.extend(OrderAction("cancel", market, oid=o["oid"]) for o in level_orders)
+            return
+        excess = current - target
+        if excess > 0:
+            for o in sorted(level_orders, key=lambda x: x["oid"], reverse=True):
+                if excess <= 0:
+                    break
+                actions.append(OrderAction("cancel", market, oid=o["oid"]))
+                if o["size"] <= excess:
+                    excess -= o["size"]
+                    current -= o["size"]
+                else:
+                    new_size = o["size"] - excess
+                    actions.append(OrderAction("place", market, side=side, price=price, size=new_size, tif=Tif.Gtc))
+                    current -= (o["size"] - new_size)
+                    excess = 0
+        missing = target - current
+        if missing > 0:
+            actions.append(OrderAction("place", market, side=side, price=price, size=missing, tif=Tif.Gtc))
+
+    handle_side(bid_price, Side.Buy, target_bid_sz)
+    handle_side(ask_price, Side.Sell, target_ask_sz)
+    return actions
+
+
+def random_scenario(rng: random.Random):
+    bid_price = rng.randint(40, 60)
+    ask_price = bid_price + rng.choice([2, 4, 6])
+    orders = []
+    oid = 1
+    for _ in range(rng.randint(0, 8)):
+        side = rng.choice([Side.Buy, Side.Sell])
+        base = bid_price if side == Side.Buy else ask_price
+        # Mostly at the wanted price, some left over from a previous fair
+        price = base if rng.random() < 0.7 else base + rng.choice([-2, -1, 1, 2])
+        orders.append({"oid": oid, "side": side, "price": price, "size": rng.randint(1, 10)})
+        oid += 1
+    return orders, bid_price, ask_price, rng.randint(-5, 30), rng.randint(-5, 30), oid
+
+
+def resting(orders, side, price):
+    return sum(o["size"] for o in orders if o["side"] == side and o["price"] == price)
+
+
+def requeued(orders, actions, side, price):
+    """Size at (side, price) that was cancelled but is wanted back at the same price."""
+    cancelled = {a.oid for a in actions if a.kind == "cancel"}
+    lost = sum(o["size"] for o in orders if o["oid"] in cancelled and o["side"] == side and o["price"] == price)
+    placed = sum(a.size for a in actions if a.kind == "place" and a.side == side and a.price == price)
+    return min(lost, placed)
+
+
+def random_requotes(n: int, rng: random.Random):
+    for _ in range(n):
+        orders, bid_price, ask_price, bid_sz, ask_sz, next_oid = random_scenario(rng)
+        yield {name: orders for name in PLANNERS}, bid_price, ask_price, bid_sz, ask_sz, next_oid
+
+
+def session_requotes(n: int, rng: random.Random, ub: int = 20, lb: int = -20):
+    books = {name: [] for name in PLANNERS}
+    positions = {name: 0 for name in PLANNERS}
+    fair = 50
+    next_oid = 1
+    for _ in range(n):
+        if rng.random() < 0.05:
+            fair += rng.choice([-1, 1])
+        bid_price = fair - 1
+        ask_price = bid_price + 2
+        # Same taker flow hits both planners' orders, oldest first
+        taker_side = rng.choice([Side.Buy, Side.Sell])
+        taker_sz = rng.randint(0, 6)
+        for name in PLANNERS:
+            remaining = taker_sz
+            resting_orders = []
+            for o in sorted(books[name], key=lambda x: x["oid"]):
+                if remaining and o["side"] != taker_side:
+                    hit = min(remaining, o["size"])
+                    remaining -= hit
+                    positions[name] += hit if o["side"] == Side.Buy else -hit
+                    if hit < o["size"]:
+                        resting_orders.append(dict(o, size=o["size"] - hit))
+                else:
+                    resting_orders.append(o)
+            books[name] = resting_orders
+        plans = yield (dict(books), bid_price, ask_price,
+                       {name: ub - positions[name] for name in PLANNERS},
+                       {name: positions[name] - lb for name in PLANNERS},
+                       next_oid)
+        for name, actions in plans.items():
+            books[name] = apply(books[name], actions, next_oid)
+        next_oid += 100
+
+
+PLANNERS = {
+    "legacy": lambda orders, bid_price, ask_price, bid_sz, ask_sz: legacy_plan(
+        "M", orders, bid_price, ask_price, bid_sz, ask_sz),
+    "reconcile": lambda orders, bid_price, ask_price, bid_sz, ask_sz: reconcile(
+        "M", orders, ladder(bid_price, bid_sz), ladder(ask_price, ask_sz)),
+}
+
+
+def run(workload: str, n: int, seed: int = 7):
+    rng = random.Random(seed)
+    totals = {
+        name: {"cancel": 0, "place": 0, "requeued": 0, "plan_ns": 0}
+        for name in PLANNERS
+    }
+    gen = random_requotes(n, rng) if workload == "random" else session_requotes(n, rng)
+    step = next(gen)
+    for _ in range(n):
+        books, bid_price, ask_price, bid_sz, ask_sz, next_oid = step
+        plans = {}
+        for name, planner in PLANNERS.items():
+            orders = books[name]
+            b_sz = bid_sz[name] if isinstance(bid_sz, dict) else bid_sz
+            a_sz = ask_sz[name] if isinstance(ask_sz, dict) else ask_sz
+
+            start = time.perf_counter_ns()
+            actions = plans[name] = planner(orders, bid_price, ask_price, b_sz, a_sz)
+            totals[name]["plan_ns"] += time.perf_counter_ns() - start
+
+            after = apply(orders, actions, next_oid)
+            assert resting(after, Side.Buy, bid_price) == max(b_sz, 0), (name, orders, actions)
+            assert resting(after, Side.Sell, ask_price) == max(a_sz, 0), (name, orders, actions)
+            assert all(o["price"] in (bid_price, ask_price) for o in after), (name, orders, actions)
+            t = totals[name]
+            for a in actions:
+                t[a.kind] += 1
+            t["requeued"] += (requeued(orders, actions, Side.Buy, bid_price)
+                              + requeued(orders, actions, Side.Sell, ask_price))
+        try:
+            step = gen.send(plans) if workload == "session" else next(gen)
+        except StopIteration:
+            break
+
+    print(f"\n{workload}: {n} requotes")
+    print(f"{'':10} {'actions/requote':>16} {'cancels':>9} {'places':>9} {'requeued size':>14} {'plan us':>9}")
+    for name, t in totals.items():
+        actions = t["cancel"] + t["place"]
+        print(f"{name:10} {actions / n:16.3f} {t['cancel']:9d} {t['place']:9d} "
+              f"{t['requeued']:14d} {t['plan_ns'] / n / 1e3:9.2f}")
+    saved = 1 - (totals["reconcile"]["cancel"] + totals["reconcile"]["place"]) / max(
+        totals["legacy"]["cancel"] + totals["legacy"]["place"], 1)
+    print(f"reconcile sends {saved:.1%} fewer orders (each one costs 1/50 s of rate limit)")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    run("random", n)
+    run("session", n)
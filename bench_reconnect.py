@@ -0,0 +1,127 @@
+"""
+Trades kept across dropped connections, persistence.py's way, against a
+local sim_server.py with flow running.
+
+    python bench_reconnect.py [--outages 5] [--down-ms 500] [--every 2]
+                              [--flow 400] [--latency-ms 5] [--retry-ms 100]
+
+Every `every` seconds the server cuts all connections and refuses new ones
+for `down-ms` (ExchangeServer.outage), while its flow keeps trading. The
+client is a WSClient with persistence.py's trade handling minus the
+writer: trades go through a TradeGapTracker and are counted per market.
+
+- resync: session and subscriptions sent with WSClient.request(), so they
+  are restored on reconnect and each market's recent-trades snapshot
+  backfills what was missed.
+- plain: the same requests sent with send(), as before: after the first
+  drop the connection comes back without a session or subscriptions.
+
+Reported: time down per outage, reconnect-to-resubscribed latency, trades
+recovered from snapshots, and trades the server printed that the client
+never got.
+"""
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+
+from huqt_oracle_pysdk.request import ClientSetSessionRequest
+from huqt_oracle_pysdk.subscribe import ClientTradeSubscription
+
+from persistence import WSClient
+from sim_server import ExchangeServer, FlowConfig, MARKETS
+from trade_decode import TradesFrameDecoder
+from trade_gaps import TradeGapTracker
+
+PORT = 8797
+DOMAIN = "HarvardYale"
+SETTLE = 1.0        # seconds of flow before the first outage and after the last
+
+
+async def run(mode: str, outages: int, down: float, every: float, rate: float,
+              latency: float, retry: float) -> dict:
+    server = ExchangeServer(flow=FlowConfig(rate=rate), latency=latency)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        await server.start(port=PORT, run_flow=False)
+
+    decoder = TradesFrameDecoder()
+    gaps = TradeGapTracker()
+    received = {m: 0 for m in MARKETS}
+
+    async def on_message(msg: bytes):
+        decoded = decoder.decode(msg)
+        if decoded is None:
+            return
+        market, trades = decoded
+        if decoder.snapshot:
+            trades = gaps.backfill(market, trades)
+        else:
+            gaps.advance(market, trades)
+        received[market] += len(trades)
+
+    ws_client = WSClient(f"ws://localhost:{PORT}/ws", "", None)
+    await ws_client.connect()
+    listen_task = asyncio.create_task(ws_client.listen(on_message, retry_base=retry))
+    send = ws_client.request if mode == "resync" else lambda uuid, raw: ws_client.send(raw)
+    uuids = []
+    uuid, raw = ClientSetSessionRequest(domain=DOMAIN).to_bytes(account="persistence")
+    uuids.append(uuid)
+    await send(uuid, raw)
+    for m in MARKETS:
+        uuid, raw = ClientTradeSubscription(domain=DOMAIN, subscribe=True, market=m).to_bytes()
+        uuids.append(uuid)
+        await send(uuid, raw)
+    await asyncio.sleep(latency * 4 + 0.1)
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        server.start_flow()
+        await asyncio.sleep(SETTLE)
+        for _ in range(outages):
+            await server.outage(down)
+            await asyncio.sleep(every)
+        await server.stop_flow()
+        await asyncio.sleep(SETTLE)
+        listen_task.cancel()
+        await asyncio.gather(listen_task, return_exceptions=True)
+        await server.stop()
+
+    printed = server.exchange.trades
+    got = sum(received.values())
+    return {
+        "reconnects": ws_client.reconnects,
+        "gaps": gaps.stats(),
+        "printed": printed,
+        "received": got,
+        "lost": printed - got,
+    }
+
+
+def main(args: list[str]) -> None:
+    opts = {"--outages": 5, "--down-ms": 500.0, "--every": 2.0, "--flow": 400.0,
+            "--latency-ms": 5.0, "--retry-ms": 100.0}
+    it = iter(args)
+    for a in it:
+        if a not in opts:
+            sys.exit(f"usage: python bench_reconnect.py {' '.join(f'[{k} N]' for k in opts)}")
+        opts[a] = type(opts[a])(next(it))
+    print(f"{opts['--outages']} outages of {opts['--down-ms']:g}ms every {opts['--every']:g}s, "
+          f"flow {opts['--flow']:g} orders/s, {opts['--latency-ms']:g}ms each way, "
+          f"first retry immediate then {opts['--retry-ms']:g}ms backoff")
+    print(f"{'mode':>6} {'reconn':>6} {'down ms':>8} {'resub p50':>10} {'resub max':>10} "
+          f"{'printed':>8} {'received':>9} {'recovered':>10} {'gaps':>5} {'lost':>6}")
+    for mode in ("resync", "plain"):
+        r = asyncio.run(run(mode, opts["--outages"], opts["--down-ms"] / 1000, opts["--every"],
+                            opts["--flow"], opts["--latency-ms"] / 1000, opts["--retry-ms"] / 1000))
+        rec = r["reconnects"]
+        down = statistics.median(x["down_s"] for x in rec) * 1000 if rec else float("nan")
+        resub = [x["resubscribe_s"] * 1000 for x in rec]
+        p50 = f"{statistics.median(resub):.1f}" if resub else "-"
+        worst = f"{max(resub):.1f}" if resub else "-"
+        print(f"{mode:>6} {len(rec) or '-':>6} {down:>8.0f} {p50:>10} {worst:>10} "
+              f"{r['printed']:>8} {r['received']:>9} {r['gaps']['recovered']:>10} "
+              f"{r['gaps']['gaps']:>5} {r['lost']:>6}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,126 @@
+"""
+Per-update latency of relation_scanner.RelationScanner.
+
+    python bench_relation_scanner.py [updates]
+
+For each (markets, relations) size, random linear and log relations over
+2-3 legs are checked against random-walk top-of-book updates, with bands
+set so a few relations are live at any time. Each update is timed from the
+top-of-book write to the end of evaluation, signal building included, and
+compared with checking the same relations one by one in plain Python.
+"""
+import math
+import random
+import sys
+import time
+
+from huqt_oracle_pysdk import Side
+
+from metrics import LatencyHistogram
+from relation_scanner import Relation, RelationScanner
+
+SIZES = [(8, 6), (16, 24), (32, 48), (64, 96)]
+
+
+def make_relations(markets: list[str], n: int, rng: random.Random) -> list[Relation]:
+    relations = []
+    for k in range(n):
+        legs = rng.sample(markets, rng.choice([2, 2, 3]))
+        weights = {m: rng.choice([1, -1, 2]) for m in legs}
+        if k % 3 == 2:
+            center = sum(w * math.log(50) for w in weights.values())
+            relations.append(Relation(f"r{k}", weights, center - 0.15, center + 0.15, log=True))
+        else:
+            center = sum(w * 50 for w in weights.values())
+            relations.append(Relation(f"r{k}", weights, center - 8, center + 8, edge=1))
+    return relations
+
+
+def naive_signals(relations: list[Relation], top: dict[str, tuple]) -> list[tuple]:
+    """The same check, one relation at a time, for comparison."""
+    out = []
+    for r in relations:
+        sell = buy = 0.0
+        sell_size = buy_size = None
+        ok = True
+        for m, w in r.weights.items():
+            bid, bid_size, ask, ask_size = top[m]
+            if bid is None or ask is None:
+                ok = False
+                break
+            f = math.log if r.log else float
+            hit, lift = (bid, ask) if w > 0 else (ask, bid)
+            sell += w * f(hit)
+            buy += w * f(lift)
+            s_avail, b_avail = (bid_size, ask_size) if w > 0 else (ask_size, bid_size)
+            sell_size = int(s_avail // abs(w)) if sell_size is None else min(sell_size, int(s_avail // abs(w)))
+            buy_size = int(b_avail // abs(w)) if buy_size is None else min(buy_size, int(b_avail // abs(w)))
+        if not ok:
+            continue
+        if sell > r.hi + r.edge and sell_size:
+            out.append((r.name, Side.Sell, sell_size))
+        if buy < r.lo - r.edge and buy_size:
+            out.append((r.name, Side.Buy, buy_size))
+    return out
+
+
+def run(n_markets: int, n_relations: int, updates: int) -> dict:
+    rng = random.Random(n_markets * 1000 + n_relations)
+    markets = [f"M{i:02d}" for i in range(n_markets)]
+    relations = make_relations(markets, n_relations, rng)
+    scanner = RelationScanner(None, relations, markets)
+    mid = {m: 50 for m in markets}
+    top = {}
+
+    def quote(m):
+        # Mean-reverting, so relations go in and out of their bands
+        mid[m] += rng.choice([-1, 0, 1]) + (mid[m] < 45) - (mid[m] > 55)
+        spread = rng.choice([1, 2, 2, 3])
+        return mid[m] - spread // 2, rng.randint(1, 20), mid[m] - spread // 2 + spread, rng.randint(1, 20)
+
+    for m in markets:
+        top[m] = quote(m)
+        scanner.update(scanner.index[m], *top[m])
+
+    feed = []
+    for _ in range(updates):
+        m = rng.choice(markets)
+        feed.append((m, quote(m)))
+
+    hist = LatencyHistogram("scan")
+    perf = time.perf_counter_ns
+    live = 0
+    for m, q in feed:
+        i = scanner.index[m]
+        start = perf()
+        scanner.update(i, *q)
+        hist.record(perf() - start)
+        live += len(scanner.active)
+
+    naive = LatencyHistogram("naive")
+    for m, q in feed:
+        start = perf()
+        top[m] = q
+        naive_signals(relations, top)
+        naive.record(perf() - start)
+    # Both end on the same books and must agree on what is live
+    expected = sorted(naive_signals(relations, top))
+    actual = sorted((s.relation, s.side, s.size) for s in scanner.active.values())
+    return {"scan": hist.snapshot(), "naive": naive.snapshot(), "live": live / updates,
+            "same": expected == actual}
+
+
+def main(args: list[str]) -> None:
+    updates = int(args[0]) if args else 50_000
+    print(f"{updates} top-of-book updates per size; µs per update")
+    print(f"{'markets':>7} {'relations':>9} {'p50':>7} {'p99':>7} {'max':>8} {'naive p50':>10} "
+          f"{'naive p99':>10} {'live':>5} {'same':>5}")
+    for n_markets, n_relations in SIZES:
+        r = run(n_markets, n_relations, updates)
+        s, n = r["scan"], r["naive"]
+        print(f"{n_markets:>7} {n_relations:>9} {s['p50']:>7.1f} {s['p99']:>7.1f} {s['max']:>8.1f} "
+              f"{n['p50']:>10.1f} {n['p99']:>10.1f} {r['live']:>5.1f} {'yes' if r['same'] else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
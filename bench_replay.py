@@ -0,0 +1,220 @@
+"""
+Replay the HarvardYale session against the winner bot, gui.py's market
+maker and retail.py, on a virtual clock (see replay.py).
+
+    python bench_replay.py [strategy ...] [--verbose]
+
+The tape is logs/{market}.json from persistence.py, else the columnar
+store/, else a synthetic session of the same shape (SESSION_HOURS long,
+HRVD + YALE ~ 100, random walks elsewhere) so the benchmark also runs on
+a machine without recorded data.
+
+Each strategy runs in its own process, since the bots keep their client
+and order gateway in module globals; PYTHONHASHSEED is pinned so set
+iteration order cannot make two runs diverge. Every replay runs twice and
+the fill digests are compared.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+
+from market_registry import MarketInfo
+from replay import Replay, Tape, run_replay, TARGET_EVENTS_PER_SEC
+
+MARKETS = ["HRVD", "YALE", "TIME", "RAIN", "PTS", "TDS", "SUM", "DIFF"]
+SESSION_HOURS = 3
+TRADES_PER_SEC = 0.5        # per market, synthetic session only
+SESSION_START = int(datetime(2025, 11, 22, 13, 54).timestamp() * 1000)
+# gui.py quotes every market around its opening price
+GUI_DEFAULTS = {"fair_offset": 0, "spread": 4, "position_ub": 20, "position_lb": 0}
+
+
+# ----------------------------------------------------
+# Tape
+# ----------------------------------------------------
+def synthetic_session(hours: float = SESSION_HOURS, rate: float = TRADES_PER_SEC, seed: int = 7) -> Tape:
+    """Poisson trade times and random-walk prices, ms timestamps like the logs."""
+    rng = np.random.default_rng(seed)
+    seconds = hours * 3600
+    per_market = {}
+    hrvd_path = None
+    for m in MARKETS:
+        n = rng.poisson(rate * seconds)
+        t = np.sort(rng.uniform(0, seconds, n))
+        steps = rng.choice([-1, 0, 0, 1], size=n)
+        if m == "YALE" and hrvd_path is not None:
+            # Priced off HRVD at the same moments, so the pair sums to ~100
+            idx = np.clip(np.searchsorted(hrvd_path[0], t), 0, len(hrvd_path[1]) - 1)
+            price = 100 - hrvd_path[1][idx] + rng.integers(-1, 2, n)
+        else:
+            price = 50 + np.cumsum(steps)
+        price = np.clip(price, 5, 95)
+        if m == "HRVD":
+            hrvd_path = (t, price)
+        per_market[m] = {
+            "time": SESSION_START + (t * 1000).astype(np.int64),
+            "price": price,
+            "size": rng.integers(1, 6, n),
+            "side": rng.integers(0, 2, n),
+        }
+    return Tape._merge(per_market)
+
+
+def load_tape() -> tuple[Tape, str]:
+    tape = Tape.load(MARKETS)
+    if tape is not None and len(tape):
+        return tape, "recorded"
+    return synthetic_session(), "synthetic"
+
+
+def market_infos() -> list[MarketInfo]:
+    return [MarketInfo(m, m, "QTC", 0, 0, 0, 1) for m in MARKETS]
+
+
+# ----------------------------------------------------
+# Strategies
+# ----------------------------------------------------
+def override(module, params: dict) -> None:
+    """Set module-level constants; a dict constant gets the value for every key it has."""
+    for name, value in params.items():
+        current = getattr(module, name)
+        setattr(module, name, {k: value for k in current} if isinstance(current, dict) else value)
+
+
+def virtual_clock(module) -> None:
+    """Loop lag is always zero on the virtual clock, and sampling it would add a wakeup every 5ms."""
+    module.instruments.loop_lag_interval = None
+    module.instruments.report_every = None
+
+
+async def replay_winner(tape: Tape, params: Optional[dict] = None) -> Replay:
+    import HarvardYale_Winner_JonathanWu as bot
+    override(bot, params or {})
+    virtual_clock(bot)
+    venue = Replay(tape, markets=market_infos(), accounts={"winner": {"QTC": 80_000, "YALE": 500}})
+    await venue.start_client(bot.jwu, "winner")
+    for m in bot.markets:
+        await bot.jwu.subscribe_market(m)
+    # trade_handler turns end_time into a timeout once, then runs on loop time
+    bot.end_time = datetime.now() + timedelta(seconds=tape.duration)
+
+    async def strategy():
+        await bot.trade_handler()
+        await bot.finalize_orders()
+
+    task = asyncio.create_task(strategy())
+    await venue.run()
+    await task
+    await bot.gateway.stop()
+    await bot.jwu.stop_client()
+    return venue
+
+
+async def replay_gui(tape: Tape, params: Optional[dict] = None) -> Replay:
+    import gui
+    virtual_clock(gui)
+    p = {**GUI_DEFAULTS, **(params or {})}
+    balances = {"QTC": 100_000, **{m: 10 for m in MARKETS}}
+    venue = Replay(tape, markets=market_infos(), accounts={"gui": balances})
+    await venue.start_client(gui.haorzhe, "gui")
+    gui.registry.refresh()
+    gui.markets[:] = gui.registry.names()
+    for m in gui.markets:
+        await gui.haorzhe.subscribe_market(m)
+        fair = tape.first_price(m)
+        if fair is not None:
+            gui.configs[m] = gui.MarketConfig(fair=fair + p["fair_offset"], spread=p["spread"],
+                                              position_ub=p["position_ub"], position_lb=p["position_lb"],
+                                              quoting=True)
+
+    task = asyncio.create_task(gui.trade_handler())
+    await venue.run()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await gui.gateway.stop()
+    await gui.haorzhe.stop_client()
+    return venue
+
+
+async def replay_retail(tape: Tape, params: Optional[dict] = None) -> Replay:
+    import retail
+    virtual_clock(retail)
+    retail.SEED = 0
+    venue = Replay(tape, markets=market_infos(), accounts={"retail": {"QTC": 100_000, **{m: 50 for m in MARKETS}}})
+    await venue.start_client(retail.haorzhe, "retail")
+    for m in retail.markets:
+        await retail.haorzhe.subscribe_market(m)
+
+    task = asyncio.create_task(retail.trade_handler())
+    await venue.run()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await retail.gateway.stop()
+    await retail.haorzhe.stop_client()
+    return venue
+
+
+STRATEGIES = {
+    "winner": (replay_winner, "winner"),
+    "gui": (replay_gui, "gui"),
+    "retail": (replay_retail, "retail"),
+}
+
+
+def run_one(name: str, verbose: bool = False, params: Optional[dict] = None,
+            tape_dir: Optional[str] = None) -> dict:
+    """
+    Replay one strategy (in a fresh process) and return its results.
+    `tape_dir` is a Tape.save() directory to map instead of loading the session.
+    """
+    replay, account = STRATEGIES[name]
+    if tape_dir is not None:
+        tape, source = Tape.open(tape_dir), "shared"
+    else:
+        tape, source = load_tape()
+    out = sys.stdout if verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(out):
+        venue = run_replay(replay(tape, params))
+    ex = venue.exchange
+    return {
+        "strategy": name,
+        "source": source,
+        **venue.stats(),
+        "pnl": venue.pnl(account),
+        "positions": {s: p for s, p in sorted(ex.positions.get(account, {}).items())},
+        "digest": venue.fills_digest(),
+    }
+
+
+def main(names: list[str], verbose: bool) -> None:
+    os.environ["PYTHONHASHSEED"] = "0"
+    ctx = multiprocessing.get_context("spawn")
+    tape, source = load_tape()
+    print(f"HarvardYale session ({source}): {len(tape)} trades over {tape.duration / 3600:.2f}h "
+          f"in {len(tape.names)} markets; target {TARGET_EVENTS_PER_SEC} events/s")
+    print(f"{'strategy':9} {'events':>8} {'requests':>9} {'fills':>6} {'real s':>7} {'speedup':>8} "
+          f"{'events/s':>9} {'pnl':>8}  deterministic")
+    for name in names:
+        runs = []
+        for _ in range(2):
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                runs.append(pool.submit(run_one, name, verbose).result())
+        r = runs[0]
+        same = runs[0]["digest"] == runs[1]["digest"]
+        flag = "" if r["events_per_sec"] >= TARGET_EVENTS_PER_SEC else "  (below target)"
+        print(f"{name:9} {r['tape_events']:8d} {r['requests']:9d} {r['fills']:6d} {r['real_seconds']:7.2f} "
+              f"{r['speedup']:7.0f}x {r['events_per_sec']:9d} {r['pnl']:8d}  "
+              f"{'yes' if same else 'NO'} ({r['digest']}){flag}")
+        print(f"          positions: {r['positions']}")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(args or list(STRATEGIES), "--verbose" in sys.argv)
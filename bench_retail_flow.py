@@ -0,0 +1,108 @@
+"""
+How much retail flow one process can generate (retail_flow.py).
+
+    python bench_retail_flow.py [--seconds 3] [--participants 1000]
+
+Each target rate runs on a real event loop for `seconds`, sending IOCs
+from `participants` accounts into an in-process SimExchange with deep
+resting liquidity, so the numbers are the generator and matching cost
+without a socket in the way. Also compares drawing arrivals in batches
+with the per-order np.random calls retail.py used to make.
+"""
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from huqt_oracle_pysdk import Side, Tif
+
+from market_registry import MarketInfo
+from retail_flow import ContractFlow, RetailFlow, BATCH
+from sim_exchange import SimExchange
+
+MARKETS = ["HRVD", "YALE", "TIME", "RAIN", "PTS", "TDS", "SUM", "DIFF"]
+TARGETS = [100, 500, 2_000, 10_000, 50_000]
+LIQUIDITY = "liquidity"
+
+
+def exchange(participants: int) -> SimExchange:
+    ex = SimExchange([MarketInfo(m, m, "QTC", 0, 0, 0, 1) for m in MARKETS],
+                     unlimited=[LIQUIDITY, *(f"retail{i}" for i in range(participants))])
+    for m in MARKETS:
+        ex.place(LIQUIDITY, m, Side.Buy, 49, 10 ** 12, Tif.Gtc, 0)
+        ex.place(LIQUIDITY, m, Side.Sell, 51, 10 ** 12, Tif.Gtc, 0)
+    return ex
+
+
+async def run_target(target: float, seconds: float, participants: int) -> dict:
+    ex = exchange(participants)
+    names = [f"retail{i}" for i in range(participants)]
+
+    def quote(market, side):
+        book = ex.books[market].side(Side.Sell if side == Side.Buy else Side.Buy)
+        return book.best()
+
+    def send(who, market, side, price, size):
+        ex.place(names[who], market, side, price, size, Tif.Ioc, 0)
+        ex.events.clear()
+
+    rates = np.linspace(1, 3, len(MARKETS))
+    contracts = [ContractFlow(m, rate=target * r / rates.sum(), fair=50) for m, r in zip(MARKETS, rates)]
+    flow = RetailFlow(contracts, quote, send, participants=participants, seed=1)
+    cpu = time.process_time()
+    await flow.run(seconds)
+    cpu = time.process_time() - cpu
+    s = flow.stats()
+    worst = min(c["achieved"] / c["target"] for c in s["per_contract"].values())
+    return {**s, "worst_contract": worst, "cpu_us_per_order": cpu / max(sum(flow.arrived), 1) * 1e6,
+            "trades": ex.trades}
+
+
+def draw_cost(n: int = 20_000) -> tuple[float, float]:
+    """µs per arrival: batched draws vs the per-order calls retail.py made."""
+    contracts = [ContractFlow(m, rate=1.0) for m in MARKETS]
+    flow = RetailFlow(contracts, lambda m, s: None, lambda *a: None, participants=1000, seed=1)
+    start = time.perf_counter()
+    for _ in range(n // BATCH):
+        flow.draw(0.0)
+    batched = (time.perf_counter() - start) / (n // BATCH * BATCH) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(n):
+        np.random.exponential(1.0)
+        np.random.choice(MARKETS)
+        np.random.choice([Side.Buy, Side.Sell])
+        max(int(np.random.normal(3, 1)), 1)
+        np.random.randint(1000)
+    per_order = (time.perf_counter() - start) / n * 1e6
+    return batched, per_order
+
+
+def main(args: list[str]) -> None:
+    seconds, participants = 3.0, 1000
+    it = iter(args)
+    for a in it:
+        if a == "--seconds":
+            seconds = float(next(it))
+        elif a == "--participants":
+            participants = int(next(it))
+        else:
+            sys.exit("usage: python bench_retail_flow.py [--seconds N] [--participants N]")
+
+    batched, per_order = draw_cost()
+    print(f"draws: {batched:.2f}us per arrival batched, {per_order:.2f}us with per-order np.random "
+          f"({per_order / batched:.0f}x)")
+    print(f"{len(MARKETS)} contracts, {participants} participants, {seconds:g}s per target")
+    print(f"{'target/s':>9} {'achieved/s':>11} {'worst mkt':>10} {'late p50':>9} {'late p99':>9} "
+          f"{'cpu/order':>10} {'trades':>8}")
+    for target in TARGETS:
+        r = asyncio.run(run_target(target, seconds, participants))
+        late = r["lateness_us"]
+        print(f"{target:>9,} {r['achieved_rate']:>11,.1f} {r['worst_contract']:>10.1%} "
+              f"{late.get('p50', 0):>7.0f}us {late.get('p99', 0):>7.0f}us "
+              f"{r['cpu_us_per_order']:>8.1f}us {r['trades']:>8}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,210 @@
+"""
+persistence.py and gui.py in sharded mode (shards.py) against a local
+sim_server.py with dozens of markets, as the number of shards grows.
+
+    python bench_shards.py [gui] [persistence] [--shards 1,2,4]
+                           [--markets 32] [--flow 3200] [--seconds 10]
+
+The server runs in its own process with `flow` orders/s spread over the
+markets; each shard is a worker process with its own connection, started
+by a ShardCoordinator in this process, which collects the numbers the
+shards report.
+
+- persistence: trades the server printed in the window against trades the
+  shards received, and the slowest shard's handler p99.
+- gui: every market quoted (configs sent through the coordinator), then
+  requote cycles per second over all shards, the slowest shard's cycle and
+  loop lag p99, and tick-to-order p99 as the server sees it. The account's
+  50 orders/s is split between the shards.
+"""
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from market_registry import MarketInfo
+from shards import ShardCoordinator
+from sim_server import ExchangeServer, FlowConfig
+
+PORT = 8796
+SHARDS = [1, 2, 4]
+DRAIN = 2.0             # seconds after the flow stops for the last reports to arrive
+READY_TIMEOUT = 20.0
+
+
+def market_names(n: int) -> list[str]:
+    return [f"M{i:02d}" for i in range(n)]
+
+
+def _wait(event) -> asyncio.Future:
+    return asyncio.get_running_loop().run_in_executor(None, event.wait)
+
+
+def server_process(port: int, n_markets: int, rate: float, ready, go, done, release, results) -> None:
+    async def run():
+        names = market_names(n_markets)
+        server = ExchangeServer([MarketInfo(m, m, "QTC", 0, 0, 0, 1) for m in names],
+                                flow=FlowConfig(rate=rate),
+                                balances={"QTC": 10_000_000, **{m: 1000 for m in names}})
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            await server.start(port=port, run_flow=False)
+        ready.set()
+        await _wait(go)
+        server.start_flow()
+        await _wait(done)
+        await server.stop_flow()
+        results.put(server.stats())
+        # Stay up until the shards are gone, so they do not see the server drop
+        await _wait(release)
+        await server.stop()
+
+    asyncio.run(run())
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence stdout here and in the processes started meanwhile, which inherit fd 1."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+async def wait_for(predicate, timeout: float = READY_TIMEOUT) -> None:
+    loop = asyncio.get_running_loop()
+    end = loop.time() + timeout
+    while not predicate():
+        if loop.time() > end:
+            raise TimeoutError("shards did not come up")
+        await asyncio.sleep(0.05)
+
+
+# ----------------------------------------------------
+# Clients
+# ----------------------------------------------------
+async def load_persistence(shards: int, markets: list[str], window: float, go, done) -> dict:
+    import persistence
+    coordinator = ShardCoordinator(persistence.main, shards, args=(markets,))
+    coordinator.start()
+    await wait_for(lambda: len(coordinator.stats) == shards)
+    go.set()
+    await asyncio.sleep(window)
+    done.set()
+    await asyncio.sleep(DRAIN)
+    status = coordinator.status()
+    await coordinator.stop()
+    status["partition"] = coordinator.ring.partition(markets)
+    return status
+
+
+async def load_gui(shards: int, markets: list[str], window: float, go, done) -> dict:
+    import gui
+    from bench_replay import GUI_DEFAULTS
+    coordinator = ShardCoordinator(gui.run_shard, shards)
+    coordinator.start()
+    await wait_for(lambda: len(coordinator.rows) == len(markets))
+    body = {"fair": FlowConfig.fair, "spread": GUI_DEFAULTS["spread"],
+            "position_lb": GUI_DEFAULTS["position_lb"], "position_ub": GUI_DEFAULTS["position_ub"]}
+    for m in markets:
+        await coordinator.call(m, "set_config", m, body)
+        await coordinator.call(m, "toggle_quoting", m)
+    # Count from here on: each shard's stats are cumulative
+    await asyncio.sleep(1.5)
+    before = {s: dict(v) for s, v in coordinator.stats.items()}
+    go.set()
+    await asyncio.sleep(window)
+    status = coordinator.status()
+    done.set()
+    await coordinator.stop()
+    status["partition"] = coordinator.ring.partition(markets)
+    status["requotes"] = sum(s["requotes"] - before[i]["requotes"] for i, s in coordinator.stats.items())
+    return status
+
+
+CLIENTS = {"gui": load_gui, "persistence": load_persistence}
+
+
+def run_step(name: str, shards: int, n_markets: int, rate: float, window: float,
+             port: int = PORT) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    ready, go, done, release = ctx.Event(), ctx.Event(), ctx.Event(), ctx.Event()
+    results = ctx.Queue()
+    server = ctx.Process(target=server_process,
+                         args=(port, n_markets, rate, ready, go, done, release, results))
+    server.start()
+    ready.wait()
+    os.environ.update(ORACLE_WS_URL=f"ws://localhost:{port}/ws", ACCOUNT_ADDRESS=name, API_KEY="")
+    with quiet():
+        client = asyncio.run(CLIENTS[name](shards, market_names(n_markets), window, go, done))
+    release.set()
+    result = {"shards": shards, "server": results.get(), "client": client}
+    server.join()
+    return result
+
+
+# ----------------------------------------------------
+# Report
+# ----------------------------------------------------
+def report_persistence(rows: list[dict], window: float) -> None:
+    print(f"{'shards':>6} {'markets/shard':>14} {'trades/s':>9} {'recv/s':>8} {'kept up':>8} "
+          f"{'handler p99':>12}")
+    for r in rows:
+        s, c = r["server"], r["client"]
+        t = c["totals"]
+        per = "/".join(str(len(p)) for p in c["partition"])
+        received = t.get("trades", 0)
+        kept = received / s["trades"] if s["trades"] else 1.0
+        print(f"{r['shards']:>6} {per:>14} {s['trades'] / window:>9.1f} {received / window:>8.1f} "
+              f"{kept:>8.1%} {t.get('handler_p99_us', 0):>10.0f}us")
+
+
+def report_gui(rows: list[dict], window: float) -> None:
+    print(f"{'shards':>6} {'markets/shard':>14} {'requotes/s':>11} {'cycle p99':>10} {'lag p99':>8} "
+          f"{'orders/s':>9} {'t2o p99':>8}  (latencies in ms, slowest shard)")
+    for r in rows:
+        s, c = r["server"], r["client"]
+        t = c["totals"]
+        per = "/".join(str(len(p)) for p in c["partition"])
+        print(f"{r['shards']:>6} {per:>14} {c['requotes'] / window:>11.1f} "
+              f"{t.get('cycle_p99_us', 0) / 1000:>10.2f} {t.get('loop_lag_p99_us', 0) / 1000:>8.2f} "
+              f"{t.get('orders_per_sec', 0):>9.1f} {s['tick_to_order_us'].get('p99', 0) / 1000:>8.2f}")
+
+
+REPORTS = {"gui": report_gui, "persistence": report_persistence}
+
+
+def main(args: list[str]) -> None:
+    names, shards, n_markets, rate, window = [], SHARDS, 32, 3200.0, 10.0
+    it = iter(args)
+    for a in it:
+        if a == "--shards":
+            shards = [int(s) for s in next(it).split(",")]
+        elif a == "--markets":
+            n_markets = int(next(it))
+        elif a == "--flow":
+            rate = float(next(it))
+        elif a == "--seconds":
+            window = float(next(it))
+        elif a in CLIENTS:
+            names.append(a)
+        else:
+            sys.exit(f"usage: python bench_shards.py [{'|'.join(CLIENTS)} ...] "
+                     f"[--shards 1,2,4] [--markets N] [--flow N] [--seconds N]")
+    with tempfile.TemporaryDirectory() as tmp:
+        # persistence.py's shards write their logs relative to the working directory
+        os.chdir(tmp)
+        for name in names or list(CLIENTS):
+            print(f"\n{name}: {n_markets} markets, flow {rate:g} orders/s, {window:g}s per run")
+            REPORTS[name]([run_step(name, n, n_markets, rate, window) for n in shards], window)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
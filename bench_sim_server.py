@@ -0,0 +1,225 @@
+"""
+Load gui.py and persistence.py against a local sim_server.py over real
+websockets, stepping up the synthetic order flow until they stop keeping up.
+
+    python bench_sim_server.py [gui] [persistence] [--rates 25,50,100]
+                               [--seconds 10] [--latency-ms 0] [--verbose]
+
+The server and the client under test each run in their own process, so
+the client's event loop only does the client's work. Per flow rate:
+
+- gui: tick-to-order latency as the server sees it (book update pushed to
+  the next order or cancel in that market, see sim_server.py), plus the
+  bot's own requote cycle, loop lag and order gateway backlog. Its ceiling
+  is the last rate with p99 tick-to-order within TICK_TO_ORDER_BUDGET_MS
+  and no orders left queued in the gateway.
+- persistence: trades the server printed in the window against trades
+  persistence.py's handler received in the same window and wrote to its
+  log after a short drain. Its ceiling is the last rate where it received
+  at least KEEP_UP of what was printed.
+"""
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from endpoint import use_gateway
+from sim_server import ExchangeServer, FlowConfig, MARKETS
+
+# Flow orders/s to step through; gui.py is bound by the 50 orders/s limit
+# long before persistence.py runs out of room
+RATES = {"gui": [25, 50, 100, 200, 400], "persistence": [100, 400, 1600, 6400, 25600]}
+WINDOW = 10.0               # seconds of flow per rate
+DRAIN = 2.0                 # seconds to let the client catch up afterwards
+PORT = 8799
+TICK_TO_ORDER_BUDGET_MS = 50
+KEEP_UP = 0.95
+
+
+# ----------------------------------------------------
+# Processes
+# ----------------------------------------------------
+def _wait(event) -> asyncio.Future:
+    return asyncio.get_running_loop().run_in_executor(None, event.wait)
+
+
+def server_process(port: int, rate: float, latency: float, ready, go, done, results) -> None:
+    """Serve until the client is connected, run flow from `go` to `done`."""
+    async def run():
+        server = ExchangeServer(flow=FlowConfig(rate=rate), latency=latency)
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            await server.start(port=port, run_flow=False)
+        ready.set()
+        await _wait(go)
+        server.start_flow()
+        await _wait(done)
+        await server.stop_flow()
+        results.put(server.stats())
+        await server.stop()
+
+    asyncio.run(run())
+
+
+def client_process(name: str, url: str, window: float, verbose: bool, go, done, results) -> None:
+    out = sys.stdout if verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(out):
+        stats = asyncio.run(CLIENTS[name](url, window, go, done))
+    results.put(stats)
+
+
+# ----------------------------------------------------
+# Clients
+# ----------------------------------------------------
+async def load_gui(url: str, window: float, go, done) -> dict:
+    import gui
+    from bench_replay import GUI_DEFAULTS
+    use_gateway(url)
+    await gui.haorzhe.start_client(account="gui", api_key="", domain="HarvardYale")
+    gui.registry.refresh()
+    gui.markets[:] = gui.registry.names()
+    for m in gui.markets:
+        await gui.haorzhe.subscribe_market(m)
+        gui.configs[m] = gui.MarketConfig(fair=FlowConfig.fair, spread=GUI_DEFAULTS["spread"],
+                                          position_ub=GUI_DEFAULTS["position_ub"],
+                                          position_lb=GUI_DEFAULTS["position_lb"], quoting=True)
+
+    gui.loop_lag.start()
+    tasks = [asyncio.create_task(gui.trade_handler()), asyncio.create_task(gui.publisher.run())]
+    go.set()
+    await asyncio.sleep(window)
+    gateway = gui.gateway.stats()
+    stats = {
+        "orders_per_sec": gateway["orders_per_sec"],
+        "backlog": sum(gateway["pending"].values()),
+        "cycle_us": gui.cycle_latency.snapshot(),
+        "loop_lag_us": gui.loop_lag.lag.snapshot(),
+    }
+    done.set()
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await gui.loop_lag.stop()
+    await gui.gateway.stop()
+    await gui.haorzhe.stop_client()
+    return stats
+
+
+async def load_persistence(url: str, window: float, go, done) -> dict:
+    from huqt_oracle_pysdk.request import ClientSetSessionRequest
+    from huqt_oracle_pysdk.subscribe import ClientTradeSubscription
+    with tempfile.TemporaryDirectory() as tmp:
+        # the writer's log directory is relative
+        os.chdir(tmp)
+        import persistence
+        ws_client = persistence.WSClient(url, "", None)
+        await ws_client.connect()
+        persistence.writer.start()
+        _, raw_msg = ClientSetSessionRequest(domain="HarvardYale").to_bytes(account="persistence")
+        await ws_client.send(raw_msg)
+        for market in MARKETS:
+            _, raw_msg = ClientTradeSubscription(domain="HarvardYale", subscribe=True, market=market).to_bytes()
+            await ws_client.send(raw_msg)
+        listen_task = asyncio.create_task(
+            ws_client.listen(persistence.message_handler, queue_size=4096, overflow="block"))
+
+        go.set()
+        await asyncio.sleep(window)
+        received = persistence.writer.stats()["queued"]
+        done.set()
+        await asyncio.sleep(DRAIN)
+        listen_task.cancel()
+        await asyncio.gather(listen_task, return_exceptions=True)
+        persistence.writer.stop()
+        return {
+            "received": received,
+            "written": persistence.writer.stats()["written"],
+            "ingress": ws_client.ingress.stats(),
+        }
+
+
+CLIENTS = {"gui": load_gui, "persistence": load_persistence}
+
+
+def run_step(name: str, rate: float, window: float = WINDOW, latency: float = 0.0,
+             port: int = PORT, verbose: bool = False) -> dict:
+    """One flow rate: a fresh server and a fresh client process."""
+    ctx = multiprocessing.get_context("spawn")
+    ready, go, done = ctx.Event(), ctx.Event(), ctx.Event()
+    server_results, client_results = ctx.Queue(), ctx.Queue()
+    server = ctx.Process(target=server_process, args=(port, rate, latency, ready, go, done, server_results))
+    server.start()
+    ready.wait()
+    client = ctx.Process(target=client_process,
+                         args=(name, f"ws://localhost:{port}/ws", window, verbose, go, done, client_results))
+    client.start()
+    result = {"rate": rate, "server": server_results.get(), "client": client_results.get()}
+    client.join()
+    server.join()
+    return result
+
+
+# ----------------------------------------------------
+# Report
+# ----------------------------------------------------
+def report_gui(rows: list[dict], window: float) -> None:
+    print(f"{'rate':>6} {'flow/s':>7} {'t2o p50':>8} {'t2o p99':>8} {'unans':>6} {'orders/s':>9} "
+          f"{'cycle p99':>10} {'lag p99':>8} {'backlog':>8}  (latencies in ms)")
+    ceiling = None
+    for r in rows:
+        s, c = r["server"], r["client"]
+        t2o = s["tick_to_order_us"]
+        p99 = t2o.get("p99", 0) / 1000
+        print(f"{r['rate']:>6g} {s['flow_rate']:>7.1f} {t2o.get('p50', 0) / 1000:>8.2f} {p99:>8.2f} "
+              f"{s['unanswered']:>6} {c['orders_per_sec']:>9.1f} {c['cycle_us'].get('p99', 0) / 1000:>10.2f} "
+              f"{c['loop_lag_us'].get('p99', 0) / 1000:>8.2f} {c['backlog']:>8}")
+        if p99 <= TICK_TO_ORDER_BUDGET_MS and not c["backlog"]:
+            ceiling = r["rate"]
+    print(f"gui.py keeps p99 tick-to-order under {TICK_TO_ORDER_BUDGET_MS}ms up to "
+          f"{ceiling if ceiling is not None else '-'} flow orders/s")
+
+
+def report_persistence(rows: list[dict], window: float) -> None:
+    print(f"{'rate':>6} {'flow/s':>7} {'trades/s':>9} {'recv/s':>8} {'kept up':>8} {'written':>8} "
+          f"{'handler p99':>12} {'queue hw':>9}")
+    ceiling = None
+    for r in rows:
+        s, c = r["server"], r["client"]
+        kept = c["received"] / s["trades"] if s["trades"] else 1.0
+        print(f"{r['rate']:>6g} {s['flow_rate']:>7.1f} {s['trades'] / window:>9.1f} "
+              f"{c['received'] / window:>8.1f} {kept:>8.1%} {c['written']:>8} "
+              f"{c['ingress'].get('handler_us', {}).get('p99', 0):>10.0f}us {c['ingress'].get('high_water', 0):>9}")
+        if kept >= KEEP_UP:
+            ceiling = s["trades"] / window
+    print(f"persistence.py keeps up with "
+          f"{f'{ceiling:.0f}' if ceiling is not None else '-'} trades/s")
+
+
+REPORTS = {"gui": report_gui, "persistence": report_persistence}
+
+
+def main(args: list[str]) -> None:
+    names, rates, window, latency, verbose = [], None, WINDOW, 0.0, False
+    it = iter(args)
+    for a in it:
+        if a == "--rates":
+            rates = [float(r) for r in next(it).split(",")]
+        elif a == "--seconds":
+            window = float(next(it))
+        elif a == "--latency-ms":
+            latency = float(next(it)) / 1000
+        elif a == "--verbose":
+            verbose = True
+        elif a in CLIENTS:
+            names.append(a)
+        else:
+            sys.exit(f"usage: python bench_sim_server.py [{'|'.join(CLIENTS)} ...] "
+                     f"[--rates 25,50] [--seconds N] [--latency-ms N] [--verbose]")
+    for name in names or list(CLIENTS):
+        print(f"\n{name}: {window:g}s per rate, {latency * 1000:g}ms injected latency each way")
+        REPORTS[name]([run_step(name, rate, window, latency, verbose=verbose) for rate in rates or RATES[name]], window)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
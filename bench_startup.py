@@ -0,0 +1,124 @@
+"""
+Time from launch to ready against a local sim_server.py with link latency.
+
+    python bench_startup.py [--latency-ms 20] [--runs 5] [--markets 6]
+
+- sequential: start_client(), then subscribe_market() one market at a
+  time, as every bot's main() does; ready when the last call returns.
+- concurrent: the same main() with a startup.Startup on the client, ready
+  when wait_ready() returns (every market's first book and the account).
+- persistence: the bare-connection session and trade subscriptions sent
+  with WSClient.request(); ready once every request is acknowledged.
+  Before it was two fixed 3s sleeps.
+
+The server runs in the same process; `latency` is added to every frame in
+each direction, so one round trip costs twice that.
+"""
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+from huqt_oracle_pysdk import OracleClient
+from huqt_oracle_pysdk.request import ClientSetSessionRequest
+from huqt_oracle_pysdk.subscribe import ClientTradeSubscription
+
+from endpoint import use_gateway
+from sim_server import ExchangeServer, MARKETS
+from startup import Startup
+
+PORT = 8798
+DOMAIN = "HarvardYale"
+
+
+async def sequential(markets: list[str]) -> float:
+    client = OracleClient()
+    t0 = time.perf_counter()
+    await client.start_client(account="sequential", api_key="", domain=DOMAIN)
+    for m in markets:
+        await client.subscribe_market(m)
+    elapsed = time.perf_counter() - t0
+    await client.stop_client()
+    return elapsed
+
+
+async def concurrent(markets: list[str]) -> float:
+    client = OracleClient()
+    startup = Startup(client, markets)
+    t0 = time.perf_counter()
+    await client.start_client(account="concurrent", api_key="", domain=DOMAIN)
+    for m in markets:
+        await client.subscribe_market(m)
+    missing = await startup.wait_ready()
+    elapsed = time.perf_counter() - t0
+    await client.stop_client()
+    assert not missing, missing
+    return elapsed
+
+
+async def persistence(markets: list[str]) -> float:
+    from persistence import WSClient
+    ws_client = WSClient(f"ws://localhost:{PORT}/ws", "", None)
+
+    async def on_frame(msg: bytes):
+        pass
+
+    t0 = time.perf_counter()
+    await ws_client.connect()
+    listen_task = asyncio.create_task(ws_client.listen(on_frame))
+    uuids = []
+    uuid, raw_msg = ClientSetSessionRequest(domain=DOMAIN).to_bytes(account="persistence")
+    uuids.append(uuid)
+    await ws_client.request(uuid, raw_msg)
+    for m in markets:
+        uuid, raw_msg = ClientTradeSubscription(domain=DOMAIN, subscribe=True, market=m).to_bytes()
+        uuids.append(uuid)
+        await ws_client.request(uuid, raw_msg)
+    missing = await ws_client.acks.wait(uuids)
+    elapsed = time.perf_counter() - t0
+    listen_task.cancel()
+    await asyncio.gather(listen_task, return_exceptions=True)
+    await ws_client.close()
+    assert not missing, missing
+    return elapsed
+
+
+MODES = {"sequential": sequential, "concurrent": concurrent, "persistence": persistence}
+
+
+async def run(latency: float, runs: int, n_markets: int) -> dict[str, list[float]]:
+    server = ExchangeServer(flow=None, latency=latency)
+    markets = MARKETS[:n_markets]
+    use_gateway(f"ws://localhost:{PORT}/ws")
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        await server.start(port=PORT, run_flow=False)
+    times = {name: [] for name in MODES}
+    try:
+        for _ in range(runs):
+            for name, mode in MODES.items():
+                with contextlib.redirect_stdout(open(os.devnull, "w")):
+                    times[name].append(await mode(markets))
+    finally:
+        await server.stop()
+    return times
+
+
+def main(args: list[str]) -> None:
+    opts = {"--latency-ms": 20.0, "--runs": 5, "--markets": len(MARKETS)}
+    it = iter(args)
+    for a in it:
+        if a not in opts:
+            sys.exit(f"usage: python bench_startup.py {' '.join(f'[{k} N]' for k in opts)}")
+        opts[a] = type(opts[a])(next(it))
+    times = asyncio.run(run(opts["--latency-ms"] / 1000, opts["--runs"], opts["--markets"]))
+    print(f"{opts['--markets']} markets, {opts['--latency-ms']:g}ms each way, {opts['--runs']} runs; "
+          f"ms from launch to ready")
+    print(f"{'mode':>12} {'median':>8} {'min':>8} {'max':>8}")
+    for name, t in times.items():
+        print(f"{name:>12} {statistics.median(t) * 1000:>8.0f} {min(t) * 1000:>8.0f} {max(t) * 1000:>8.0f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Optional
+
+from huqt_oracle_pysdk import Side
+
+
+class SideLevels:
+    """
+    Aggregated levels of one side of a book, built once per snapshot.
+
+    `levels` are SDK-shaped {"price", "size"} dicts, best first. Lookups by
+    price are dict hits; anything relative to a price (next level, depth)
+    is a binary search over the sorted prices plus a prefix sum, so none of
+    them rescans the levels.
+    """
+    __slots__ = ("side", "prices", "sizes", "_asc", "_cum", "_size_at")
+
+    def __init__(self, side: int, levels: list):
+        self.side = side
+        self._size_at: dict[int, int] = {}
+        for lvl in levels:
+            self._size_at[lvl["price"]] = self._size_at.get(lvl["price"], 0) + lvl["size"]
+        # Best first: descending for bids, ascending for asks
+        self.prices = sorted(self._size_at, reverse=side == Side.Buy)
+        self.sizes = [self._size_at[p] for p in self.prices]
+        self._cum = list(accumulate(self.sizes))
+        self._asc = self.prices[::-1] if side == Side.Buy else self.prices
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def best(self) -> Optional[int]:
+        return self.prices[0] if self.prices else None
+
+    def size_at(self, price: int) -> int:
+        return self._size_at.get(price, 0)
+
+    def next_worse(self, price: int) -> Optional[int]:
+        """Closest level strictly behind `price` (lower bid / higher ask)."""
+        asc = self._asc
+        if self.side == Side.Buy:
+            i = bisect_left(asc, price)
+            return asc[i - 1] if i > 0 else None
+        i = bisect_right(asc, price)
+        return asc[i] if i < len(asc) else None
+
+    def next_better(self, price: int) -> Optional[int]:
+        """Closest level strictly ahead of `price` (higher bid / lower ask)."""
+        asc = self._asc
+        if self.side == Side.Buy:
+            i = bisect_right(asc, price)
+            return asc[i] if i < len(asc) else None
+        i = bisect_left(asc, price)
+        return asc[i - 1] if i > 0 else None
+
+    def depth_to(self, price: int) -> int:
+        """Total size at levels at least as good as `price` (inclusive)."""
+        n = self._n_at_least(price, inclusive=True)
+        return self._cum[n - 1] if n else 0
+
+    def queue_ahead(self, price: int, own: int = 0) -> int:
+        """
+        Size that trades before an order resting at `price`: every better
+        level plus the rest of its own level, where `own` is our size at
+        that price (taken to be at the back of the queue).
+        """
+        n = self._n_at_least(price, inclusive=False)
+        better = self._cum[n - 1] if n else 0
+        return better + max(self.size_at(price) - own, 0)
+
+    def _n_at_least(self, price: int, inclusive: bool) -> int:
+        """Number of levels better than (or, if inclusive, equal to) `price`."""
+        asc = self._asc
+        if self.side == Side.Buy:
+            return len(asc) - (bisect_left(asc, price) if inclusive else bisect_right(asc, price))
+        return bisect_right(asc, price) if inclusive else bisect_left(asc, price)
+
+
+class BookAnalytics:
+    """Bid and ask SideLevels for one book snapshot."""
+    __slots__ = ("market", "version", "bids", "asks")
+
+    def __init__(self, market: str, version: int, bids: list, asks: list):
+        self.market = market
+        self.version = version
+        self.bids = SideLevels(Side.Buy, bids)
+        self.asks = SideLevels(Side.Sell, asks)
+
+    def side(self, side: int) -> SideLevels:
+        return self.bids if side == Side.Buy else self.asks
+
+    @property
+    def spread(self) -> Optional[int]:
+        if self.bids.best is None or self.asks.best is None:
+            return None
+        return self.asks.best - self.bids.best
@@ -0,0 +1,331 @@
+"""
+OHLCV + VWAP candles per market at several resolutions.
+
+    candles = CandleAggregator()           # live: feed it every TradesStream frame
+    candles.add(market, trades)
+    candles.bars("HRVD", "1m")             # Bars, oldest first
+
+    python candles.py [out_dir] [--resolution 5m] [--logs logs] [--store store]
+
+The live side keeps one BarRing per market and resolution: preallocated
+slots indexed by bar number modulo the capacity, so a trade updates its
+bar in place in O(1), however late it is within the ring. The batch side
+(aggregate(), rebuild()) builds the same bars for a whole recorded session
+at once with NumPy grouping, and render() draws one PNG per market from
+either. Without arguments the script rebuilds the session persistence.py
+recorded (logs/, else store/) and regenerates full/{market}.png.
+"""
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from replay import Tape, _seconds_per_unit
+
+# name -> seconds per bar
+RESOLUTIONS = {"1s": 1, "1m": 60, "5m": 300}
+# Bars kept per resolution: an hour of 1s bars, ~3 days of 1m and 5m bars
+CAPACITY = {"1s": 3600, "1m": 4096, "5m": 1024}
+_EMPTY = -1
+_FIELDS = ("bucket", "first", "last", "open", "high", "low", "close", "volume", "buy_volume", "notional", "trades")
+
+
+@dataclass
+class Bars:
+    """
+    Candles of one market at one resolution, oldest first. `start` is in
+    the trades' own time unit; there are no bars for periods without trades.
+    """
+    period: int            # time units per bar
+    start: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    buy_volume: np.ndarray  # taker buys; the rest of the volume was taker sells
+    notional: np.ndarray    # sum of price * size
+    trades: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def vwap(self) -> np.ndarray:
+        return self.notional / np.maximum(self.volume, 1)
+
+    @property
+    def sell_volume(self) -> np.ndarray:
+        return self.volume - self.buy_volume
+
+
+class BarRing:
+    """
+    The most recent `capacity` bars of one market at one resolution.
+
+    Bar number b = time // period lives in slot b % capacity; the slot
+    remembers its bar number, so a trade either updates its bar, starts a
+    new one over a bar `capacity` periods old, or, if its bar has already
+    been overwritten, is counted in `late` and dropped. Slots are
+    preallocated lists of _FIELDS, which Python indexes faster than it
+    does array or NumPy scalars.
+    """
+    def __init__(self, period: int, capacity: int):
+        self.period = period
+        self.capacity = capacity
+        self.latest = _EMPTY
+        self.late = 0
+        self.slots = [[_EMPTY] + [0] * (len(_FIELDS) - 1) for _ in range(capacity)]
+
+    def add(self, t: int, price: int, size: int, side: int) -> None:
+        b = t // self.period
+        bar = self.slots[b % self.capacity]
+        if bar[0] != b:
+            if b <= self.latest - self.capacity:
+                self.late += 1
+                return
+            bar[:] = (b, t, t, price, price, price, price, size, size if side == 0 else 0, price * size, 1)
+            if b > self.latest:
+                self.latest = b
+            return
+        if price > bar[4]:
+            bar[4] = price
+        elif price < bar[5]:
+            bar[5] = price
+        if t >= bar[2]:
+            bar[2] = t
+            bar[6] = price
+        elif t < bar[1]:
+            bar[1] = t
+            bar[3] = price
+        bar[7] += size
+        if side == 0:
+            bar[8] += size
+        bar[9] += price * size
+        bar[10] += 1
+
+    def current(self) -> Optional[dict]:
+        """The latest bar as a dict, or None before the first trade."""
+        if self.latest == _EMPTY:
+            return None
+        bar = dict(zip(_FIELDS[3:], self.slots[self.latest % self.capacity][3:]))
+        bar["start"] = self.latest * self.period
+        bar["vwap"] = bar["notional"] / bar["volume"] if bar["volume"] else None
+        return bar
+
+    def bars(self) -> Bars:
+        """Copy of every bar still in the ring, oldest first."""
+        table = np.array(self.slots, dtype=np.int64)
+        bucket = table[:, 0]
+        order = np.flatnonzero(bucket > max(self.latest - self.capacity, _EMPTY))
+        table = table[order[np.argsort(bucket[order], kind="stable")]]
+        return Bars(
+            period=self.period,
+            start=table[:, 0] * self.period,
+            **{name: table[:, k] for k, name in enumerate(_FIELDS) if k >= 3},
+        )
+
+
+class CandleAggregator:
+    """
+    Live candles for every market seen, at every resolution.
+
+    `add` takes a frame as persistence.py has it: a list of trade dicts or
+    a TRADE_DTYPE array (trade_decode.py). The time unit is guessed from the
+    first trade (the logs are in milliseconds) unless `time_unit` gives the
+    seconds per unit.
+    """
+    def __init__(self, resolutions: Optional[dict[str, float]] = None, *,
+                 time_unit: Optional[float] = None):
+        self.resolutions = dict(resolutions or RESOLUTIONS)
+        self.time_unit = time_unit
+        self.rings: dict[str, list[BarRing]] = {}
+        self.trades = 0
+
+    def _rings(self, market: str, t: int) -> list[BarRing]:
+        if self.time_unit is None:
+            self.time_unit = _seconds_per_unit(t)
+        rings = self.rings[market] = [
+            BarRing(max(int(round(seconds / self.time_unit)), 1), CAPACITY.get(name, 4096))
+            for name, seconds in self.resolutions.items()
+        ]
+        return rings
+
+    def add_trade(self, market: str, t: int, price: int, size: int, side: int) -> None:
+        rings = self.rings.get(market) or self._rings(market, t)
+        for ring in rings:
+            ring.add(t, price, size, side)
+        self.trades += 1
+
+    def add(self, market: str, trades) -> None:
+        if len(trades) == 0:
+            return
+        if isinstance(trades, np.ndarray):
+            rows = zip(trades["time"].tolist(), trades["price"].tolist(),
+                       trades["size"].tolist(), trades["side"].tolist())
+        else:
+            rows = ((t["time"], t["price"], t["size"], 0 if t["taker_side"] == "buy" else 1) for t in trades)
+        rings = None
+        for t, price, size, side in rows:
+            if rings is None:
+                rings = self.rings.get(market) or self._rings(market, t)
+            for ring in rings:
+                ring.add(t, price, size, side)
+            self.trades += 1
+
+    def _ring(self, market: str, resolution: str) -> Optional[BarRing]:
+        rings = self.rings.get(market)
+        return rings[list(self.resolutions).index(resolution)] if rings else None
+
+    def bars(self, market: str, resolution: str) -> Optional[Bars]:
+        ring = self._ring(market, resolution)
+        return ring.bars() if ring else None
+
+    def current(self, market: str, resolution: str) -> Optional[dict]:
+        ring = self._ring(market, resolution)
+        return ring.current() if ring else None
+
+    def stats(self) -> dict:
+        return {
+            "markets": len(self.rings),
+            "trades": self.trades,
+            "late": sum(r.late for rings in self.rings.values() for r in rings),
+        }
+
+
+# ----------------------------------------------------
+# Batch
+# ----------------------------------------------------
+def aggregate(time: np.ndarray, price: np.ndarray, size: np.ndarray, side: np.ndarray, period: int) -> Bars:
+    """Bars of one market's trades (in time order) in one vectorized pass."""
+    time = np.asarray(time, dtype=np.int64)
+    price = np.asarray(price, dtype=np.int64)
+    size = np.asarray(size, dtype=np.int64)
+    if not len(time):
+        empty = np.zeros(0, dtype=np.int64)
+        return Bars(period, *([empty] * 9))
+    bucket = time // period
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(time)]
+    return Bars(
+        period=period,
+        start=bucket[starts] * period,
+        open=price[starts],
+        high=np.maximum.reduceat(price, starts),
+        low=np.minimum.reduceat(price, starts),
+        close=price[ends - 1],
+        volume=np.add.reduceat(size, starts),
+        buy_volume=np.add.reduceat(np.where(np.asarray(side) == 0, size, 0), starts),
+        notional=np.add.reduceat(price * size, starts),
+        trades=ends - starts,
+    )
+
+
+def rebuild(tape: Tape, resolutions: Optional[dict[str, float]] = None) -> dict[str, dict[str, Bars]]:
+    """market -> resolution -> Bars for a whole session."""
+    resolutions = resolutions or RESOLUTIONS
+    if not len(tape):
+        return {}
+    unit = _seconds_per_unit(tape.time[0])
+    out = {}
+    # The tape is in time order, so a stable sort by market keeps each
+    # market's trades in time order too
+    order = np.argsort(tape.market, kind="stable")
+    bounds = np.searchsorted(tape.market[order], np.arange(len(tape.names) + 1))
+    for i, market in enumerate(tape.names):
+        rows = order[bounds[i]:bounds[i + 1]]
+        t, px, sz, sd = tape.time[rows], tape.price[rows], tape.size[rows], tape.side[rows]
+        out[market] = {name: aggregate(t, px, sz, sd, max(int(round(seconds / unit)), 1))
+                       for name, seconds in resolutions.items()}
+    return out
+
+
+# ----------------------------------------------------
+# Rendering
+# ----------------------------------------------------
+def _boxes(x: np.ndarray, bottom: np.ndarray, top: np.ndarray, width: float) -> np.ndarray:
+    """Rectangles as PolyCollection vertices, (n, 4, 2)."""
+    left, right = x - width / 2, x + width / 2
+    return np.stack([np.stack([left, bottom], 1), np.stack([left, top], 1),
+                     np.stack([right, top], 1), np.stack([right, bottom], 1)], 1)
+
+
+def render(bars: dict[str, Bars], out_dir: str, time_unit: float = 1e-3) -> list[str]:
+    """
+    One candle chart per market (price above, taker buy volume up and sell
+    volume down below), in the style of full/ and in-game/. Needs matplotlib.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PolyCollection
+
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for market, b in bars.items():
+        if not len(b):
+            continue
+        x = mdates.date2num((b.start * int(time_unit * 1e9)).astype("datetime64[ns]"))
+        width = b.period * time_unit / 86400 * 0.7
+        up = b.close >= b.open
+
+        fig, (ax, vol) = plt.subplots(2, 1, sharex=True, figsize=(14, 7),
+                                      gridspec_kw={"height_ratios": [3, 1], "hspace": 0.03})
+        fig.suptitle(market, fontweight="bold")
+        # One collection per colour rather than a patch per bar, so a long
+        # session of 1s bars still renders in seconds
+        ax.vlines(x, b.low, b.high, color="black", linewidth=0.6)
+        lo, hi = np.minimum(b.open, b.close), np.maximum(b.open, b.close)
+        for mask, color in ((up, "#26a69a"), (~up, "#ef5350")):
+            ax.add_collection(PolyCollection(_boxes(x[mask], lo[mask], np.maximum(hi[mask], lo[mask] + 0.2), width),
+                                             facecolors=color, edgecolors=color, linewidths=0.3))
+        ax.plot(x, b.vwap, color="#1f77b4", linewidth=0.8, label="VWAP")
+        ax.set_ylabel("Price")
+        ax.legend(loc="upper left")
+        zero = np.zeros(len(b))
+        vol.add_collection(PolyCollection(_boxes(x, zero, b.buy_volume, width), facecolors="green", edgecolors="none"))
+        vol.add_collection(PolyCollection(_boxes(x, -b.sell_volume, zero, width), facecolors="red", edgecolors="none"))
+        vol.autoscale_view()
+        vol.xaxis.set_major_formatter(mdates.DateFormatter("%b %d, %H:%M"))
+        for a in (ax, vol):
+            a.yaxis.tick_right()
+            a.grid(True, color="#dddddd")
+        fig.autofmt_xdate(rotation=45)
+
+        path = os.path.join(out_dir, f"{market}.png")
+        fig.savefig(path, dpi=100, bbox_inches="tight")
+        plt.close(fig)
+        written.append(path)
+    return written
+
+
+def main(args: list[str]) -> None:
+    out_dir, resolution, logs, store = "full", "5m", "logs", "store"
+    it = iter(args)
+    for a in it:
+        if a == "--resolution":
+            resolution = next(it)
+        elif a == "--logs":
+            logs = next(it)
+        elif a == "--store":
+            store = next(it)
+        elif not a.startswith("--"):
+            out_dir = a
+        else:
+            sys.exit("usage: python candles.py [out_dir] [--resolution 1s|1m|5m] [--logs DIR] [--store DIR]")
+    if resolution not in RESOLUTIONS:
+        sys.exit(f"unknown resolution {resolution}, expected one of {', '.join(RESOLUTIONS)}")
+
+    tape = Tape.load(logs=logs, store=store)
+    if tape is None or not len(tape):
+        sys.exit(f"No trades in {logs}/ or {store}/ (record some with persistence.py)")
+    bars = rebuild(tape, {resolution: RESOLUTIONS[resolution]})
+    paths = render({m: r[resolution] for m, r in bars.items()}, out_dir, _seconds_per_unit(tape.time[0]))
+    print(f"🕯️ {len(tape)} trades -> {len(paths)} charts in {out_dir}/")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
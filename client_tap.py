@@ -0,0 +1,32 @@
+from typing import Callable, Optional
+
+from huqt_oracle_pysdk import OracleClient
+
+from trade_decode import peek_response
+
+# callback(response_type, market, msg); market is only set for L2 book and trade frames
+TapCallback = Callable[[int, Optional[str], bytes], None]
+
+
+def tap(client: OracleClient, callback: TapCallback) -> None:
+    """
+    Run `callback` after the OracleClient has applied each incoming frame, so
+    listeners see the client's state already updated. Must be installed
+    before client.start_client(), which binds the message handler.
+    """
+    if client.listen_task is not None:
+        raise RuntimeError("tap() must be installed before start_client()")
+
+    callbacks = getattr(client, "_tap_callbacks", None)
+    if callbacks is None:
+        callbacks = client._tap_callbacks = []
+        handler = client.message_handler
+
+        async def tapped(msg: bytes):
+            await handler(msg)
+            kind, market = peek_response(msg)
+            for cb in callbacks:
+                cb(kind, market, msg)
+
+        client.message_handler = tapped
+    callbacks.append(callback)
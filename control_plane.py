@@ -0,0 +1,147 @@
+import asyncio
+import concurrent.futures
+import threading
+from collections import deque
+from typing import Any, Callable, Optional
+
+from aiohttp import web
+
+
+class SnapshotBox:
+    """
+    Latest immutable state published by one thread for readers on others.
+
+    publish() swaps a single reference and get() reads it, both atomic under
+    the GIL, so neither side ever waits on a lock. Publishers must treat a
+    published object as frozen and build a new one for the next update.
+    """
+    __slots__ = ("_value", "version")
+
+    def __init__(self, value: Any = None):
+        self._value = value
+        self.version = 0
+
+    def publish(self, value: Any) -> None:
+        self._value = value
+        self.version += 1
+
+    def get(self) -> Any:
+        return self._value
+
+
+class CommandQueue:
+    """
+    Commands from the control plane, executed on the trading loop.
+
+    submit(fn, *args) may be called from any thread; fn(*args) later runs
+    on the loop that called serve(), between the trader's own callbacks,
+    and its result (or exception) resolves the returned future.
+    """
+    def __init__(self):
+        self._pending: deque = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.executed = 0
+
+    def submit(self, fn: Callable, *args) -> concurrent.futures.Future:
+        if self._loop is None:
+            raise RuntimeError("CommandQueue.serve() is not running")
+        fut = concurrent.futures.Future()
+        self._pending.append((fn, args, fut))
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return fut
+
+    async def call(self, fn: Callable, *args) -> Any:
+        """submit() and await the result from any event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    async def serve(self) -> None:
+        """Run submitted commands until cancelled. Call on the trading loop."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._pending:
+                    fn, args, fut = self._pending.popleft()
+                    if not fut.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        fut.set_result(fn(*args))
+                    except Exception as e:
+                        fut.set_exception(e)
+                    self.executed += 1
+        finally:
+            self._loop = None
+            while self._pending:
+                self._pending.popleft()[2].cancel()
+
+
+class ControlPlane:
+    """
+    Runs an aiohttp app either on the caller's loop ("inline") or on a
+    dedicated thread with its own event loop ("thread"), so dashboard
+    traffic is served without queueing behind the trading loop's callbacks.
+
+    `app_factory` is called on the loop that will serve the app. Handlers
+    must then only read state through a SnapshotBox and change it through
+    a CommandQueue.
+    """
+    def __init__(self, app_factory: Callable[[], web.Application], host: str, port: int,
+                 *, threaded: bool = True):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.threaded = threaded
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        if not self.threaded:
+            self.loop = asyncio.get_running_loop()
+            await self._serve_start()
+            return
+        started = concurrent.futures.Future()
+        self._thread = threading.Thread(target=self._thread_main, args=(started,),
+                                        name="control-plane", daemon=True)
+        self._thread.start()
+        await asyncio.wrap_future(started)
+
+    def call_soon(self, fn: Callable, *args) -> None:
+        """Schedule fn(*args) on the web loop; safe from any thread."""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    async def stop(self) -> None:
+        if not self.threaded:
+            if self._runner:
+                await self._runner.cleanup()
+            return
+        if self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self._stopped.set)
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    async def _serve_start(self) -> None:
+        self._runner = web.AppRunner(self.app_factory())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    def _thread_main(self, started: concurrent.futures.Future) -> None:
+        async def main():
+            self.loop = asyncio.get_running_loop()
+            self._stopped = asyncio.Event()
+            try:
+                await self._serve_start()
+            except Exception as e:
+                started.set_exception(e)
+                return
+            started.set_result(None)
+            await self._stopped.wait()
+            await self._runner.cleanup()
+
+        asyncio.run(main())
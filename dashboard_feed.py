@@ -0,0 +1,270 @@
+import asyncio
+import json
+import time
+from typing import Callable, Iterable, Optional
+
+from aiohttp import web, WSMsgType
+
+from control_plane import SnapshotBox
+
+# market -> flat dict of the fields shown for it, or None to hide the market
+RowFunction = Callable[[str], Optional[dict]]
+
+
+class _Subscriber:
+    def __init__(self, ws: web.WebSocketResponse, max_backlog: int):
+        self.ws = ws
+        self.queue: asyncio.Queue = asyncio.Queue(max_backlog)
+        # Set when frames were dropped; the next frame it gets is a snapshot
+        self.resync = False
+
+
+class StatusFeed:
+    """
+    Pushes dashboard rows to any number of WebSocket clients.
+
+    Callers mark markets dirty as things change (book, positions, config).
+    At most `max_fps` times a second the feed rebuilds the dirty rows once,
+    diffs them against what was last sent and encodes a single delta frame
+    holding only the fields that changed; every connected tab gets the same
+    encoded frame, so extra tabs cost a socket write each and nothing more.
+
+    Frames (JSON):
+        {"type": "snapshot", "rows": {market: row, ...}}    on connect/resync
+        {"type": "delta", "rows": {market: {field: value, ...}, ...},
+         "removed": [market, ...]}
+    """
+    def __init__(self, row: RowFunction, markets: Callable[[], Iterable[str]],
+                 *, max_fps: float = 10, max_backlog: int = 8):
+        self.row = row
+        self.markets = markets
+        self.min_interval = 1 / max_fps
+        self.max_backlog = max_backlog
+
+        self._rows: dict[str, dict] = {}
+        self._dirty: set = set()
+        self._all_dirty = True
+        # Created with the producer task, on the loop serving the feed
+        self._wakeup: Optional[asyncio.Event] = None
+        self._subscribers: list[_Subscriber] = []
+        self._task: Optional[asyncio.Task] = None
+
+        self.frames = 0
+        self.rows_sent = 0
+        self.bytes_sent = 0
+        self.marks = 0
+        self.dropped = 0
+
+    def mark(self, market: str) -> None:
+        self.marks += 1
+        self._dirty.add(market)
+        if self._wakeup:
+            self._wakeup.set()
+
+    def mark_all(self) -> None:
+        self.marks += 1
+        self._all_dirty = True
+        if self._wakeup:
+            self._wakeup.set()
+
+    def mark_many(self, markets: Optional[Iterable[str]]) -> None:
+        """mark() each of `markets`; None means all of them."""
+        if markets is None:
+            self.mark_all()
+            return
+        for m in markets:
+            self.mark(m)
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        """aiohttp handler: app.router.add_get("/ws/status", feed.handle)."""
+        ws = web.WebSocketResponse(heartbeat=20)
+        await ws.prepare(request)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._produce())
+
+        sub = _Subscriber(ws, self.max_backlog)
+        # Starts with a snapshot of what the other tabs have been sent, then
+        # a full refresh brings every tab up to date (rows may be stale if
+        # nobody was watching)
+        sub.resync = True
+        sub.queue.put_nowait(None)
+        self._subscribers.append(sub)
+        self.mark_all()
+        sender = asyncio.create_task(self._send(sub))
+        try:
+            # Nothing is expected from the browser; just wait for it to go away
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._subscribers.remove(sub)
+            sender.cancel()
+        return ws
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "frames": self.frames,
+            "rows_sent": self.rows_sent,
+            "bytes_sent": self.bytes_sent,
+            "marks": self.marks,
+            "dropped": self.dropped,
+        }
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for sub in list(self._subscribers):
+            await sub.ws.close()
+
+    def _refresh(self) -> tuple[dict, list]:
+        """Rebuild dirty rows; returns (changed fields per market, removed markets)."""
+        removed = []
+        if self._all_dirty:
+            markets = list(self.markets())
+            listed = set(markets)
+            removed = [m for m in self._rows if m not in listed]
+            self._all_dirty = False
+        else:
+            markets = list(self._dirty)
+        self._dirty.clear()
+
+        changed = {}
+        for m in markets:
+            row = self.row(m)
+            if row is None:
+                if m in self._rows:
+                    removed.append(m)
+                continue
+            prev = self._rows.get(m)
+            if prev is None:
+                changed[m] = row
+            else:
+                diff = {k: v for k, v in row.items() if prev.get(k) != v}
+                if diff:
+                    changed[m] = diff
+            self._rows[m] = row
+        for m in removed:
+            self._rows.pop(m, None)
+        return changed, removed
+
+    async def _produce(self) -> None:
+        last = 0.0
+        while True:
+            await self._wakeup.wait()
+            # Coalesce everything that changes within one frame interval
+            wait = last + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._wakeup.clear()
+            last = time.monotonic()
+
+            if not self._subscribers:
+                # Nobody watching: leave everything dirty for the next snapshot
+                self._all_dirty = True
+                continue
+            changed, removed = self._refresh()
+            if not changed and not removed:
+                continue
+            frame = json.dumps({"type": "delta", "rows": changed, "removed": removed},
+                               separators=(",", ":"))
+            self.frames += 1
+            self.rows_sent += len(changed)
+            for sub in self._subscribers:
+                if sub.resync:
+                    continue
+                try:
+                    sub.queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    # Slow tab: throw its backlog away and send it a fresh snapshot
+                    self.dropped += sub.queue.qsize()
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.resync = True
+                    sub.queue.put_nowait(None)
+
+    async def _send(self, sub: _Subscriber) -> None:
+        try:
+            while True:
+                frame = await sub.queue.get()
+                if frame is None:
+                    sub.resync = False
+                    frame = json.dumps({"type": "snapshot", "rows": self._rows}, separators=(",", ":"))
+                await sub.ws.send_str(frame)
+                self.bytes_sent += len(frame)
+        except (ConnectionResetError, RuntimeError):
+            # Tab went away mid-send; handle() cleans up
+            pass
+
+
+class RowPublisher:
+    """
+    Trading-loop side of a dashboard served from another thread.
+
+    Same marking API as StatusFeed, but instead of sending anything it
+    rebuilds the dirty rows at most `max_fps` times a second into a new
+    {market: row} dict, publishes it to `box`, and calls listeners with the
+    set of markets that changed (None after a full rebuild). The row
+    function therefore only ever runs on the trading loop.
+    """
+    def __init__(self, row: RowFunction, markets: Callable[[], Iterable[str]], box: SnapshotBox,
+                 *, max_fps: float = 20):
+        self.row = row
+        self.markets = markets
+        self.box = box
+        self.min_interval = 1 / max_fps
+        self._dirty: set = set()
+        self._all_dirty = True
+        self._wakeup = asyncio.Event()
+        self._listeners: list[Callable[[Optional[set]], None]] = []
+        self.publishes = 0
+
+    def add_listener(self, callback: Callable[[Optional[set]], None]) -> None:
+        self._listeners.append(callback)
+
+    def mark(self, market: str) -> None:
+        self._dirty.add(market)
+        self._wakeup.set()
+
+    def mark_all(self) -> None:
+        self._all_dirty = True
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        last = 0.0
+        while True:
+            await self._wakeup.wait()
+            wait = last + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._wakeup.clear()
+            last = time.monotonic()
+
+            if self._all_dirty:
+                self._all_dirty = False
+                self._dirty.clear()
+                rows = {}
+                for m in self.markets():
+                    row = self.row(m)
+                    if row is not None:
+                        rows[m] = row
+                changed = None
+            else:
+                changed, self._dirty = self._dirty, set()
+                rows = dict(self.box.get() or {})
+                for m in changed:
+                    row = self.row(m)
+                    if row is None:
+                        rows.pop(m, None)
+                    else:
+                        rows[m] = row
+            self.box.publish(rows)
+            self.publishes += 1
+            for cb in self._listeners:
+                cb(changed)
@@ -0,0 +1,38 @@
+"""
+Which gateway the bots connect to. Set ORACLE_WS_URL (e.g. in .env) to
+point them somewhere other than the exchange, such as a local
+sim_server.py at ws://localhost:8765/ws.
+"""
+import os
+from typing import Optional
+
+import huqt_oracle_pysdk.oracle as _oracle
+from huqt_oracle_pysdk.websocket import WSClient as _SdkWSClient
+
+EXCHANGE_URL = "wss://api.oracle.huqt.xyz/ws"
+
+
+def gateway_url() -> str:
+    return os.getenv("ORACLE_WS_URL", EXCHANGE_URL)
+
+
+def ssl_for(url: str, ctx):
+    """The TLS context to connect to `url` with; plain ws:// takes none."""
+    return ctx if url.startswith("wss://") else None
+
+
+def use_gateway(url: Optional[str] = None) -> None:
+    """
+    Make OracleClient.start_client() connect to `url` (default
+    gateway_url()) instead of the URL the SDK has built in.
+    """
+    url = url or gateway_url()
+    if url == EXCHANGE_URL:
+        _oracle.WSClient = _SdkWSClient
+        return
+
+    class RedirectedWSClient(_SdkWSClient):
+        def __init__(self, _url: str, api_key: str, ctx):
+            super().__init__(url, api_key, ssl_for(url, ctx))
+
+    _oracle.WSClient = RedirectedWSClient
@@ -2,15 +2,21 @@ from huqt_oracle_pysdk import OracleClient, Side, Tif
 from dotenv import load_dotenv
 import asyncio
 import os
+from instrument import Instrumentation
+from startup import Startup
 
 ## Update the markets list to keep track of those markets.
 haorzhe = OracleClient()
+instruments = Instrumentation(haorzhe, report_every=None)
 markets = ["110"]
+startup = Startup(haorzhe, markets)
 
 async def trade_handler():
+    await startup.wait_ready()
     print("\n\033[1;32m-------- Below are the logs for user algorithm --------\033[0m")
     print(haorzhe.get_self_positions())
     await haorzhe.place_limit_order("110", Side.Buy, 200, 1, Tif.Gtc)
+    print(instruments.log_line())
 
 ## ------------ DO NOT CHANGE BELOW THIS LINE ------------
 async def main():
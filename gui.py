@@ -1,11 +1,25 @@
 import asyncio
 import os
+import sys
+import time
 from dotenv import load_dotenv
 from dataclasses import dataclass
+from typing import Optional
 from aiohttp import web
-from huqt_oracle_pysdk import OracleClient, Side, Tif
-
-latest_positions: dict[str, int] = {}
+from huqt_oracle_pysdk import OracleClient, Side
+from local_book import LocalBook
+from scheduler import MarketScheduler
+from rate_limiter import OrderGateway, OrderAction
+from reconcile import reconcile, ladder
+from market_registry import MarketRegistry
+from ledger import Ledger
+from startup import Startup
+from dashboard_feed import StatusFeed, RowPublisher
+from control_plane import ControlPlane, SnapshotBox, CommandQueue
+from metrics import LatencyHistogram
+from instrument import Instrumentation, summarize
+from endpoint import use_gateway
+from shards import ShardCoordinator, ShardLink
 
 @dataclass
 class MarketConfig:
@@ -21,81 +35,28 @@ class MarketConfig:
 # ----------------------------------------------------
 configs: dict[str, MarketConfig] = {}
 haorzhe = OracleClient()
-meta = None
+local_book = LocalBook(haorzhe)
+registry = MarketRegistry(haorzhe)
+ledger = Ledger(haorzhe, registry)
+startup = Startup(haorzhe)
+scheduler = MarketScheduler(haorzhe, local_book, debounce=0.01, max_staleness=1.0, log_errors=True)
+# Every cancel/place goes through here: 50 orders/sec venue limit, sells
+# (which only ever reduce inventory on a spot venue) ahead of buys
+gateway = OrderGateway(haorzhe, rate=50)
+# "batch": plan all changed markets, then send every market's actions concurrently
+# "market": each market is requoted on its own as it changes
+QUOTE_MODE = "batch"
+cycle_latency = LatencyHistogram("requote cycle")
+# "thread": serve the dashboard/API from its own thread and event loop
+# "inline": serve it from the trading loop
+WEB_MODE = "thread"
+# Per-call latency, tick-to-trade and loop lag: logged every 30s and
+# published for /api/metrics
+metrics_box = SnapshotBox(None)
+instruments = Instrumentation(haorzhe, box=metrics_box)
+instruments.add(cycle_latency, scheduler.reaction_latency)
+loop_lag = instruments.loop_lag
 markets = []
-# ----------------------------------------------------
-# Ensure correct liquidity depth (only top-up if < 50%)
-# ----------------------------------------------------
-async def top_up_orders(
-    market,
-    orders,
-    bid_price,
-    ask_price,
-    target_bid_sz,
-    target_ask_sz,
-):
-    """Maintain exact target size at bid/ask price levels without relying on updated `orders`."""
-    def filter_orders(price, side):
-        return [o for o in orders if o["side"] == side and o["price"] == price]
-
-    async def handle_side(price, side, target):
-        side_str = "BID" if side == Side.Buy else "ASK"
-        level_orders = filter_orders(price, side)
-
-        # current total size
-        current = sum(o["size"] for o in level_orders)
-
-        # If target < 0 → nuke all
-        if target < 0:
-            print(f"[{market}] {side_str}: target < 0 → cancelling all orders")
-            for o in level_orders:
-                await haorzhe.cancel_order(market, o["oid"])
-            return
-
-        # ============================
-        # Step 1: Reduce excess first
-        # ============================
-
-        excess = current - target
-        if excess > 0:
-            print(f"[{market}] {side_str}: reducing excess={excess}, current={current}, target={target}")
-
-            # cancel highest oid first = worst queue
-            for o in sorted(level_orders, key=lambda x: x["oid"], reverse=True):
-                if excess <= 0:
-                    break
-
-                if o["size"] <= excess:
-                    # fully cancel order
-                    print(f"    cancel {side_str} {o['oid']} size={o['size']} (worst queue)")
-                    await haorzhe.cancel_order(market, o["oid"])
-                    excess -= o["size"]
-                    current -= o["size"]
-                else:
-                    # trim by cancelling & replacing smaller
-                    new_size = o["size"] - excess
-                    print(f"    trim {side_str} {o['oid']} => new_size={new_size}")
-                    await haorzhe.cancel_order(market, o["oid"])
-                    await haorzhe.place_limit_order(market, side, price, new_size, Tif.Gtc)
-                    current -= (o["size"] - new_size)
-                    excess = 0
-
-        # ============================
-        # Step 2: Top-up if below target
-        # ============================
-
-        missing = target - current
-        if missing > 0:
-            print(f"[{market}] {side_str}: topping up missing={missing}, final_current={current}")
-            await haorzhe.place_limit_order(market, side, price, missing, Tif.Gtc)
-
-    # run both sides
-    await handle_side(bid_price, Side.Buy,  target_bid_sz)
-    await handle_side(ask_price, Side.Sell, target_ask_sz)
-
-
-
-
 # ----------------------------------------------------
 # Filter out *my* orders from the public book
 # ----------------------------------------------------
@@ -166,87 +127,185 @@ def compute_mid(book):
 
 
 # ----------------------------------------------------
-# Cancel all orders not at correct bid/ask
+# Cancel all orders
 # ----------------------------------------------------
-async def prune_orders(market, orders, bid_price, ask_price):
-    for o in orders:
-        side = o["side"]
-        price = o["price"]
-        oid = o["oid"]
+def plan_im_out(market, orders):
+    return [OrderAction("cancel", market, oid=o["oid"]) for o in orders]
+
 
-        if side == Side.Buy and price != bid_price:
-            await haorzhe.cancel_order(market, oid)
+# ----------------------------------------------------
+# Trading logic
+# ----------------------------------------------------
+def plan_market(market, my_orders):
+    """Every cancel/place needed to bring `market` in line with its config, cancels first."""
+    info = registry.get(market)
+    if info is None:
+        return []
+    # Our own orders' book updates can arrive before their acks and deltas:
+    # count what was sent (or queued) and not acked yet, so it is not sent twice
+    in_flight, cancelling = gateway.unacked(market)
+    my_orders = [o for o in my_orders if o["oid"] not in cancelling]
+    cfg = configs.get(market, None)
+    if cfg is None:
+        return plan_im_out(market, my_orders)
+
+    if not cfg.quoting:
+        return plan_im_out(market, my_orders)
+    bid_price = cfg.fair - cfg.spread // 2
+    ask_price = bid_price + cfg.spread
+    print(f"[{market}] bid={bid_price}, ask={ask_price}")
+
+    # Rest exactly enough at bid/ask to reach the position bounds, touching
+    # as few of the orders already resting there as possible
+    pos = ledger.total(info.base)
+    actions = reconcile(market, my_orders,
+                        bids=ladder(bid_price, cfg.position_ub - pos),
+                        asks=ladder(ask_price, pos - cfg.position_lb),
+                        pending=in_flight)
+    if actions:
+        n_cancel = sum(a.kind == "cancel" for a in actions)
+        print(f"[{market}] reconcile: {n_cancel} cancels, {len(actions) - n_cancel} places")
+    return actions
+
+
+async def quote_market(market):
+    # All my open orders (keyed by market)
+    all_orders = haorzhe.get_self_open_orders()
+    await gateway.execute(plan_market(market, all_orders.get(market, [])))
+
+
+async def requote(changed_markets):
+    """Plan every changed market first, then send all markets' actions concurrently."""
+    start = time.perf_counter_ns()
+    all_orders = haorzhe.get_self_open_orders()
+
+    plans = {m: plan_market(m, all_orders.get(m, [])) for m in markets if m in changed_markets}
+    await gateway.execute_all(plans)
+    cycle_latency.record_since(start)
+
+
+async def trade_handler():
+    print("\n\033[1;32m--- MID-PRICE (EXCLUDING SELF ORDERS) STARTED ---\033[0m")
+    # Requote a market when its book, our fills/orders in it or its config
+    # change, and at least once a second regardless
+    if QUOTE_MODE == "batch":
+        await scheduler.run_batch(requote, markets)
+    else:
+        await scheduler.run(quote_market, markets)
+
+
+def market_row(m):
+    """One dashboard row, flat so the live feed can send per-field deltas."""
+    info = registry.get(m)
+    if info is None:
+        return None
+    cfg = configs.get(m, None)
+    return {
+        "name": m,
+        "base": info.base,
+        "quote": info.quote,
+        "position": ledger.total(info.base),
+        "best_bid": local_book.best_bid(m),
+        "best_ask": local_book.best_ask(m),
+        "has_config": cfg is not None,
+        "fair": None if cfg is None else cfg.fair,
+        "spread": None if cfg is None else cfg.spread,
+        "position_lb": None if cfg is None else cfg.position_lb,
+        "position_ub": None if cfg is None else cfg.position_ub,
+        "quoting": cfg is not None and cfg.quoting,
+    }
+
+
+# The web side never touches trading state: the trader publishes dashboard
+# rows (at most 20 times/sec, only rebuilding markets whose book, position or
+# config changed) and the web side sends config changes back as commands
+status_box = SnapshotBox({})
+commands = CommandQueue()
+publisher = RowPublisher(market_row, lambda: markets, status_box, max_fps=20)
+local_book.add_listener(lambda snap: publisher.mark(snap.market))
+ledger.add_listener(publisher.mark_all)
+
+# Rows are pushed to every open tab over /ws/status, at most 10 frames/sec
+feed = StatusFeed(lambda m: status_box.get().get(m), lambda: list(status_box.get()), max_fps=10)
+publisher.add_listener(lambda changed: control_plane.call_soon(feed.mark_many, changed))
 
-        elif side == Side.Sell and price != ask_price:
-            await haorzhe.cancel_order(market, oid)
 
 # ----------------------------------------------------
-# Cancel all orders not at correct bid/ask
+# Commands from the web side (run on the trading loop)
 # ----------------------------------------------------
-async def im_out(market, orders):
-    for o in orders:
-        oid = o["oid"]
-        await haorzhe.cancel_order(market, oid)
+def set_config(market, body):
+    if not market or market not in markets:
+        return {"error": "unknown market"}, 400
+
+    cfg = MarketConfig(0, 0, 0, 0, False)
+    # update fields if provided
+    if "fair" in body:
+        cfg.fair = int(body["fair"])
+    if "spread" in body:
+        cfg.spread = int(body["spread"])
+    if "position_lb" in body:
+        cfg.position_lb = int(body["position_lb"])
+    if "position_ub" in body:
+        cfg.position_ub = int(body["position_ub"])
+    configs[market] = cfg
+    scheduler.notify(market)
+    publisher.mark(market)
+    return {"ok": True}, 200
+
+
+def toggle_quoting(market):
+    if not market or market not in configs:
+        return {"error": "unknown market"}, 400
+
+    cfg = configs[market]
+    cfg.quoting = not cfg.quoting
+    scheduler.notify(market)
+    publisher.mark(market)
+    return {"ok": True, "quoting": cfg.quoting}, 200
+
+
+COMMANDS = {"set_config": set_config, "toggle_quoting": toggle_quoting}
 
 
 # ----------------------------------------------------
-# Trading logic
+# Sharded mode: python gui.py --shards N (see shards.py)
 # ----------------------------------------------------
-async def trade_handler():
-    print("\n\033[1;32m--- MID-PRICE (EXCLUDING SELF ORDERS) STARTED ---\033[0m")
-    global latest_positions
-    while True:
-        # All markets' books
-        # All my open orders (keyed by market)
-        all_orders = haorzhe.get_self_open_orders()
-        raw_positions = haorzhe.get_self_positions()
-        
-        agg_positions: dict[str, int] = {}
-        for k, v in raw_positions.items():
-            asset, _acct = k.split(":", 1)
-            agg_positions[asset] = agg_positions.get(asset, 0) + v
-
-        latest_positions = agg_positions  # expose to GUI
-
-        for market in markets:
-            base = None
-            quote = None
-            for m_meta in meta['Markets Metadata']:
-                if market == m_meta['name']:
-                    base = m_meta['base']
-                    quote = m_meta['quote']
-            if base is None or quote is None:
-                continue
-            cfg = configs.get(market, None)
-            my_orders = all_orders.get(market, [])
-            if cfg is None:
-                await im_out(market, my_orders)
-                continue
-
-            if not cfg.quoting:
-                await im_out(market, my_orders)
-                continue
-            bid_price = cfg.fair - cfg.spread // 2
-            ask_price = bid_price + cfg.spread
-            print(f"[{market}] bid={bid_price}, ask={ask_price}")
-
-            # Step 1: Cancel wrong-price orders
-            await prune_orders(market, my_orders, bid_price, ask_price)
-
-            # Step 2: (optional, you commented out) top-up
-            updated_orders = haorzhe.get_self_open_orders().get(market, [])
-            positions = haorzhe.get_self_positions()
-            pos = positions.get(f"{base}:main", 0) + positions.get(f"{base}:collateral", 0)
-            await top_up_orders(market, updated_orders, bid_price, ask_price, target_bid_sz=cfg.position_ub - pos, target_ask_sz =  pos - cfg.position_lb)
-
-        await asyncio.sleep(1.0)
+# Set in a shard worker, which only quotes the markets it owns
+shard: Optional[ShardLink] = None
+# Set in the coordinator, which serves the dashboard while the shards trade
+coordinator: Optional[ShardCoordinator] = None
+
+
+def owns(market):
+    return shard is None or shard.owns(market)
+
+
+async def run_command(name, market, *args):
+    """A dashboard command, run on the trading loop of whichever process quotes `market`."""
+    if coordinator is None:
+        return await commands.call(COMMANDS[name], market, *args)
+    if market not in coordinator.rows:
+        return {"error": "unknown market"}, 400
+    return await coordinator.call(market, name, market, *args)
+
+
+def shard_stats():
+    g = gateway.stats()
+    return {
+        "markets": len(markets),
+        "orders_per_sec": g["orders_per_sec"],
+        "backlog": sum(g["pending"].values()),
+        "requotes": cycle_latency.count,
+        "cycle_p99_us": cycle_latency.snapshot().get("p99", 0),
+        "loop_lag_p99_us": loop_lag.lag.snapshot().get("p99", 0),
+    }
 
 
 def build_web_app():
     app = web.Application()
 
     async def index(request):
-        # minimal HTML; frontend polls /api/status and posts to /api/config & /api/quoting
+        # minimal HTML; frontend follows /ws/status and posts to /api/config & /api/quoting
         return web.Response(
             content_type="text/html",
             text="""
@@ -325,44 +384,95 @@ let cachedMarkets = [];
 
 
 // -------------------------------------------
-// POPULATE LIVE STATUS TABLE
+// LIVE STATUS TABLE (pushed over /ws/status)
 // -------------------------------------------
-async function fetchStatus() {
-  const res = await fetch('/api/status');
-  const data = await res.json();
-  cachedMarkets = data.markets;
+const rows = {};        // market -> latest row
+const rowEls = {};      // market -> <tr>
+
+const COLUMNS = [
+  ['name',        v => v],
+  ['position',    v => v],
+  ['best_bid',    v => v ?? '-'],
+  ['best_ask',    v => v ?? '-'],
+  ['fair',        v => v ?? '-'],
+  ['spread',      v => v ?? '-'],
+  ['position_lb', v => v ?? '-'],
+  ['position_ub', v => v ?? '-'],
+  ['quoting',     v => v ? '🟢 ON' : '🔴 OFF'],
+];
+
+function renderRow(market, changed) {
+  const row = rows[market];
+  let tr = rowEls[market];
+  if (!tr) {
+    tr = document.createElement('tr');
+    for (const [field] of COLUMNS) {
+      const td = document.createElement('td');
+      td.dataset.field = field;
+      tr.appendChild(td);
+    }
+    const td = document.createElement('td');
+    td.innerHTML = `<button data-toggle="${market}">Toggle</button>`;
+    tr.appendChild(td);
+    document.querySelector('#status-table tbody').appendChild(tr);
+    rowEls[market] = tr;
+    changed = row;
+  }
+  // Only touch the cells whose value changed
+  for (const [field, fmt] of COLUMNS) {
+    if (field in changed) {
+      tr.querySelector(`td[data-field="${field}"]`).textContent = fmt(row[field]);
+    }
+  }
+  if ('has_config' in changed) {
+    tr.querySelector('button').disabled = !row.has_config;
+  }
+}
 
-  if (!windowInit) {
-    populateDropdown();       // <-- NEW
+function removeRow(market) {
+  delete rows[market];
+  if (rowEls[market]) {
+    rowEls[market].remove();
+    delete rowEls[market];
+  }
+}
+
+function applyFrame(frame) {
+  if (frame.type === 'snapshot') {
+    for (const m of Object.keys(rows)) {
+      if (!(m in frame.rows)) removeRow(m);
+    }
+    for (const [m, row] of Object.entries(frame.rows)) {
+      rows[m] = row;
+      renderRow(m, row);
+    }
+  } else {
+    for (const m of frame.removed) removeRow(m);
+    for (const [m, diff] of Object.entries(frame.rows)) {
+      const isNew = !(m in rows);
+      rows[m] = Object.assign(rows[m] || {}, diff);
+      renderRow(m, diff);
+      if (isNew && windowInit) populateDropdown();
+    }
+  }
+  cachedMarkets = Object.values(rows);
+
+  if (!windowInit && cachedMarkets.length) {
+    populateDropdown();
     loadEditorConfig(cachedMarkets[0].name);
     windowInit = true;
   }
+}
 
-  const tbody = document.querySelector('#status-table tbody');
-  tbody.innerHTML = '';
-
-  for (const m of data.markets) {
-    const tr = document.createElement('tr');
-    const toggleDisabled = m.has_config ? '' : 'disabled';
-
-    tr.innerHTML = `
-        <td>${m.name}</td>
-        <td>${m.position}</td>
-        <td>${m.best_bid ?? '-'}</td>
-        <td>${m.best_ask ?? '-'}</td>
-        <td>${m.config ? m.config.fair : '-'}</td>
-        <td>${m.config ? m.config.spread : '-'}</td>
-        <td>${m.config ? m.config.position_lb : '-'}</td>
-        <td>${m.config ? m.config.position_ub : '-'}</td>
-        <td>${m.config && m.config.quoting ? '🟢 ON' : '🔴 OFF'}</td>
-        <td><button data-toggle="${m.name}" ${toggleDisabled}>Toggle</button></td>
-    `;
-    tbody.appendChild(tr);
-    }
+function connectFeed() {
+  const proto = location.protocol === 'https:' ? 'wss' : 'ws';
+  const ws = new WebSocket(`${proto}://${location.host}/ws/status`);
+  ws.onmessage = e => applyFrame(JSON.parse(e.data));
+  // The server sends a fresh snapshot on every (re)connect
+  ws.onclose = () => setTimeout(connectFeed, 1000);
 }
 
-setInterval(fetchStatus, 1000);
-fetchStatus();
+connectFeed();
 
 
 // -------------------------------------------
@@ -370,6 +480,7 @@ fetchStatus();
 // -------------------------------------------
 function populateDropdown() {
   const sel = document.getElementById('market-select');
+  const selected = sel.value;
   sel.innerHTML = "";
 
   cachedMarkets.forEach(m => {
@@ -378,6 +489,7 @@ function populateDropdown() {
     opt.textContent = m.name + (m.has_config ? "" : " (new)"); // <-- NEW LABEL
     sel.appendChild(opt);
   });
+  if (selected) sel.value = selected;
 }
 
 async function loadEditorConfig(market) {
@@ -389,10 +501,10 @@ async function loadEditorConfig(market) {
   document.getElementById("config-header").textContent =
       `${market} — Configuration`;
 
-  document.getElementById("edit-fair").value   = row.config.fair;
-  document.getElementById("edit-spread").value = row.config.spread;
-  document.getElementById("edit-lb").value     = row.config.position_lb;
-  document.getElementById("edit-ub").value     = row.config.position_ub;
+  document.getElementById("edit-fair").value   = row.fair;
+  document.getElementById("edit-spread").value = row.spread;
+  document.getElementById("edit-lb").value     = row.position_lb;
+  document.getElementById("edit-ub").value     = row.position_ub;
 }
 
 document.getElementById('market-select').addEventListener('change', e => {
@@ -421,7 +533,6 @@ document.getElementById('save-btn').addEventListener('click', async () => {
   cachedMarkets.find(m => m.name === market).has_config = true;
   populateDropdown();
   loadEditorConfig(market);
-  fetchStatus();
 });
 
 
@@ -438,8 +549,6 @@ document.addEventListener('click', async e => {
     headers:{'Content-Type':'application/json'},
     body: JSON.stringify({market:m})
   });
-
-  fetchStatus();
 });
 </script>
 
@@ -453,135 +562,205 @@ document.addEventListener('click', async e => {
     async def api_status(request):
         result = []
 
-        books = haorzhe.get_book()   # {"BTC": {"bids":[...], "asks":[...]}}
-        pos_raw = latest_positions   # {"BTC": total_position, ...}
-
-        for m in markets:
-            base = None
-            quote = None
-            for m_meta in meta["Markets Metadata"]:
-                if m == m_meta["name"]:
-                    base = m_meta["base"]
-                    quote = m_meta["quote"]
-                    break
-
-            if base is None or quote is None:
-                continue
-
-            cfg = configs.get(m, None)
-            position = pos_raw.get(base, 0)
-
-            book = books.get(m, {"bids": [], "asks": []})
-            bids = book.get("bids", [])
-            asks = book.get("asks", [])
-
-            # ---- Best L1 ----
-            best_bid = bids[0]["price"] if bids else None
-            best_ask = asks[0]["price"] if asks else None
-
+        rows = status_box.get()
+        for m in list(rows):
+            row = rows[m]
             result.append({
                 "name": m,
-                "base": base,
-                "quote": quote,
-                "position": position,
-                "best_bid": best_bid,
-                "best_ask": best_ask,
-                "has_config": cfg is not None,
-                "config": None if cfg is None else {
-                    "fair": cfg.fair,
-                    "spread": cfg.spread,
-                    "position_lb": cfg.position_lb,
-                    "position_ub": cfg.position_ub,
-                    "quoting": cfg.quoting,
+                "base": row["base"],
+                "quote": row["quote"],
+                "position": row["position"],
+                "best_bid": row["best_bid"],
+                "best_ask": row["best_ask"],
+                "has_config": row["has_config"],
+                "config": None if not row["has_config"] else {
+                    "fair": row["fair"],
+                    "spread": row["spread"],
+                    "position_lb": row["position_lb"],
+                    "position_ub": row["position_ub"],
+                    "quoting": row["quoting"],
                 }
             })
 
         return web.json_response({"markets": result})
 
-
-        return web.json_response({"markets": result})
-
+    async def api_metrics(request):
+        if coordinator is not None:
+            return web.json_response(coordinator.status())
+        return web.json_response(summarize(metrics_box.get()))
 
     async def api_config(request):
         body = await request.json()
-        market = body.get("market")
-        if not market or market not in markets:
-            return web.json_response({"error": "unknown market"}, status=400)
-
-        cfg = MarketConfig(0, 0, 0, 0, False)
-        # update fields if provided
-        if "fair" in body:
-            cfg.fair = int(body["fair"])
-        if "spread" in body:
-            cfg.spread = int(body["spread"])
-        if "position_lb" in body:
-            cfg.position_lb = int(body["position_lb"])
-        if "position_ub" in body:
-            cfg.position_ub = int(body["position_ub"])
-        configs[market] = cfg
-        return web.json_response({"ok": True})
+        result, status = await run_command("set_config", body.get("market"), body)
+        return web.json_response(result, status=status)
 
     async def api_quoting(request):
         body = await request.json()
-        market = body.get("market")
-        if not market or market not in configs:
-            return web.json_response({"error": "unknown market"}, status=400)
+        result, status = await run_command("toggle_quoting", body.get("market"))
+        return web.json_response(result, status=status)
 
-        cfg = configs[market]
-        cfg.quoting = not cfg.quoting
-        return web.json_response({"ok": True, "quoting": cfg.quoting})
+    async def on_shutdown(app):
+        await feed.stop()
 
     app.router.add_get("/", index)
     app.router.add_get("/api/status", api_status)
+    app.router.add_get("/api/metrics", api_metrics)
+    app.router.add_get("/ws/status", feed.handle)
     app.router.add_post("/api/config", api_config)
     app.router.add_post("/api/quoting", api_quoting)
+    app.on_shutdown.append(on_shutdown)
 
     return app
 
+
+control_plane = ControlPlane(build_web_app, "127.0.0.1", 8080, threaded=WEB_MODE == "thread")
+
 # ----------------------------------------------------
 # Main
 # ----------------------------------------------------
-async def main():
+# Subscriptions in flight for markets listed after startup
+adding: set[asyncio.Task] = set()
+
+
+def on_new_markets(added):
+    names = [info.name for info in added if owns(info.name)]
+    for info in added:
+        if info.name in names:
+            print(f"New market {info.name} ({info.base}/{info.quote})")
+    if names:
+        task = asyncio.create_task(add_markets(names))
+        adding.add(task)
+        task.add_done_callback(adding.discard)
+
+
+async def add_markets(names):
+    """Quote new markets once they are subscribed; a market that fails to subscribe is left out."""
+    try:
+        await startup.subscribe(names)
+    except Exception as e:
+        print(f"\033[1;33m[Warning]\033[0m subscribing to new markets failed: {type(e).__name__}: {e}")
+    for m in names:
+        if not startup.subscribed(m):
+            print(f"\033[1;33m[Warning]\033[0m not quoting {m}: no subscription")
+            continue
+        markets.append(m)
+        scheduler.add_market(m)
+    publisher.mark_all()
+
+
+async def connect():
     load_dotenv()
+    use_gateway()
     account_address = os.getenv("ACCOUNT_ADDRESS")
     api_key = os.getenv("API_KEY")
-    global markets
-    global meta
     await haorzhe.start_client(
         account=account_address,
         api_key=api_key,
         domain="HarvardYale"
     )
 
-    meta = haorzhe.get_domain_metadata()
-    markets = meta['Available Markets']['markets']
-    for market in markets:
-        await haorzhe.subscribe_market(market)
+    registry.refresh()
+    markets.extend(m for m in registry.names() if owns(m))
+    # Every market's subscriptions go out together; quote once the first books are in
+    await startup.subscribe(markets)
+    registry.add_listener(on_new_markets)
+    await startup.wait_ready(markets)
+
 
-    trade_task = asyncio.create_task(trade_handler())
+async def main():
+    await connect()
+    instruments.start()
+    ledger.start()
+    tasks = [
+        asyncio.create_task(trade_handler()),
+        asyncio.create_task(publisher.run()),
+        asyncio.create_task(commands.serve()),
+    ]
 
     # start web server
-    app = build_web_app()
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, "127.0.0.1", 8080)
-    await site.start()
-    print("Web GUI running on http://localhost:8080")
+    await control_plane.start()
+    print(f"Web GUI running on http://localhost:8080 ({WEB_MODE})")
 
     try:
         await asyncio.Event().wait()
     except KeyboardInterrupt:
         pass
     finally:
-        trade_task.cancel()
-        try:
-            await trade_task
-        except asyncio.CancelledError:
-            pass
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await control_plane.stop()
+        await instruments.stop()
+        await ledger.stop()
+        print(ledger.log_line())
+        await gateway.stop()
+        await haorzhe.stop_client()
+        print("\033[1;31mTrading bot stopped.\033[0m")
+
+
+async def run_shard(link: ShardLink, report_every: float = 1.0):
+    """A shard worker: main() for the markets `link` owns, reporting to the coordinator."""
+    global shard
+    shard = link
+    # The account's 50 orders/sec is shared by every shard
+    gateway.bucket.rate /= link.shards
+    gateway.bucket.burst = max(gateway.bucket.burst / link.shards, 1)
+    await connect()
+    publisher.add_listener(lambda changed: link.publish(
+        dict(status_box.get()) if changed is None else {m: status_box.get().get(m) for m in changed}))
+
+    async def report():
+        while True:
+            link.report(shard_stats())
+            await asyncio.sleep(report_every)
+
+    instruments.start()
+    ledger.start()
+    tasks = [
+        asyncio.create_task(trade_handler()),
+        asyncio.create_task(publisher.run()),
+        asyncio.create_task(report()),
+    ]
+    try:
+        # Until the coordinator stops this shard
+        await link.serve(COMMANDS)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await instruments.stop()
+        await ledger.stop()
+        await gateway.stop()
         await haorzhe.stop_client()
-        await runner.cleanup()
+        print(f"\033[1;31mShard {link.shard} stopped.\033[0m")
+
+
+async def main_sharded(shards: int):
+    """Quote from `shards` worker processes; this one only serves the dashboard."""
+    global coordinator
+    coordinator = ShardCoordinator(run_shard, shards)
+
+    def on_rows(changed):
+        status_box.publish(dict(coordinator.rows))
+        control_plane.call_soon(feed.mark_many, changed)
+
+    coordinator.add_listener(on_rows)
+    coordinator.start()
+    await control_plane.start()
+    print(f"Web GUI running on http://localhost:8080 ({shards} shards)")
+
+    try:
+        await asyncio.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        await control_plane.stop()
+        await coordinator.stop()
         print("\033[1;31mTrading bot stopped.\033[0m")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--shards" in sys.argv:
+        asyncio.run(main_sharded(int(sys.argv[sys.argv.index("--shards") + 1])))
+    else:
+        asyncio.run(main())
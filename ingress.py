@@ -0,0 +1,192 @@
+import asyncio
+import time
+import traceback
+from collections import deque
+from typing import Awaitable, Callable, Hashable, Optional
+
+from metrics import LatencyHistogram
+from trade_decode import peek_response
+
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+
+OVERFLOW_POLICIES = ("block", "drop-oldest", "coalesce")
+
+
+def book_key(msg: bytes) -> Optional[Hashable]:
+    """
+    Coalescing key for IngressQueue: L2 book frames are full per-market
+    snapshots, so only the newest one per market is worth processing.
+    Everything else (trades, fills, acks...) is never coalesced or dropped.
+    """
+    kind, market = peek_response(msg)
+    if kind == ServerResponseUnion.L2BookStream:
+        return market
+    return None
+
+
+class IngressQueue:
+    """
+    Bounded queue between the WebSocket reader and the message handlers.
+
+    Overflow policies when the queue is full:
+      - "block":       the reader waits for room (backpressure on the socket)
+      - "drop-oldest": the oldest queued frame with a key(msg) is discarded
+      - "coalesce":    a frame whose key(msg) matches a queued frame replaces
+                       it in place; otherwise behaves like "drop-oldest"
+
+    Only frames with a key (book_key: L2 books) are ever dropped or
+    coalesced. If none is queued, the reader blocks as with "block", and
+    that is counted in `overflowed` and reported once.
+
+    A handler exception ends consume() and is raised to the reader from
+    put(), unless `log_errors` is set, in which case it is printed and the
+    frame skipped.
+
+    Latency is recorded per stage: time spent in put() (reader blocked),
+    time spent waiting in the queue, and time spent in the handler.
+    """
+    def __init__(self,
+                 maxsize: int = 1024,
+                 overflow: str = "block",
+                 key: Optional[Callable[[bytes], Optional[Hashable]]] = None,
+                 *,
+                 log_errors: bool = False):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy: {overflow}. Valid policies are: {OVERFLOW_POLICIES}")
+        if overflow != "block" and key is None:
+            key = book_key
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.key = key if overflow != "block" else None
+        self.log_errors = log_errors
+        self.error: Optional[BaseException] = None
+
+        self._items: deque = deque()
+        self._by_key: dict = {}
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.overflowed = 0     # puts that had to block: full, and nothing droppable queued
+        self.high_water = 0
+        self.enqueue_latency = LatencyHistogram("enqueue")
+        self.queue_latency = LatencyHistogram("queue")
+        self.handler_latency = LatencyHistogram("handler")
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def put(self, msg: bytes) -> None:
+        start = time.perf_counter_ns()
+        k = self.key(msg) if self.key else None
+        async with self._cond:
+            self._raise_error()
+            if k is not None and self.overflow == "coalesce":
+                entry = self._by_key.get(k)
+                if entry is not None:
+                    # Keep its place in line (and its enqueue time), newest payload wins
+                    entry[1] = msg
+                    self.coalesced += 1
+                    self.enqueue_latency.record_since(start)
+                    return
+
+            blocked = False
+            while len(self._items) >= self.maxsize:
+                if self.overflow != "block" and self._drop_oldest():
+                    continue
+                if self.overflow != "block" and not blocked:
+                    blocked = True
+                    self.overflowed += 1
+                    if self.overflowed == 1:
+                        print(f"⚠️ Ingress queue full of frames that must not be dropped "
+                              f"({self.maxsize}), blocking the reader")
+                await self._cond.wait()
+                self._raise_error()
+
+            entry = [k, msg, time.perf_counter_ns()]
+            self._items.append(entry)
+            if k is not None and self.overflow == "coalesce":
+                self._by_key[k] = entry
+            self.enqueued += 1
+            if len(self._items) > self.high_water:
+                self.high_water = len(self._items)
+            self._cond.notify_all()
+        self.enqueue_latency.record_since(start)
+
+    async def get(self) -> tuple[bytes, int]:
+        """Next frame and the perf_counter_ns() time it was enqueued."""
+        async with self._cond:
+            while not self._items:
+                await self._cond.wait()
+            entry = self._items.popleft()
+            self._discard(entry)
+            self._in_flight += 1
+            self._cond.notify_all()
+        return entry[1], entry[2]
+
+    async def task_done(self) -> None:
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    async def drain(self) -> None:
+        """Wait until every queued frame has been handled."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.error or not self._items and self._in_flight == 0)
+            self._raise_error()
+
+    def _discard(self, entry) -> None:
+        if entry[0] is not None and self._by_key.get(entry[0]) is entry:
+            del self._by_key[entry[0]]
+
+    def _drop_oldest(self) -> bool:
+        """Discard the oldest droppable (keyed) frame; False if there is none."""
+        for entry in self._items:
+            if entry[0] is not None:
+                self._items.remove(entry)
+                self._discard(entry)
+                self.dropped += 1
+                return True
+        return False
+
+    def _raise_error(self) -> None:
+        if self.error is not None:
+            raise RuntimeError("ingress message handler failed") from self.error
+
+    async def consume(self, on_message: Callable[[bytes], Awaitable[None]]) -> None:
+        """Consumer task: run on_message for every frame until cancelled."""
+        while True:
+            msg, enqueued_at = await self.get()
+            start = self.queue_latency.record_since(enqueued_at)
+            try:
+                await on_message(msg)
+            except Exception as e:
+                if not self.log_errors:
+                    # Fail the reader too, instead of leaving it to fill a queue nobody drains
+                    async with self._cond:
+                        self.error = e
+                        self._cond.notify_all()
+                    raise
+                print("⚠️ Message handler failed:")
+                traceback.print_exc()
+            self.handler_latency.record_since(start)
+            self.processed += 1
+            await self.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._items),
+            "high_water": self.high_water,
+            "maxsize": self.maxsize,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "overflowed": self.overflowed,
+            "enqueue_us": self.enqueue_latency.snapshot(),
+            "queue_us": self.queue_latency.snapshot(),
+            "handler_us": self.handler_latency.snapshot(),
+        }
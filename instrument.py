@@ -0,0 +1,196 @@
+"""
+Latency instrumentation around one OracleClient.
+
+    instruments = Instrumentation(client)   # before start_client(), like LocalBook
+    instruments.start()                     # on the loop: lag sampling, log line, publishing
+    instruments.snapshot()                  # everything in µs
+
+- Per-call latency of the client's order and state calls (CALLS), timed by
+  wrappers set on the instance, so every caller (strategies, OrderGateway)
+  goes through them.
+- Tick-to-trade: from the first book update for a market that arrived
+  since the last order or cancel there, to the next one sent. An order
+  more than REACTION_WINDOW after the update is a periodic requote rather
+  than a reaction and is only counted in `unanswered`.
+- Event loop lag (metrics.LoopLagMonitor).
+
+Histograms a strategy keeps itself (requote cycle, gateway waits) can be
+add()ed to be exported with the rest. Given a SnapshotBox, start() also
+publishes copies of every histogram there each `publish_every` seconds;
+summarize() turns them into the snapshot() dict on any thread, so a web
+handler never makes the trading loop compute percentiles.
+
+A sample costs two perf_counter_ns() calls and one record(), well under a
+microsecond (bench_instrument.py).
+"""
+import asyncio
+import functools
+import time
+from typing import Optional
+
+from huqt_oracle_pysdk import OracleClient
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+
+from client_tap import tap
+from metrics import LatencyHistogram, LoopLagMonitor
+
+ORDER_CALLS = ("place_limit_order", "cancel_order")
+CALLS = ORDER_CALLS + ("get_book", "get_self_open_orders", "get_self_positions")
+REACTION_WINDOW = 1.0       # seconds
+
+
+class Instrumentation:
+    """
+    `loop_lag_interval` None leaves loop lag unsampled (replay.py's virtual
+    clock has none, and sampling it would add a wakeup every interval),
+    `report_every` None turns the log line off.
+    """
+    def __init__(self, client: OracleClient, *, loop_lag_interval: Optional[float] = 0.005,
+                 report_every: Optional[float] = 30.0, box=None, publish_every: float = 1.0,
+                 name: str = ""):
+        self.client = client
+        self.name = name
+        self.calls = {c: LatencyHistogram(c) for c in CALLS}
+        self.tick_to_trade = LatencyHistogram("tick-to-trade")
+        self.unanswered = 0
+        self.loop_lag_interval = loop_lag_interval
+        self.loop_lag = LoopLagMonitor(interval=loop_lag_interval or 0.005)
+        self.extra: list[LatencyHistogram] = []
+        self.report_every = report_every
+        self.box = box
+        self.publish_every = publish_every
+        self._ticks: dict[str, int] = {}
+        self._window_ns = int(REACTION_WINDOW * 1e9)
+        self._tasks: list[asyncio.Task] = []
+
+        for c in CALLS:
+            fn = getattr(client, c)
+            wrap = self._wrap_async if asyncio.iscoroutinefunction(fn) else self._wrap_sync
+            setattr(client, c, wrap(fn, self.calls[c], c in ORDER_CALLS))
+        tap(client, self._on_frame)
+
+    def add(self, *histograms: LatencyHistogram) -> None:
+        """Export histograms kept elsewhere alongside the client's."""
+        self.extra.extend(histograms)
+
+    # ----------------------------------------------------
+    # Sampling
+    # ----------------------------------------------------
+    def _wrap_async(self, fn, hist: LatencyHistogram, is_order: bool):
+        perf = time.perf_counter_ns
+        record = hist.record
+        if not is_order:
+            @functools.wraps(fn)
+            async def timed(*args, **kwargs):
+                start = perf()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record(perf() - start)
+            return timed
+
+        ticks = self._ticks
+        record_reaction = self.tick_to_trade.record
+        window = self._window_ns
+
+        @functools.wraps(fn)
+        async def timed_order(*args, **kwargs):
+            start = perf()
+            if ticks:
+                tick = ticks.pop(args[0] if args else kwargs.get("market"), None)
+                if tick is not None:
+                    if start - tick > window:
+                        self.unanswered += 1
+                    else:
+                        record_reaction(start - tick)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record(perf() - start)
+        return timed_order
+
+    def _wrap_sync(self, fn, hist: LatencyHistogram, is_order: bool):
+        perf = time.perf_counter_ns
+        record = hist.record
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = perf()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(perf() - start)
+        return timed
+
+    def _on_frame(self, kind: int, market: Optional[str], msg: bytes) -> None:
+        if kind == ServerResponseUnion.L2BookStream and market not in self._ticks:
+            self._ticks[market] = time.perf_counter_ns()
+
+    # ----------------------------------------------------
+    # Export
+    # ----------------------------------------------------
+    def start(self) -> None:
+        if self.loop_lag_interval:
+            self.loop_lag.start()
+        if self._tasks:
+            return
+        if self.report_every:
+            self._tasks.append(asyncio.create_task(self._report()))
+        if self.box is not None:
+            self._tasks.append(asyncio.create_task(self._publish()))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.loop_lag.stop()
+
+    def frozen(self) -> dict:
+        """Copies of every histogram: cheap to take, summarize() them anywhere."""
+        return {
+            "calls": [h.copy() for h in self.calls.values()],
+            "tick_to_trade": self.tick_to_trade.copy(),
+            "unanswered": self.unanswered,
+            "loop_lag": self.loop_lag.lag.copy(),
+            "extra": [h.copy() for h in self.extra],
+        }
+
+    def snapshot(self) -> dict:
+        return summarize(self.frozen())
+
+    def log_line(self) -> str:
+        """One compact line: p50/p99 in µs and sample counts."""
+        def fmt(label, h):
+            if not h.count:
+                return None
+            return f"{label}={h.percentile(50) / 1000:.0f}/{h.percentile(99) / 1000:.0f}us n={h.count}"
+
+        parts = [fmt(name.replace("get_self_", "").replace("_limit_order", ""), h) for name, h in self.calls.items()]
+        parts.append(fmt("t2t", self.tick_to_trade))
+        parts.append(fmt("lag", self.loop_lag.lag))
+        parts.extend(fmt(h.name.replace(" ", "_"), h) for h in self.extra)
+        prefix = f"[metrics{' ' + self.name if self.name else ''}]"
+        return " ".join([prefix, *(p for p in parts if p)])
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.report_every)
+            print(self.log_line())
+
+    async def _publish(self) -> None:
+        while True:
+            self.box.publish(self.frozen())
+            await asyncio.sleep(self.publish_every)
+
+
+def summarize(frozen: Optional[dict]) -> dict:
+    """Instrumentation.frozen() as µs summaries, the shape of snapshot()."""
+    if frozen is None:
+        return {}
+    return {
+        "calls_us": {h.name: h.snapshot() for h in frozen["calls"] if h.count},
+        "tick_to_trade_us": {**frozen["tick_to_trade"].snapshot(), "unanswered": frozen["unanswered"]},
+        "loop_lag_us": frozen["loop_lag"].snapshot(),
+        **{f"{h.name.replace(' ', '_')}_us": h.snapshot() for h in frozen["extra"]},
+    }
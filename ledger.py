@@ -0,0 +1,277 @@
+"""
+Our positions and what our resting orders lock up, kept incrementally from
+the account streams instead of re-reading get_self_positions() every pass.
+
+    ledger = Ledger(client)        # before start_client(), like LocalBook
+    ledger.start()                 # on the loop: periodic reconciliation
+    ledger.available("QTC")        # cash not committed to resting bids
+
+- Fills move the base and the quote of their market on the main account
+  as they arrive.
+- Order acks (open-order adds, size changes and removes) keep `reserved`:
+  price * size of the quote for every resting bid, size of the base for
+  every resting ask.
+- Position and open-order snapshots re-seed everything from the client.
+
+Every event is O(1): no list scans, no key parsing after the first time a
+symbol is seen. Fees are not modelled; reconciliation picks them up.
+"""
+import asyncio
+from typing import Callable, Optional
+
+from huqt_oracle_pysdk import OracleClient, Side
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponse import ServerResponse
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+from huqt_oracle_pysdk.fbs_gen.gateway.FillsStream import FillsStream
+from huqt_oracle_pysdk.fbs_gen.gateway.OpenOrdersStream import OpenOrdersStream
+from huqt_oracle_pysdk.fbs_gen.gateway.OrderDeltasData import OrderDeltasData
+from huqt_oracle_pysdk.fbs_gen.gateway.PositionsStream import PositionsStream
+from huqt_oracle_pysdk.fbs_gen.gateway.WsOpenOrders import WsOpenOrders
+from huqt_oracle_pysdk.fbs_gen.gateway.WsPositions import WsPositions
+
+from client_tap import tap
+from market_registry import MarketRegistry
+
+# Quote asset for markets the registry does not know (yet)
+DEFAULT_QUOTE = "QTC"
+
+
+class Ledger:
+    """
+    Positions keyed by (asset, account), with the SDK's "asset:account"
+    strings parsed once per distinct key.
+
+    Every `reconcile_every` seconds the ledger is compared with the
+    client's positions, which the SDK keeps from the server's position
+    stream. A difference can just be a fill whose position delta has not
+    arrived yet (or the other way round), so only the part of it that is
+    still there on the next check, with the same sign, is adopted and
+    counted in `drift`.
+    """
+    def __init__(self, client: OracleClient, registry: Optional[MarketRegistry] = None, *,
+                 reconcile_every: Optional[float] = 5.0):
+        self.client = client
+        self.registry = registry or MarketRegistry(client)
+        self.reconcile_every = reconcile_every
+        self._parsed: dict[str, tuple[str, str]] = {}
+        self._positions: dict[tuple[str, str], int] = {}
+        self._totals: dict[str, int] = {}
+        self._reserved: dict[str, int] = {}
+        # oid -> (asset locked, amount per lot, size)
+        self._orders: dict[int, tuple[str, int, int]] = {}
+        self._assets: dict[str, tuple[str, str]] = {}
+        self._listeners: list[Callable[[], None]] = []
+        self._pending: dict[tuple[str, str], int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.version = 0
+        self.fills = 0
+        self.checks = 0
+        self.corrections = 0
+        self.drift: dict[str, int] = {}
+        tap(client, self._on_frame)
+        self.refresh()
+        self.refresh_orders()
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """callback() runs after every position change."""
+        self._listeners.append(callback)
+
+    # ----------------------------------------------------
+    # Reads
+    # ----------------------------------------------------
+    def get(self, asset: str, account: str = "main") -> int:
+        return self._positions.get((asset, account), 0)
+
+    def total(self, asset: str) -> int:
+        """Position in `asset` summed over main and collateral."""
+        return self._totals.get(asset, 0)
+
+    def totals(self) -> dict[str, int]:
+        return dict(self._totals)
+
+    def reserved(self, asset: str) -> int:
+        """Locked by resting orders: quote for bids, base for asks."""
+        return self._reserved.get(asset, 0)
+
+    def available(self, asset: str) -> int:
+        return self._totals.get(asset, 0) - self._reserved.get(asset, 0)
+
+    def stats(self) -> dict:
+        return {
+            "fills": self.fills,
+            "open_orders": len(self._orders),
+            "checks": self.checks,
+            "corrections": self.corrections,
+            "drift": dict(self.drift),
+        }
+
+    # ----------------------------------------------------
+    # Events
+    # ----------------------------------------------------
+    def _key(self, name: str) -> tuple[str, str]:
+        key = self._parsed.get(name)
+        if key is None:
+            asset, acct = name.split(":", 1)
+            key = self._parsed[name] = (asset, acct)
+        return key
+
+    def _assets_of(self, market: str) -> tuple[str, str]:
+        assets = self._assets.get(market)
+        if assets is None:
+            info = self.registry.get(market)
+            if info is None:
+                # Not cached, so a later metadata frame can still correct it
+                return market, DEFAULT_QUOTE
+            assets = self._assets[market] = (info.base, info.quote)
+        return assets
+
+    def _move(self, asset: str, amount: int, account: str = "main") -> None:
+        key = (asset, account)
+        self._positions[key] = self._positions.get(key, 0) + amount
+        self._totals[asset] = self._totals.get(asset, 0) + amount
+
+    def _changed(self) -> None:
+        self.version += 1
+        for cb in self._listeners:
+            cb()
+
+    def on_fill(self, market: str, side: int, price: int, size: int) -> None:
+        base, quote = self._assets_of(market)
+        if side == Side.Buy:
+            self._move(base, size)
+            self._move(quote, -price * size)
+        else:
+            self._move(base, -size)
+            self._move(quote, price * size)
+        self.fills += 1
+
+    def on_order(self, oid: int, market: str, side: int, price: int, size: int,
+                 is_add: bool, is_remove: bool) -> None:
+        """One open-order delta: `size` is the order's new remaining size."""
+        reserved = self._reserved
+        if is_add:
+            base, quote = self._assets_of(market)
+            lock = (quote, price) if side == Side.Buy else (base, 1)
+            self._orders[oid] = (*lock, size)
+            reserved[lock[0]] = reserved.get(lock[0], 0) + lock[1] * size
+        order = self._orders.get(oid)
+        if order is None:
+            return
+        asset, per_lot, old = order
+        if is_remove:
+            del self._orders[oid]
+            reserved[asset] -= per_lot * old
+        elif not is_add:
+            self._orders[oid] = (asset, per_lot, size)
+            reserved[asset] += per_lot * (size - old)
+
+    def refresh(self) -> None:
+        """Re-seed positions from the client's (after a positions snapshot)."""
+        positions = {}
+        totals = {}
+        for k, v in self.client.positions.items():
+            key = self._key(k)
+            positions[key] = v
+            totals[key[0]] = totals.get(key[0], 0) + v
+        self._positions = positions
+        self._totals = totals
+        self._pending = {}
+        self._changed()
+
+    def refresh_orders(self) -> None:
+        """Rebuild reservations from the client's open orders (after a snapshot)."""
+        self._orders = {}
+        self._reserved = {}
+        for market, orders in self.client.open_orders.items():
+            for o in orders:
+                self.on_order(o["oid"], market, o["side"], o["price"], o["size"], True, False)
+
+    def _on_frame(self, kind: int, market: Optional[str], msg: bytes) -> None:
+        if kind == ServerResponseUnion.FillsStream:
+            tbl = ServerResponse.GetRootAs(msg, 0).Response()
+            fs = FillsStream()
+            fs.Init(tbl.Bytes, tbl.Pos)
+            # A snapshot replays fills the position snapshot already includes
+            if fs.IsSnapshot() or not fs.FillsLength():
+                return
+            for i in range(fs.FillsLength()):
+                f = fs.Fills(i)
+                self.on_fill(f.Market().decode(), f.Side(), f.Px(), f.Sz())
+            self._changed()
+        elif kind == ServerResponseUnion.OpenOrdersStream:
+            tbl = ServerResponse.GetRootAs(msg, 0).Response()
+            oos = OpenOrdersStream()
+            oos.Init(tbl.Bytes, tbl.Pos)
+            if oos.OrdersType() != WsOpenOrders.OrderDeltasData:
+                self.refresh_orders()
+                return
+            deltas = OrderDeltasData()
+            orders = oos.Orders()
+            deltas.Init(orders.Bytes, orders.Pos)
+            for i in range(deltas.ClobDeltasLength()):
+                d = deltas.ClobDeltas(i)
+                self.on_order(d.Oid(), d.Market().decode(), d.Side(), d.Px(), d.NewSz(),
+                              d.IsAdd(), d.IsRemove())
+        elif kind == ServerResponseUnion.PositionsStream:
+            tbl = ServerResponse.GetRootAs(msg, 0).Response()
+            ps = PositionsStream()
+            ps.Init(tbl.Bytes, tbl.Pos)
+            if ps.PositionsType() == WsPositions.PositionsSnapshot:
+                self.refresh()
+
+    # ----------------------------------------------------
+    # Reconciliation
+    # ----------------------------------------------------
+    def reconcile(self) -> dict[str, int]:
+        """
+        Compare with the client's positions and adopt whatever differed the
+        same way last time too. Returns the corrections made, by asset.
+        """
+        self.checks += 1
+        server = {self._key(k): v for k, v in self.client.positions.items()}
+        diff = {}
+        for key in server.keys() | self._positions.keys():
+            d = server.get(key, 0) - self._positions.get(key, 0)
+            if d:
+                diff[key] = d
+
+        fixed = {}
+        for key, d in diff.items():
+            last = self._pending.get(key, 0)
+            if last * d <= 0:
+                continue
+            adopt = min(d, last) if d > 0 else max(d, last)
+            self._move(key[0], adopt, key[1])
+            diff[key] = d - adopt
+            fixed[key[0]] = fixed.get(key[0], 0) + adopt
+            self.drift[key[0]] = self.drift.get(key[0], 0) + adopt
+        self._pending = {k: d for k, d in diff.items() if d}
+        if fixed:
+            self.corrections += 1
+            self._changed()
+        return fixed
+
+    def start(self) -> None:
+        if self.reconcile_every and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_every)
+            fixed = self.reconcile()
+            if fixed:
+                print(f"\033[33m[ledger] reconciled {fixed}\033[0m")
+
+    def log_line(self) -> str:
+        drift = " ".join(f"{a}={d:+}" for a, d in self.drift.items()) or "none"
+        return (f"[ledger] fills={self.fills} open_orders={len(self._orders)} "
+                f"checks={self.checks} corrections={self.corrections} drift: {drift}")
@@ -0,0 +1,123 @@
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from huqt_oracle_pysdk import OracleClient, Side
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+
+from client_tap import tap
+from book_analytics import BookAnalytics
+
+
+@dataclass(frozen=True, eq=False)
+class BookSnapshot:
+    """
+    Immutable view of one market's L2 book.
+
+    `bids`/`asks` have the same shape as get_book()[market]['bids'/'asks'],
+    best level first, and must be treated as read-only.
+    """
+    market: str
+    version: int
+    bids: list
+    asks: list
+    bid_sizes: dict = field(repr=False)
+    ask_sizes: dict = field(repr=False)
+
+    @property
+    def best_bid(self) -> Optional[int]:
+        return self.bids[0]["price"] if self.bids else None
+
+    @property
+    def best_ask(self) -> Optional[int]:
+        return self.asks[0]["price"] if self.asks else None
+
+    def size_at(self, side: int, price: int) -> int:
+        sizes = self.bid_sizes if side == Side.Buy else self.ask_sizes
+        return sizes.get(price, 0)
+
+
+EMPTY_VERSION = 0
+
+class LocalBook:
+    """
+    Per-market order books kept up to date from the L2 book stream.
+
+    The stream delivers a full snapshot per market, so each frame only
+    touches its own market, and the market's version is bumped only when
+    its levels actually changed. Strategies can remember the version they
+    last acted on and skip markets that have not moved:
+
+        snap = book.snapshot(market)
+        if snap.version == last_seen[market]:
+            continue
+    """
+    def __init__(self, client: OracleClient):
+        self.client = client
+        self._books: dict[str, BookSnapshot] = {}
+        self._analytics: dict[str, BookAnalytics] = {}
+        self._listeners: list[Callable[[BookSnapshot], None]] = []
+        tap(client, self._on_frame)
+
+    def add_listener(self, callback: Callable[[BookSnapshot], None]) -> None:
+        """callback(snapshot) runs every time a market's book changes."""
+        self._listeners.append(callback)
+
+    def snapshot(self, market: str) -> Optional[BookSnapshot]:
+        return self._books.get(market)
+
+    def version(self, market: str) -> int:
+        snap = self._books.get(market)
+        return snap.version if snap else EMPTY_VERSION
+
+    def best_bid(self, market: str) -> Optional[int]:
+        snap = self._books.get(market)
+        return snap.best_bid if snap else None
+
+    def best_ask(self, market: str) -> Optional[int]:
+        snap = self._books.get(market)
+        return snap.best_ask if snap else None
+
+    def size_at(self, market: str, side: int, price: int) -> int:
+        snap = self._books.get(market)
+        return snap.size_at(side, price) if snap else 0
+
+    def analytics(self, market: str) -> Optional[BookAnalytics]:
+        """Level analytics for the current snapshot, built on first use per version."""
+        snap = self._books.get(market)
+        if snap is None:
+            return None
+        cached = self._analytics.get(market)
+        if cached is None or cached.version != snap.version:
+            cached = self._analytics[market] = BookAnalytics(market, snap.version, snap.bids, snap.asks)
+        return cached
+
+    def _on_frame(self, kind: int, market: Optional[str], msg: bytes) -> None:
+        if kind != ServerResponseUnion.L2BookStream or market is None:
+            return
+        # The client has just rebuilt book[market] from this frame; reuse its
+        # freshly built lists instead of deep-copying the whole book
+        raw = self.client.book.get(market)
+        if raw is None:
+            return
+        bids, asks = raw["bids"], raw["asks"]
+
+        prev = self._books.get(market)
+        if prev is not None and prev.bids == bids and prev.asks == asks:
+            return
+
+        if any(bids[i]["price"] < bids[i + 1]["price"] for i in range(len(bids) - 1)):
+            bids = sorted(bids, key=lambda lvl: lvl["price"], reverse=True)
+        if any(asks[i]["price"] > asks[i + 1]["price"] for i in range(len(asks) - 1)):
+            asks = sorted(asks, key=lambda lvl: lvl["price"])
+
+        snap = BookSnapshot(
+            market=market,
+            version=(prev.version if prev else EMPTY_VERSION) + 1,
+            bids=bids,
+            asks=asks,
+            bid_sizes={lvl["price"]: lvl["size"] for lvl in bids},
+            ask_sizes={lvl["price"]: lvl["size"] for lvl in asks},
+        )
+        self._books[market] = snap
+        for cb in self._listeners:
+            cb(snap)
@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+from huqt_oracle_pysdk import OracleClient
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+
+from client_tap import tap
+
+
+@dataclass(frozen=True)
+class MarketInfo:
+    """
+    One entry of domain_metadata['Markets Metadata'].
+
+    The venue quotes integer prices and sizes, so the tick and lot are
+    always 1; fees are in units of 1/fee_denom.
+    """
+    name: str
+    base: str
+    quote: str
+    flat_fee: int
+    taker_fee: int
+    maker_fee: int
+    fee_denom: int
+
+
+class MarketRegistry:
+    """
+    market -> MarketInfo, built once from the client's domain metadata
+    instead of scanning the metadata list on every lookup.
+
+    The client rebuilds its metadata when a DomainMetaStream frame lists
+    different markets; the registry then adds the new markets (existing
+    entries are kept as they are) and tells listeners which ones appeared.
+    """
+    def __init__(self, client: OracleClient):
+        self.client = client
+        self._markets: dict[str, MarketInfo] = {}
+        self._source: Optional[list] = None
+        self._listeners: list[Callable[[list[MarketInfo]], None]] = []
+        tap(client, self._on_frame)
+        self.refresh()
+
+    def add_listener(self, callback: Callable[[list[MarketInfo]], None]) -> None:
+        """callback(new_markets) runs whenever markets are added."""
+        self._listeners.append(callback)
+
+    def refresh(self) -> list[MarketInfo]:
+        """Pick up markets added to the client's metadata. Returns the new ones."""
+        source = self.client.domain_metadata.get("Markets Metadata", [])
+        if source is self._source:
+            return []
+        self._source = source
+
+        added = []
+        for m in source:
+            if m["name"] in self._markets:
+                continue
+            info = MarketInfo(
+                name=m["name"],
+                base=m["base"],
+                quote=m["quote"],
+                flat_fee=m["flat_fee"],
+                taker_fee=m["taker_fee"],
+                maker_fee=m["maker_fee"],
+                fee_denom=m["fee_denom"],
+            )
+            self._markets[info.name] = info
+            added.append(info)
+        if added:
+            for cb in self._listeners:
+                cb(added)
+        return added
+
+    def get(self, market: str) -> Optional[MarketInfo]:
+        return self._markets.get(market)
+
+    def names(self) -> list[str]:
+        return list(self._markets)
+
+    def __contains__(self, market: str) -> bool:
+        return market in self._markets
+
+    def __iter__(self) -> Iterator[MarketInfo]:
+        return iter(self._markets.values())
+
+    def __len__(self) -> int:
+        return len(self._markets)
+
+    def _on_frame(self, kind: int, market: Optional[str], msg: bytes) -> None:
+        if kind == ServerResponseUnion.DomainMetaStream:
+            self.refresh()
+
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from array import array
+from typing import Optional
+
+import numpy as np
+
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+N_BUCKETS = (64 - SUB_BITS + 1) << SUB_BITS
+_NO_MIN = 1 << 64
+# Samples buffered before they are bucketed
+FOLD_EVERY = 4096
+
+
+def _bucket(v: int) -> int:
+    if v < SUB_BUCKETS:
+        return v if v > 0 else 0
+    shift = v.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + (v >> shift) - SUB_BUCKETS
+
+
+def _buckets(v: np.ndarray) -> np.ndarray:
+    """_bucket() over an int64 array (exact below 2**53 ns)."""
+    shift = np.maximum(np.frexp(v.astype(np.float64))[1] - SUB_BITS - 1, 0)
+    return np.where(v < SUB_BUCKETS, np.maximum(v, 0), ((shift + 1) << SUB_BITS) + (v >> shift) - SUB_BUCKETS)
+
+
+def _bucket_floor(i: int) -> int:
+    exp = i >> SUB_BITS
+    if exp == 0:
+        return i
+    return ((i & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << (exp - 1)
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of nanosecond latencies.
+
+    Every power of two is split into 32 linear sub-buckets, so percentiles
+    are accurate to ~3% at any scale. record() only appends to a buffer;
+    samples are bucketed with NumPy FOLD_EVERY at a time, or as soon as the
+    histogram is read, which keeps a sample to a fraction of a microsecond.
+    """
+    __slots__ = ("name", "_pending", "_counts", "_count", "_total", "_min", "_max")
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.reset()
+
+    def reset(self) -> None:
+        self._pending = array("q")
+        self._counts = np.zeros(N_BUCKETS, dtype=np.int64)
+        self._count = 0
+        self._total = 0
+        self._min = _NO_MIN
+        self._max = 0
+
+    def record(self, ns: int) -> None:
+        pending = self._pending
+        pending.append(ns)
+        if len(pending) >= FOLD_EVERY:
+            self._fold()
+
+    def record_since(self, start_ns: int) -> int:
+        """Record perf_counter_ns() - start_ns and return the current time."""
+        now = time.perf_counter_ns()
+        self.record(now - start_ns)
+        return now
+
+    def _fold(self) -> None:
+        pending = self._pending
+        if not pending:
+            return
+        v = np.array(pending, dtype=np.int64)
+        del pending[:]
+        self._counts += np.bincount(_buckets(v), minlength=N_BUCKETS)
+        self._count += len(v)
+        self._total += int(v.sum())
+        self._max = max(self._max, int(v.max()))
+        self._min = min(self._min, int(v.min()))
+
+    @property
+    def counts(self) -> np.ndarray:
+        self._fold()
+        return self._counts
+
+    @property
+    def count(self) -> int:
+        self._fold()
+        return self._count
+
+    @property
+    def total(self) -> int:
+        self._fold()
+        return self._total
+
+    @property
+    def min(self) -> int:
+        self._fold()
+        return self._min
+
+    @property
+    def max(self) -> int:
+        self._fold()
+        return self._max
+
+    def copy(self) -> "LatencyHistogram":
+        """An independent copy, e.g. to summarize on another thread."""
+        self._fold()
+        h = LatencyHistogram(self.name)
+        h._counts = self._counts.copy()
+        h._count, h._total, h._min, h._max = self._count, self._total, self._min, self._max
+        return h
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self._fold()
+        other._fold()
+        self._counts += other._counts
+        self._count += other._count
+        self._total += other._total
+        self._max = max(self._max, other._max)
+        self._min = min(self._min, other._min)
+
+    def percentile(self, p: float) -> Optional[int]:
+        self._fold()
+        if self._count == 0:
+            return None
+        target = max(1, int(self._count * p / 100.0 + 0.5))
+        i = int(np.searchsorted(np.cumsum(self._counts), target))
+        return min(_bucket_floor(i), self._max)
+
+    def snapshot(self) -> dict:
+        """Summary in microseconds."""
+        if self.count == 0:
+            return {"count": 0}
+        us = lambda ns: round(ns / 1000, 1)
+        return {
+            "count": self._count,
+            "mean": us(self._total / self._count),
+            "p50": us(self.percentile(50)),
+            "p90": us(self.percentile(90)),
+            "p99": us(self.percentile(99)),
+            "max": us(self._max),
+        }
+
+
+class LoopLagMonitor:
+    """
+    Event loop jitter: a task asks to sleep `interval` seconds and records
+    how much later than that it actually woke up. Anything that holds the
+    loop (a slow handler, a big JSON dump, another thread holding the GIL)
+    shows up here, and delays every other task on the loop by as much.
+    """
+    def __init__(self, interval: float = 0.005, name: str = "loop lag"):
+        self.interval = interval
+        self.lag = LatencyHistogram(name)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        interval_ns = int(self.interval * 1e9)
+        while True:
+            start = time.perf_counter_ns()
+            await asyncio.sleep(self.interval)
+            self.lag.record(max(time.perf_counter_ns() - start - interval_ns, 0))
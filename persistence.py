@@ -1,10 +1,18 @@
 from typing import Optional, Awaitable, Callable
 from dotenv import load_dotenv
-import asyncio, time
+import asyncio, sys, time
 import websockets
 import ssl
 import os
-import json
+from trade_writer import TradeLogWriter, JsonLinesSink
+from trade_store import TradeStore, ColumnarSink
+from trade_decode import TradesFrameDecoder
+from candles import CandleAggregator
+from ingress import IngressQueue
+from endpoint import gateway_url, ssl_for
+from startup import AckWaiter
+from trade_gaps import TradeGapTracker
+from shards import ShardCoordinator, ShardLink
 
 def make_client_ssl_context(ca_bundle: Optional[str] = None) -> ssl.SSLContext:
     """
@@ -56,6 +64,14 @@ class WSClient:
         self.ready = asyncio.Event()
         self.api_key = api_key
         self.ctx = ctx
+        self.ingress: Optional[IngressQueue] = None
+        # Session and subscription requests, re-sent in order after a reconnect
+        self._requests: dict[str, bytes] = {}
+        self.acks = AckWaiter()
+        self._down_at: Optional[float] = None
+        self._restore_task: Optional[asyncio.Task] = None
+        # One per reconnect: seconds down, seconds from reconnected to resubscribed
+        self.reconnects: list[dict] = []
 
     async def connect(self) -> None:
         """
@@ -101,19 +117,87 @@ class WSClient:
             print("WebSocket not open — message dropped")
             return
         await self._ws.send(data)
-    
+
+    async def request(self, uuid: str, data: bytes) -> asyncio.Future:
+        """
+        Send a session or subscription request that has to hold for the
+        whole run: it is sent again after every reconnect. Returns a future
+        for its acknowledgement (see startup.AckWaiter).
+        """
+        self._requests[uuid] = data
+        fut = self.acks.expect(uuid)
+        await self.send(data)
+        return fut
+
+    async def _restore(self, down_at: float) -> None:
+        """Re-send every request after a reconnect and time it until all are acknowledged."""
+        up = time.perf_counter()
+        for uuid, data in self._requests.items():
+            self.acks.expect(uuid)
+            await self.send(data)
+        missing = await self.acks.wait(self._requests)
+        record = {
+            "down_s": up - down_at,
+            "resubscribe_s": time.perf_counter() - up,
+            "missing": len(missing),
+        }
+        self.reconnects.append(record)
+        print(f"🔌 Reconnected after {record['down_s'] * 1000:.0f}ms down, "
+              f"{len(self._requests) - len(missing)}/{len(self._requests)} requests restored "
+              f"in {record['resubscribe_s'] * 1000:.0f}ms")
+
+    def reconnect_stats(self) -> dict:
+        down = [r["down_s"] for r in self.reconnects]
+        resub = [r["resubscribe_s"] for r in self.reconnects]
+        return {
+            "reconnects": len(self.reconnects),
+            "down_s": round(sum(down), 3),
+            "resubscribe_ms_max": round(max(resub) * 1000, 1) if resub else None,
+            "unrestored": sum(r["missing"] for r in self.reconnects),
+        }
+
         """Coroutine (not a generator): receive frames and call on_message(msg)."""
-    async def listen(self, on_message, *, reconnect=True, retry_base=1, retry_max=30):
-        backoff = retry_base
+    async def listen(self, on_message, *, reconnect=True, retry_base=1, retry_max=30,
+                     queue_size=0, consumers=1, overflow="block", key=None):
+        """
+        With queue_size > 0 the receive loop only enqueues frames into a
+        bounded IngressQueue (see ingress.py) and `consumers` tasks run
+        on_message, so a slow handler no longer stalls the socket reader.
+        `overflow` picks what happens when the queue is full ("block",
+        "drop-oldest" or "coalesce" by `key`, which only ever drop book
+        frames); queue depth, high-water mark and per-stage latencies are
+        available from self.ingress.stats(). Frames are handled in order
+        only with consumers=1. An exception from on_message ends listen()
+        either way.
+
+        After a dropped connection the first retry is immediate, then they
+        back off from retry_base. Once reconnected, every request() is sent
+        again; acknowledgements are taken out here, ahead of on_message.
+        """
+        backoff = 0
+        consumer_tasks = []
+        if queue_size > 0:
+            self.ingress = IngressQueue(queue_size, overflow, key)
+            consumer_tasks = [asyncio.create_task(self.ingress.consume(on_message)) for _ in range(consumers)]
+            on_message = self.ingress.put
         try:
             while True:
                 try:
                     await self.connect()
                     self.ready.set()  # signal connected
+                    if self._down_at is not None:
+                        self._restore_task = asyncio.create_task(self._restore(self._down_at))
+                        self._down_at = None
+                    acks = self.acks
                     async for msg in self._ws:
-                        await on_message(msg)
+                        if not acks.on_frame(msg):
+                            await on_message(msg)
                     if not reconnect:
+                        if self.ingress and consumer_tasks:
+                            await self.ingress.drain()
                         return
+                    # Closed cleanly by the server: reconnect and restore all the same
+                    self._down_at = time.perf_counter()
                 except asyncio.CancelledError:
                     raise
                 except websockets.InvalidStatusCode as e:
@@ -126,13 +210,21 @@ class WSClient:
                         return
                 except (OSError, websockets.ConnectionClosed) as e:
                     # transient errors: retry with backoff
+                    if self._down_at is None:
+                        self._down_at = time.perf_counter()
+                        backoff = 0
                     print(f"⚠️ Connection error: {e}, retrying in {backoff}s")
                     await self.close()
                     await asyncio.sleep(backoff)
-                    backoff = min(backoff * 2, retry_max)
+                    backoff = min(max(backoff * 2, retry_base), retry_max)
                 else:
-                    backoff = retry_base
+                    backoff = 0
         finally:
+            for task in consumer_tasks:
+                task.cancel()
+            await asyncio.gather(*consumer_tasks, return_exceptions=True)
+            if self._restore_task:
+                self._restore_task.cancel()
             await self.close()
 
     async def close(self) -> None:
@@ -150,7 +242,46 @@ from huqt_oracle_pysdk.fbs_gen.gateway import Side
 def b2s(b):
     return b.decode("utf-8") if b is not None else None
 
+# "json" appends to logs/{market}.json, "columnar" appends to the binary
+# store in store/{market}/ (see trade_store.py)
+LOG_FORMAT = "json"
+
+# Trades are handed to a background writer so file I/O never runs on the
+# event loop that WSClient.listen uses.
+writer = TradeLogWriter(
+    JsonLinesSink("logs") if LOG_FORMAT == "json" else ColumnarSink(TradeStore("store")),
+    flush_trades=512,       # write once this many trades are pending
+    flush_interval=0.5,     # ... or this many seconds have passed
+    fsync_interval=5.0,     # seconds between fsyncs, None to never fsync
+)
+
+# Decode TradesStream frames straight from the received bytes into NumPy
+# arrays (see trade_decode.py) instead of building a dict per trade.
+ZERO_COPY_DECODE = True
+decoder = TradesFrameDecoder()
+
+# Live 1s/1m/5m OHLCV + VWAP bars per market (see candles.py); the charts
+# are rebuilt from the logs with `python candles.py`
+candles = CandleAggregator()
+
+# Trades missed while reconnecting come back from each market's recent-trades
+# snapshot on resubscribe (see trade_gaps.py)
+gaps = TradeGapTracker()
+
 async def message_handler(msg: bytes):
+    if ZERO_COPY_DECODE:
+        decoded = decoder.decode(msg)
+        if decoded is not None:
+            market, trades = decoded
+            if decoder.snapshot:
+                trades = gaps.backfill(market, trades)
+            else:
+                gaps.advance(market, trades)
+            candles.add(market, trades)
+            # the decoder reuses its buffer, the writer needs its own copy
+            writer.submit(market, trades.copy())
+        return
+
     buf = bytearray(msg)
     root = ServerResponse.GetRootAs(buf, 0)
     msg_type = root.ResponseType()
@@ -169,55 +300,142 @@ async def message_handler(msg: bytes):
             }
             for t in (ts.Trades(i) for i in range(ts.TradesLength()))
         ]
+        if ts.IsSnapshot():
+            trades = gaps.backfill(market, trades)
+        else:
+            gaps.advance(market, trades)
 
-        os.makedirs("logs", exist_ok=True)
-        filepath = f"logs/{market}.json"
-
-        with open(filepath, "a") as f:
-            for trade in trades:
-                json.dump(trade, f)
-                f.write("\n")
+        candles.add(market, trades)
+        writer.submit(market, trades)
         return
     
     else:
         return
 
-async def main():
+async def report_stats(ws_client: WSClient, interval: float = 30.0):
+    while True:
+        await asyncio.sleep(interval)
+        q = ws_client.ingress.stats() if ws_client.ingress is not None else {}
+        w = writer.stats()
+        c = candles.stats()
+        r = ws_client.reconnect_stats()
+        g = gaps.stats()
+        print(f"[stats] queue depth={q.get('depth')} high_water={q.get('high_water')} "
+              f"handler_p99={q.get('handler_us', {}).get('p99')}us "
+              f"trades queued={w['queued']} written={w['written']} dropped={w['dropped']} "
+              f"writer={'alive' if w['alive'] else 'DEAD'} "
+              f"candles markets={c['markets']} late={c['late']} "
+              f"reconnects={r['reconnects']} down={r['down_s']}s recovered={g['recovered']} gaps={g['gaps']}")
+
+MARKETS = ['HRVD', 'YALE', 'TIME', 'RAIN', 'PTS', 'TDS']
+
+def shard_stats(ws_client: WSClient) -> dict:
+    q = ws_client.ingress.stats() if ws_client.ingress is not None else {}
+    w = writer.stats()
+    r = ws_client.reconnect_stats()
+    return {
+        "trades": w["queued"],
+        "written": w["written"],
+        "dropped": w["dropped"],
+        "writer_alive": w["alive"],
+        "handler_p99_us": q.get("handler_us", {}).get("p99", 0),
+        "reconnects": r["reconnects"],
+        "recovered": gaps.recovered,
+    }
+
+async def report_shard(ws_client: WSClient, link: ShardLink, interval: float = 1.0):
+    while True:
+        link.report(shard_stats(ws_client))
+        await asyncio.sleep(interval)
+
+async def main(link: Optional[ShardLink] = None, markets: Optional[list[str]] = None):
+    """Log the trades of `markets` (default MARKETS), or with `link` (a shard worker) the ones it owns."""
     load_dotenv()
     ctx = make_client_ssl_context()
     account_address = os.getenv("ACCOUNT_ADDRESS")
     api_key = os.getenv("API_KEY")
-    ws_client = WSClient("wss://api.oracle.huqt.xyz/ws", api_key, ctx)
+    url = gateway_url()
+    ws_client = WSClient(url, api_key, ssl_for(url, ctx))
     await ws_client.connect()
+    writer.start()
+
+    # Listen first so nothing sent below waits on a fixed sleep: the session
+    # and every subscription go out back to back and the acks are awaited.
+    # Trades must not be coalesced or dropped, so let the reader block if the
+    # writer ever falls this far behind
+    listen_task = asyncio.create_task(ws_client.listen(message_handler, queue_size=4096, overflow="block"))
+    t0 = time.perf_counter()
 
-    # set session
-    _, raw_msg = ClientSetSessionRequest(
+    # set session (request() sends it again after a reconnect, as it does the subscriptions)
+    session, raw_msg = ClientSetSessionRequest(
         domain = 'HarvardYale',
     ).to_bytes(account = account_address)
-    await ws_client.send(raw_msg)
-
-    await asyncio.sleep(3)
+    await ws_client.request(session, raw_msg)
 
     # trade stream
-    markets = ['HRVD', 'YALE', 'TIME', 'RAIN', 'PTS', 'TDS']
+    markets = [m for m in markets or MARKETS if link is None or link.owns(m)]
+    uuids = {}
     for market in markets:
-        _, raw_msg = ClientTradeSubscription(
+        uuid, raw_msg = ClientTradeSubscription(
             domain = 'HarvardYale',
             subscribe=True,
             market=market
         ).to_bytes()
-        await ws_client.send(raw_msg)
-    
-    await asyncio.sleep(3)
+        uuids[market] = uuid
+        await ws_client.request(uuid, raw_msg)
 
-    listen_task = asyncio.create_task(ws_client.listen(message_handler))
+    acks = ws_client.acks
+    missing = await acks.wait([session, *uuids.values()])
+    ms = lambda u: "-" if acks.latency(u) is None else f"{acks.latency(u) * 1000:.0f}ms"
+    print(f"🚀 [startup] subscribed in {(time.perf_counter() - t0) * 1000:.0f}ms: session={ms(session)} "
+          + " ".join(f"{m}={ms(u)}" for m, u in uuids.items()))
+    if missing:
+        names = {u: m for m, u in uuids.items()} | {session: "session"}
+        print(f"\033[1;33m[startup] no ack for: {', '.join(names[u] for u in missing)}\033[0m")
+    stats_task = asyncio.create_task(report_stats(ws_client) if link is None else report_shard(ws_client, link))
 
     try:
-        await asyncio.Event().wait()
+        if link is None:
+            # Until the listener gives up (or its handler fails)
+            await listen_task
+        else:
+            # Until the coordinator stops this shard
+            await link.serve({})
+    except Exception:
+        import traceback
+        traceback.print_exc()
     except:
         pass
     finally:
         listen_task.cancel()
+        stats_task.cancel()
         await ws_client.close()
+        writer.stop()
+        print(f"Trade log writer stats: {writer.stats()}")
+        print(f"Reconnect stats: {ws_client.reconnect_stats()} gaps: {gaps.stats()}")
+        if ws_client.ingress is not None:
+            print(f"Ingress queue stats: {ws_client.ingress.stats()}")
+
+async def main_sharded(shards: int, interval: float = 30.0):
+    """Split MARKETS over `shards` processes, each with its own connection and writer."""
+    coordinator = ShardCoordinator(main, shards)
+    coordinator.start()
+    print(f"📡 {shards} shards: " + ", ".join(
+        f"{i}={'/'.join(ms) or '-'}" for i, ms in enumerate(coordinator.ring.partition(MARKETS))))
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            t = coordinator.status()["totals"]
+            print(f"[stats] shards={shards} trades={t.get('trades')} written={t.get('written')} "
+                  f"dropped={t.get('dropped')} worst handler_p99={t.get('handler_p99_us')}us "
+                  f"reconnects={t.get('reconnects')} recovered={t.get('recovered')}")
+    except:
+        pass
+    finally:
+        await coordinator.stop()
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+    if "--shards" in sys.argv:
+        asyncio.run(main_sharded(int(sys.argv[sys.argv.index("--shards") + 1])))
+    else:
+        asyncio.run(main())
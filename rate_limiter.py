@@ -0,0 +1,300 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from huqt_oracle_pysdk import OracleClient, Side, Tif
+
+from metrics import LatencyHistogram
+
+# Lanes, highest priority first
+CANCEL = 0
+REDUCE = 1
+NORMAL = 2
+LANE_NAMES = ("cancel", "reduce", "normal")
+
+MIN_SLEEP = 1e-6        # seconds; shortest wait for a token
+
+
+@dataclass(frozen=True)
+class OrderAction:
+    """One cancel or place, as produced by a strategy's planning step."""
+    kind: str                  # "cancel" or "place"
+    market: str
+    oid: Optional[int] = None
+    side: Optional[int] = None
+    price: Optional[int] = None
+    size: Optional[int] = None
+    tif: int = Tif.Gtc
+    reduces_risk: bool = False
+
+
+def _now() -> float:
+    """
+    The running loop's clock (time.monotonic() on a normal loop), so refills
+    line up with the sleeps that wait for them, including on replay.py's
+    virtual-time loop.
+    """
+    try:
+        return asyncio.get_running_loop().time()
+    except RuntimeError:
+        return time.monotonic()
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst` tokens."""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = _now()
+
+    def _refill(self) -> None:
+        now = _now()
+        self.tokens = min(self.burst, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        self._refill()
+        while self.tokens < 1:
+            # What is left after a sleep is clock rounding; a sleep shorter
+            # than MIN_SLEEP might not move the loop clock at all
+            await asyncio.sleep(max((1 - self.tokens) / self.rate, MIN_SLEEP))
+            self._refill()
+        self.tokens -= 1
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available, without waiting."""
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class WindowLimit:
+    """At most `limit` events in any `window` seconds, the way the venue counts them."""
+    def __init__(self, limit: int, window: float = 1.0):
+        self.limit = limit
+        self.window = window
+        self._times: deque[float] = deque()
+
+    def try_acquire(self) -> bool:
+        now = _now()
+        while self._times and now - self._times[0] >= self.window:
+            self._times.popleft()
+        if len(self._times) >= self.limit:
+            return False
+        self._times.append(now)
+        return True
+
+
+@dataclass
+class _Request:
+    kind: str                  # "place" or "cancel"
+    market: str
+    args: tuple
+    lane: int
+    future: asyncio.Future
+    enqueued: int = field(default_factory=time.perf_counter_ns)
+    # (side, price, size) of the order a cancel removes, if known
+    order: Optional[tuple] = None
+
+
+class OrderGateway:
+    """
+    Single rate-limited path for every order sent through one OracleClient.
+
+    Orders wait in priority lanes (cancels, then risk-reducing orders, then
+    everything else) and a dispatcher sends them as tokens become available
+    from a bucket sized to the venue limit. The bucket holds a single token
+    by default: a bigger burst lets more than `rate` orders out in the
+    second after an idle stretch, which the venue rejects.
+
+    A cancel and a queued GTC place for the same market/side/price/size
+    cancel each other out, since together they would just replace an order
+    with an identical one. An IOC or ALO place never does: it is not sure
+    to rest in place of the cancelled order.
+
+    place_limit_order / cancel_order have the same signature as on the
+    client and return once the request has been sent (or coalesced away).
+    """
+    def __init__(self, client: OracleClient, rate: float = 50, burst: float = 1):
+        self.client = client
+        self.bucket = TokenBucket(rate, burst)
+        self._lanes = [deque() for _ in LANE_NAMES]
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.sent = {"place": 0, "cancel": 0}
+        self.coalesced = 0
+        self.wait_latency = [LatencyHistogram(name) for name in LANE_NAMES]
+        self._started = _now()
+
+    async def place_limit_order(self, market: str, side: int, price: int, size: int, tif: int,
+                                *, reduces_risk: bool = False):
+        lane = REDUCE if reduces_risk else NORMAL
+        req = self._request("place", market, (market, side, price, size, tif), lane)
+        if self._coalesce_place(req):
+            return
+        await self._submit(req)
+
+    async def cancel_order(self, market: str, order_id: int):
+        req = self._request("cancel", market, (market, order_id), CANCEL)
+        for o in self.client.open_orders.get(market, []):
+            if o["oid"] == order_id:
+                req.order = (o["side"], o["price"], o["size"])
+                break
+        if self._coalesce_cancel(req):
+            return
+        await self._submit(req)
+
+    async def execute(self, actions: list[OrderAction]) -> None:
+        """Send actions one after another, in the given order."""
+        for a in actions:
+            if a.kind == "cancel":
+                await self.cancel_order(a.market, a.oid)
+            else:
+                await self.place_limit_order(a.market, a.side, a.price, a.size, a.tif,
+                                             reduces_risk=a.reduces_risk)
+
+    async def execute_all(self, plans: dict[str, list[OrderAction]], max_concurrency: Optional[int] = None) -> None:
+        """
+        Run each market's action list concurrently with the others. Within a
+        market actions keep their order, so a cancel still goes out before
+        the place that replaces it.
+        """
+        sem = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def run(actions):
+            if sem is None:
+                return await self.execute(actions)
+            async with sem:
+                await self.execute(actions)
+
+        await asyncio.gather(*(run(actions) for actions in plans.values() if actions))
+
+    def pending(self) -> int:
+        return sum(len(lane) for lane in self._lanes)
+
+    def unacked(self, market: Optional[str] = None) -> tuple[list[dict], set[int]]:
+        """
+        Orders not reflected in the client's open orders yet, for `market`
+        (or every market): limit places queued here or sent and not
+        acknowledged (client.pending_orders), as order dicts without an
+        oid, and the oids of cancels queued here or sent and not
+        acknowledged (client.pending_requests).
+        """
+        places = []
+        cancelling = set()
+        for lane in self._lanes:
+            for req in lane:
+                if market is not None and req.market != market:
+                    continue
+                if req.kind == "place":
+                    m, side, price, size, _tif = req.args
+                    places.append({"oid": None, "market": m, "side": side, "price": price, "size": size})
+                else:
+                    cancelling.add(req.args[1])
+        # A request leaves its lane and enters the client's tables without an await in between
+        for _, o in self.client.pending_orders.values():
+            if o["order type"] == "limit" and (market is None or o["market"] == market):
+                side = Side.Buy if o["side"] == "buy" else Side.Sell
+                places.append({"oid": None, "market": o["market"], "side": side,
+                               "price": o["price"], "size": o["size"]})
+        for _, kind, r in self.client.pending_requests.values():
+            if kind == "cancel" and (market is None or r["market"] == market):
+                cancelling.add(r["order id"])
+        return places, cancelling
+
+    def stats(self) -> dict:
+        elapsed = max(_now() - self._started, 1e-9)
+        return {
+            "sent": dict(self.sent),
+            "coalesced": self.coalesced,
+            "pending": {name: len(lane) for name, lane in zip(LANE_NAMES, self._lanes)},
+            "orders_per_sec": round(sum(self.sent.values()) / elapsed, 2),
+            "wait_us": {h.name: h.snapshot() for h in self.wait_latency},
+        }
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for lane in self._lanes:
+            while lane:
+                req = lane.popleft()
+                if not req.future.done():
+                    req.future.cancel()
+
+    def _request(self, kind, market, args, lane) -> _Request:
+        return _Request(kind, market, args, lane, asyncio.get_running_loop().create_future())
+
+    async def _submit(self, req: _Request) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        self._lanes[req.lane].append(req)
+        self._wakeup.set()
+        await req.future
+
+    def _coalesce_place(self, req: _Request) -> bool:
+        market, side, price, size, tif = req.args
+        # Only a GTC place stands in for the resting order a cancel removes
+        if tif != Tif.Gtc:
+            return False
+        cancels = self._lanes[CANCEL]
+        for queued in cancels:
+            if queued.market == market and queued.order == (side, price, size):
+                cancels.remove(queued)
+                self._drop(queued)
+                self.coalesced += 1
+                return True
+        return False
+
+    def _coalesce_cancel(self, req: _Request) -> bool:
+        for lane in self._lanes[CANCEL:]:
+            for queued in lane:
+                if queued.market != req.market:
+                    continue
+                if queued.kind == "cancel" and queued.args == req.args:
+                    # Same order already queued for cancellation
+                    self.coalesced += 1
+                    return True
+                if (queued.kind == "place" and req.order is not None and queued.args[1:4] == req.order
+                        and queued.args[4] == Tif.Gtc):
+                    lane.remove(queued)
+                    self._drop(queued)
+                    self.coalesced += 1
+                    return True
+        return False
+
+    def _drop(self, req: _Request) -> None:
+        if not req.future.done():
+            req.future.set_result(None)
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self.pending():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # Take the token first, so whatever is most urgent by then goes out
+            await self.bucket.acquire()
+            req = next((lane.popleft() for lane in self._lanes if lane), None)
+            if req is None:
+                # Everything queued was coalesced away while we waited
+                self.bucket.tokens += 1
+                continue
+            self.wait_latency[req.lane].record_since(req.enqueued)
+            try:
+                if req.kind == "place":
+                    await self.client.place_limit_order(*req.args)
+                else:
+                    await self.client.cancel_order(*req.args)
+                self.sent[req.kind] += 1
+            finally:
+                self._drop(req)
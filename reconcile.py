@@ -0,0 +1,118 @@
+from collections import defaultdict
+from typing import Iterable
+
+from huqt_oracle_pysdk import Side, Tif
+
+from rate_limiter import OrderAction
+
+# price -> total size wanted resting at that price
+Ladder = dict[int, int]
+
+
+def ladder(price: int, size: int) -> Ladder:
+    """Single-level ladder; empty when `size` is not positive."""
+    return {price: size} if size > 0 else {}
+
+
+# Levels with at most this many orders are searched exhaustively
+EXACT_SEARCH_MAX = 8
+
+
+def _keep(level_orders: list, target: int) -> tuple[list, int]:
+    """
+    Orders at one price level to leave alone, never resting more than
+    `target` in total. Returns (kept, kept size).
+
+    Minimises cancels + places at the level (each order left out is a
+    cancel, any shortfall one place); among equally cheap choices the
+    oldest orders (lowest oid, best queue position) are kept.
+    """
+    by_age = sorted(level_orders, key=lambda x: x["oid"])
+    kept = []
+    total = 0
+    for o in by_age:
+        if total + o["size"] <= target:
+            kept.append(o)
+            total += o["size"]
+    if total == target or len(kept) == len(by_age) or len(by_age) > EXACT_SEARCH_MAX:
+        return kept, total
+
+    # The greedy choice skipped some orders and still leaves a shortfall; a
+    # different subset may hit the target exactly and save the place
+    best = (len(by_age) - len(kept) + 1, [o["oid"] for o in kept])
+    best_kept = kept
+    for mask in range(1, 1 << len(by_age)):
+        subset = [o for i, o in enumerate(by_age) if mask >> i & 1]
+        size = sum(o["size"] for o in subset)
+        if size > target:
+            continue
+        cost = (len(by_age) - len(subset) + (size < target), [o["oid"] for o in subset])
+        if cost < best:
+            best, best_kept = cost, subset
+    return best_kept, sum(o["size"] for o in best_kept)
+
+
+def reconcile(market: str,
+              orders: Iterable[dict],
+              bids: Ladder,
+              asks: Ladder,
+              tif: int = Tif.Gtc,
+              pending: Iterable[dict] = ()) -> list[OrderAction]:
+    """
+    Fewest cancels and places that turn our open `orders` in `market` into
+    the desired `bids`/`asks` ladders.
+
+    An order is only cancelled when its price is not wanted or the level
+    holds more than its target; in the latter case the oldest orders are kept
+    and the newest cancelled, so the orders that stay keep their queue
+    position. Any shortfall at a level is placed as one order. There is no
+    amend, so shrinking an order means cancelling it.
+
+    All cancels come before any place, so the result can be sent as one
+    batch without briefly resting more than the target.
+
+    `pending` are places sent but not in `orders` yet (see
+    OrderGateway.unacked): they count towards their level's target, so
+    they are not placed twice, but cannot be cancelled until they show up.
+    """
+    levels: dict[tuple, list] = defaultdict(list)
+    for o in orders:
+        levels[(o["side"], o["price"])].append(o)
+    in_flight: dict[tuple, int] = defaultdict(int)
+    for o in pending:
+        in_flight[(o["side"], o["price"])] += o["size"]
+
+    cancels = []
+    places = []
+    for side, wanted in ((Side.Buy, bids), (Side.Sell, asks)):
+        for (o_side, price), level_orders in levels.items():
+            if o_side == side and wanted.get(price, 0) <= 0:
+                cancels += [OrderAction("cancel", market, oid=o["oid"]) for o in level_orders]
+
+        for price, target in wanted.items():
+            if target <= 0:
+                continue
+            level_orders = levels.get((side, price), [])
+            target -= in_flight.get((side, price), 0)
+            kept, kept_size = _keep(level_orders, max(target, 0))
+            if len(kept) < len(level_orders):
+                kept_oids = {o["oid"] for o in kept}
+                cancels += [OrderAction("cancel", market, oid=o["oid"])
+                            for o in level_orders if o["oid"] not in kept_oids]
+            if kept_size < target:
+                places.append(OrderAction("place", market, side=side, price=price,
+                                          size=target - kept_size, tif=tif,
+                                          reduces_risk=side == Side.Sell))
+    return cancels + places
+
+
+def apply(orders: Iterable[dict], actions: Iterable[OrderAction], next_oid: int) -> list[dict]:
+    """Open orders after `actions`, assuming nothing fills; new orders get oids from `next_oid`."""
+    result = {o["oid"]: o for o in orders}
+    for a in actions:
+        if a.kind == "cancel":
+            result.pop(a.oid, None)
+        else:
+            result[next_oid] = {"oid": next_oid, "side": a.side, "price": a.price, "size": a.size}
+            next_oid += 1
+    return list(result.values())
@@ -0,0 +1,303 @@
+"""
+Cross-market relationship scanner.
+
+editorial.md lists the relationships the HarvardYale contracts obey:
+HRVD + YALE settle to 100, SUM and TDS move together, and TDS and TIME
+are roughly reciprocal. Each is a Relation: a weighted sum of the legs'
+prices (or of their logs, for products and ratios) that should stay
+inside [lo, hi].
+
+    scanner = RelationScanner(local_book, RELATIONS, markets)
+    scanner.add_listener(lambda signals: ...)
+
+    python relation_scanner.py      # print signals as the books move
+
+Top of book for every market lives in one contiguous quote vector and
+every relation is a row of one weight matrix, so a book update writes four
+numbers and re-checks the relations that trade that market with one
+matrix-vector product (bench_relation_scanner.py).
+"""
+import asyncio
+import math
+import os
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from huqt_oracle_pysdk import OracleClient, Side
+
+from endpoint import use_gateway
+from local_book import LocalBook, BookSnapshot
+from startup import Startup
+
+
+@dataclass(frozen=True)
+class Relation:
+    """
+    lo <= sum(weight * price) <= hi across the legs, or with log(price)
+    in place of price when `log` is set (so HRVD * YALE ~ k is
+    weights {1, 1} and bounds log(k)). One unit of the relation trades
+    |weight| lots of every leg; weights are meant to be small integers.
+    A signal needs the bound broken by more than `edge`, in the same units.
+    """
+    name: str
+    weights: dict[str, float]
+    lo: float
+    hi: float
+    log: bool = False
+    edge: float = 0.0
+
+
+# The bands on the two statistical relations are loose starting points,
+# meant to be refitted from a recorded session with calibrate()
+RELATIONS = [
+    Relation("HRVD+YALE=100", {"HRVD": 1, "YALE": 1}, 100, 100, edge=1),
+    Relation("SUM~TDS", {"SUM": 1, "TDS": -1}, -15, 15, edge=2),
+    Relation("TDS*TIME~k", {"TDS": 1, "TIME": 1}, math.log(1600), math.log(3600), log=True, edge=0.05),
+]
+
+
+@dataclass(frozen=True)
+class Signal:
+    """
+    Buy or sell one relation: `legs` are (market, side, price, lots per
+    unit) at the touch, `size` is how many units the touch can fill and
+    `excess` how far past its bound the relation trades.
+    """
+    relation: str
+    side: int
+    legs: tuple
+    excess: float
+    size: int
+
+
+class RelationScanner:
+    """
+    Checks the relations against the current top of book on each book
+    update and tells listeners whenever the set of live signals changes
+    (a signal appears, goes away, or changes price or size).
+
+    Selling a unit of a relation hits the bid of its positive legs and
+    lifts the ask of its negative ones, so its value is one dot product
+    with the quote vector [bid, log bid, ask, log ask]; buying is another,
+    negated so that every check reads `value > bound`. A missing bid is
+    -BIG and a missing ask +BIG, which keeps relations with a missing leg
+    from ever firing without a separate mask. An update only recomputes
+    the rows of relations that trade the market that moved.
+    """
+    BIG = 1e12
+
+    def __init__(self, book: Optional[LocalBook], relations: Iterable[Relation],
+                 markets: Optional[Iterable[str]] = None):
+        self.relations = list(relations)
+        names = list(markets or [])
+        for r in self.relations:
+            names.extend(m for m in r.weights if m not in names)
+        self.markets = names
+        self.index = {m: i for i, m in enumerate(names)}
+        n, c = len(names), len(self.relations)
+
+        self._quotes = np.concatenate([np.full(2 * n, -self.BIG), np.full(2 * n, self.BIG)])
+        self._sizes = np.zeros(2 * n)       # [bid size, ask size]
+        matrix = np.zeros((2 * c, 4 * n))
+        bound = np.zeros(2 * c)
+        # row -> [(market, leg side, lots, price column, size column)]
+        self._legs: list[list[tuple]] = []
+        for side, sign in ((Side.Sell, 1), (Side.Buy, -1)):
+            for k, r in enumerate(self.relations):
+                row = k if side == Side.Sell else c + k
+                bound[row] = r.hi + r.edge if side == Side.Sell else -(r.lo - r.edge)
+                legs = []
+                for m, weight in r.weights.items():
+                    i = self.index[m]
+                    # Positive legs go the relation's way, negative ones against it
+                    leg_side = side if weight > 0 else 1 - side
+                    px_col = i if leg_side == Side.Sell else 2 * n + i
+                    matrix[row, px_col + (n if r.log else 0)] = sign * weight
+                    legs.append((m, leg_side, abs(weight), px_col, i if leg_side == Side.Sell else n + i))
+                self._legs.append(legs)
+        self._matrix = matrix
+        self._bound = bound
+        self._raw_bound = np.concatenate([[r.hi for r in self.relations], [-r.lo for r in self.relations]])
+        self._values = matrix @ self._quotes
+
+        # Per market, the rows that trade it and their slice of the matrix
+        self._rows, self._sub, self._touched = [], [], []
+        for i in range(n):
+            cols = [i, n + i, 2 * n + i, 3 * n + i]
+            rows = np.flatnonzero(np.any(matrix[:, cols] != 0, axis=1))
+            self._rows.append(rows)
+            self._sub.append(np.ascontiguousarray(matrix[rows]))
+            self._touched.append(set(rows.tolist()))
+
+        self._live: dict[int, Signal] = {}
+        self.active: dict[tuple[str, int], Signal] = {}
+        self.updates = 0
+        self.emitted = 0
+        self._listeners: list[Callable[[list[Signal]], None]] = []
+        if book is not None:
+            book.add_listener(self.on_book)
+
+    def add_listener(self, callback: Callable[[list[Signal]], None]) -> None:
+        """callback(signals) runs with every live signal whenever they change."""
+        self._listeners.append(callback)
+
+    # ----------------------------------------------------
+    # Updates
+    # ----------------------------------------------------
+    def on_book(self, snap: BookSnapshot) -> None:
+        i = self.index.get(snap.market)
+        if i is None:
+            return
+        bid = snap.bids[0] if snap.bids else {"price": None, "size": None}
+        ask = snap.asks[0] if snap.asks else {"price": None, "size": None}
+        self.update(i, bid["price"], bid["size"], ask["price"], ask["size"])
+
+    def update(self, i: int, bid: Optional[int], bid_size: Optional[int],
+               ask: Optional[int], ask_size: Optional[int]) -> None:
+        """New top of book for market `i`, then re-check the relations that trade it."""
+        n = len(self.markets)
+        q = self._quotes
+        if bid is None or bid <= 0:
+            q[i] = q[n + i] = -self.BIG
+            self._sizes[i] = 0
+        else:
+            q[i], q[n + i] = bid, math.log(bid)
+            self._sizes[i] = bid_size
+        if ask is None or ask <= 0:
+            q[2 * n + i] = q[3 * n + i] = self.BIG
+            self._sizes[n + i] = 0
+        else:
+            q[2 * n + i], q[3 * n + i] = ask, math.log(ask)
+            self._sizes[n + i] = ask_size
+        self.updates += 1
+        rows = self._rows[i]
+        if len(rows):
+            self._values[rows] = self._sub[i] @ q
+            self._scan(self._touched[i])
+
+    def evaluate(self) -> list[Signal]:
+        """Re-check every relation; returns the live signals."""
+        self._values = self._matrix @ self._quotes
+        self._scan(None)
+        return list(self.active.values())
+
+    def _scan(self, touched: Optional[set]) -> None:
+        firing = np.flatnonzero(self._values > self._bound).tolist()
+        live = {}
+        changed = len(firing) != len(self._live)
+        for row in firing:
+            s = self._live.get(row)
+            if s is None or touched is None or row in touched:
+                fresh = self._signal(row)
+                changed = changed or fresh != s
+                s = fresh
+            live[row] = s
+        self._live = live
+        if not changed:
+            return
+        active = {(s.relation, s.side): s for s in live.values() if s.size > 0}
+        if active != self.active:
+            self.active = active
+            self.emitted += 1
+            signals = list(active.values())
+            for cb in self._listeners:
+                cb(signals)
+
+    def _signal(self, row: int) -> Signal:
+        c = len(self.relations)
+        r = self.relations[row % c]
+        legs = []
+        size = None
+        for m, leg_side, lots, px_col, size_col in self._legs[row]:
+            units = int(self._sizes[size_col] // lots)
+            size = units if size is None else min(size, units)
+            legs.append((m, leg_side, int(self._quotes[px_col]), lots))
+        side = Side.Sell if row < c else Side.Buy
+        excess = float(self._values[row] - self._raw_bound[row])
+        return Signal(r.name, side, tuple(legs), excess, size or 0)
+
+    def stats(self) -> dict:
+        return {"updates": self.updates, "emitted": self.emitted, "active": len(self.active)}
+
+
+def calibrate(relations: Iterable[Relation], tape, quantile: float = 0.01) -> list[Relation]:
+    """
+    Refit the bounds of every relation with lo < hi to the [quantile,
+    1 - quantile] range it spanned over a recorded session (replay.Tape),
+    valuing each market at its last trade price. Exact relations (lo == hi)
+    are kept as they are.
+    """
+    n = len(tape)
+    idx = np.arange(n)
+    last = {}
+    for i, name in enumerate(tape.names):
+        # Index of the latest trade in this market at every point of the tape
+        at = np.maximum.accumulate(np.where(tape.market == i, idx, -1))
+        last[name] = (at, np.where(at >= 0, tape.price[np.maximum(at, 0)], np.nan).astype(float))
+
+    fitted = []
+    for r in relations:
+        if r.lo == r.hi or any(m not in last for m in r.weights):
+            fitted.append(r)
+            continue
+        value = np.zeros(n)
+        for m, w in r.weights.items():
+            px = last[m][1]
+            value += w * (np.log(px) if r.log else px)
+        value = value[np.isfinite(value)]
+        if not len(value):
+            fitted.append(r)
+            continue
+        lo, hi = np.quantile(value, [quantile, 1 - quantile])
+        fitted.append(Relation(r.name, r.weights, float(lo), float(hi), r.log, r.edge))
+    return fitted
+
+
+# ----------------------------------------------------
+# Standalone scanner
+# ----------------------------------------------------
+def describe(s: Signal) -> str:
+    verb = "BUY" if s.side == Side.Buy else "SELL"
+    legs = " ".join(f"{'+' if leg_side == Side.Buy else '-'}{lots:g}x{m}@{px}" for m, leg_side, px, lots in s.legs)
+    return f"{verb} {s.relation} x{s.size} ({legs}) excess {s.excess:.3g}"
+
+
+async def main() -> None:
+    load_dotenv()
+    use_gateway()
+    client = OracleClient()
+    book = LocalBook(client)
+    startup = Startup(client)
+    await client.start_client(account=os.getenv("ACCOUNT_ADDRESS"), api_key=os.getenv("API_KEY"),
+                              domain="HarvardYale")
+    markets = [m["name"] for m in client.domain_metadata.get("Markets Metadata", [])]
+    relations = [r for r in RELATIONS if all(m in markets for m in r.weights)] if markets else RELATIONS
+    scanner = RelationScanner(book, relations, markets)
+
+    def show(signals):
+        if not signals:
+            print("\033[90m[relations] no signals\033[0m")
+        for s in signals:
+            print(f"\033[1;33m[relations] {describe(s)}\033[0m")
+
+    scanner.add_listener(show)
+    await startup.subscribe(scanner.markets)
+    await startup.wait_ready()
+    print(f"🔎 Watching {len(scanner.relations)} relations over {len(scanner.markets)} markets")
+    try:
+        await asyncio.Event().wait()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        print(f"Scanner stats: {scanner.stats()}")
+        await client.stop_client()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\033[1;31mRelation scanner stopped.\033[0m")
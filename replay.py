@@ -0,0 +1,410 @@
+"""
+Deterministic replay of recorded trade logs against unmodified strategies.
+
+Strategies keep using a real OracleClient; only its transport is swapped.
+Replay.start_client() hands the client a ReplayConnection instead of a
+websocket, so every request goes through the SDK's normal encoding and
+every update comes back as the same FlatBuffers frames the gateway sends,
+which keeps LocalBook, MarketScheduler, OrderGateway and the client's own
+state (get_book, get_self_open_orders, get_self_positions, ...) exactly as
+they behave live. Orders are matched by SimExchange, with the venue's
+no-short/no-borrow spot rules.
+
+The logs only hold trades, not books, so the book around the strategy's
+own orders is synthetic: a background account keeps `BackgroundDepth`
+levels on each side of the last traded price, and each recorded trade is
+replayed as an IOC order from that account at the recorded price and size.
+It takes out any strategy order priced at or through the trade, in
+price-time order, before background depth; whatever the simulated book
+cannot absorb is still printed as a trade.
+
+Time is virtual: VirtualTimeLoop jumps its clock to the next timer
+whenever nothing is ready to run, so sleeps, timeouts and rate limits
+behave as on the recorded timeline while the replay runs as fast as the
+CPU allows. Same tape + same strategy = same fills.
+
+    with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+        runner.run(main())
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+
+import huqt_oracle_pysdk.oracle as _oracle
+from huqt_oracle_pysdk import OracleClient, Side, Tif
+
+import sim_wire as wire
+from market_registry import MarketInfo
+from sim_venue import SimVenue
+from trade_store import TradeStore
+
+BACKGROUND = "background"
+# Replayed tape events plus client requests per wall-clock second. Most of
+# the cost is the SDK decoding the frames each event produces (a 20-level
+# book alone is ~0.3ms in message_handler), which the replay cannot avoid
+TARGET_EVENTS_PER_SEC = 1_000
+
+
+# ----------------------------------------------------
+# Virtual clock
+# ----------------------------------------------------
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose clock only moves when the loop would otherwise wait:
+    if no callback is ready, time jumps straight to the earliest timer.
+    The clock starts at the same value on every run: float rounding
+    against a different origin each time is enough to shift a fill
+    timestamp by a tick and make two replays diverge.
+    """
+    EPOCH = 1_000_000.0
+
+    def __init__(self):
+        super().__init__()
+        self._virtual_now = self.EPOCH
+
+    def time(self) -> float:
+        return self._virtual_now
+
+    def _run_once(self):
+        # Relies on BaseEventLoop internals (_ready deque, _scheduled heap),
+        # which have been stable since 3.4
+        if not self._ready and self._scheduled and not self._stopping:
+            when = self._scheduled[0]._when
+            if when > self._virtual_now:
+                self._virtual_now = when
+        super()._run_once()
+
+
+# ----------------------------------------------------
+# Tape
+# ----------------------------------------------------
+def _seconds_per_unit(t: int) -> float:
+    """Guess the unit of epoch timestamps from their magnitude."""
+    t = abs(int(t))
+    if t >= 10 ** 17:
+        return 1e-9
+    if t >= 10 ** 14:
+        return 1e-6
+    if t >= 10 ** 11:
+        return 1e-3
+    return 1.0
+
+
+class Tape:
+    """
+    Trades of several markets merged into one time-ordered sequence.
+    `seconds` is each trade's offset from the first one.
+    """
+    _COLUMNS = ("time", "market", "price", "size", "side", "seconds")
+
+    def __init__(self, names: list[str], columns: dict[str, np.ndarray]):
+        order = np.argsort(columns["time"], kind="stable")
+        self.names = names
+        self.time = columns["time"][order].astype(np.int64)
+        self.market = columns["market"][order].astype(np.int16)
+        self.price = columns["price"][order].astype(np.int64)
+        self.size = columns["size"][order].astype(np.int64)
+        self.side = columns["side"][order].astype(np.int8)
+        unit = _seconds_per_unit(self.time[0]) if len(self.time) else 1.0
+        self.seconds = (self.time - (self.time[0] if len(self.time) else 0)) * unit
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @property
+    def duration(self) -> float:
+        return float(self.seconds[-1]) if len(self) else 0.0
+
+    def first_price(self, market: str) -> Optional[int]:
+        idx = np.flatnonzero(self.market == self.names.index(market))
+        return int(self.price[idx[0]]) if len(idx) else None
+
+    @classmethod
+    def _merge(cls, per_market: dict[str, dict[str, np.ndarray]]) -> "Tape":
+        names = sorted(per_market)
+        cols = {k: [] for k in ("time", "market", "price", "size", "side")}
+        for i, name in enumerate(names):
+            c = per_market[name]
+            for k in ("time", "price", "size", "side"):
+                cols[k].append(np.asarray(c[k]))
+            cols["market"].append(np.full(len(c["time"]), i, dtype=np.int16))
+        if not names:
+            return cls([], {k: np.zeros(0, dtype=np.int64) for k in cols})
+        return cls(names, {k: np.concatenate(v) for k, v in cols.items()})
+
+    @classmethod
+    def from_json_logs(cls, directory: str = "logs", markets: Optional[Iterable[str]] = None) -> "Tape":
+        """Load persistence.py's logs/{market}.json files."""
+        wanted = set(markets) if markets is not None else None
+        per_market = {}
+        for name in sorted(os.listdir(directory)):
+            market = name[:-len(".json")]
+            if not name.endswith(".json") or (wanted is not None and market not in wanted):
+                continue
+            rows = []
+            with open(os.path.join(directory, name)) as f:
+                for line in f:
+                    if line.strip():
+                        t = json.loads(line)
+                        rows.append((t["time"], t["price"], t["size"], 0 if t["taker_side"] == "buy" else 1))
+            arr = np.array(rows, dtype=np.int64).reshape(-1, 4)
+            per_market[market] = {"time": arr[:, 0], "price": arr[:, 1], "size": arr[:, 2], "side": arr[:, 3]}
+        return cls._merge(per_market)
+
+    @classmethod
+    def from_store(cls, root: str = "store", markets: Optional[Iterable[str]] = None) -> "Tape":
+        """Load a TradeStore (see trade_store.py)."""
+        store = TradeStore(root)
+        names = markets if markets is not None else store.markets()
+        return cls._merge({m: store.open(m).scan() for m in names})
+
+    @classmethod
+    def load(cls, markets: Optional[Iterable[str]] = None, logs: str = "logs", store: str = "store") -> Optional["Tape"]:
+        """JSON logs if there are any, else the columnar store, else None."""
+        if os.path.isdir(logs) and any(n.endswith(".json") for n in os.listdir(logs)):
+            return cls.from_json_logs(logs, markets)
+        if os.path.isdir(store) and TradeStore(store).markets():
+            return cls.from_store(store, markets)
+        return None
+
+    def save(self, directory: str) -> None:
+        """Write the merged columns as .npy files, for open() to map back."""
+        os.makedirs(directory, exist_ok=True)
+        for name in self._COLUMNS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "names.json"), "w") as f:
+            json.dump(self.names, f)
+
+    @classmethod
+    def open(cls, directory: str) -> "Tape":
+        """
+        A saved tape, memory-mapped read-only: every process replaying it
+        shares the one copy in the page cache instead of unpickling its own.
+        """
+        tape = cls.__new__(cls)
+        with open(os.path.join(directory, "names.json")) as f:
+            tape.names = json.load(f)
+        for name in cls._COLUMNS:
+            setattr(tape, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+        return tape
+
+
+# ----------------------------------------------------
+# Transport
+# ----------------------------------------------------
+class ReplayConnection:
+    """Stands in for WSClient: same connect/send/listen/close/ready surface."""
+    def __init__(self, venue: "Replay"):
+        self.venue = venue
+        self.account: Optional[str] = None
+        self.subscriptions: set = set()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self._inbox: deque = deque()
+        self._wakeup = asyncio.Event()
+
+    def push(self, frame: bytes) -> None:
+        self._inbox.append(frame)
+        self._wakeup.set()
+
+    async def connect(self) -> None:
+        pass
+
+    async def send(self, data: bytes) -> None:
+        if not self.closed:
+            self.venue.handle(self, data)
+
+    async def listen(self, on_message, **_):
+        self.ready.set()
+        try:
+            while True:
+                if not self._inbox:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                await on_message(self._inbox.popleft())
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        self.closed = True
+        self.venue.disconnect(self)
+
+
+@dataclass(frozen=True)
+class BackgroundDepth:
+    """Synthetic liquidity kept around the last traded price of each market."""
+    levels: int = 5
+    size: int = 10
+    # Ticks between the last trade and the first background bid/ask
+    half_spread: int = 2
+
+
+# ----------------------------------------------------
+# Venue
+# ----------------------------------------------------
+class Replay(SimVenue):
+    """
+    One simulated venue replaying `tape`.
+
+    `accounts` maps account -> {symbol: starting balance}. Markets not in
+    `markets` get base = market name and quote = QTC. `order_latency`
+    delays every order and cancel by that many virtual seconds before it
+    reaches the matching engine.
+    """
+    def __init__(self, tape: Tape, *,
+                 accounts: Optional[dict[str, dict[str, int]]] = None,
+                 markets: Optional[Iterable[MarketInfo]] = None,
+                 domain: str = "HarvardYale",
+                 depth: BackgroundDepth = BackgroundDepth(),
+                 order_latency: float = 0.0):
+        infos = {m.name: m for m in (markets or [])}
+        for name in tape.names:
+            infos.setdefault(name, MarketInfo(name, name, "QTC", 0, 0, 0, 1))
+        super().__init__(infos.values(), accounts=accounts, domain=domain, unlimited=[BACKGROUND])
+        self.tape = tape
+        self.depth = depth
+        self.order_latency = order_latency
+        self._background: dict[str, dict[int, int]] = {m: {} for m in infos}
+        self._tape_start: Optional[int] = None
+        self._loop_start: Optional[float] = None
+
+        self.tape_events = 0
+        self.real_seconds = 0.0
+        self.virtual_seconds = 0.0
+
+    # ----------------------------------------------------
+    # Clients
+    # ----------------------------------------------------
+    def connect(self, url: str = "", api_key: str = "", ctx=None) -> ReplayConnection:
+        """WSClient-compatible factory."""
+        conn = ReplayConnection(self)
+        self.connections.append(conn)
+        return conn
+
+    def disconnect(self, conn: ReplayConnection) -> None:
+        if conn in self.connections:
+            self.connections.remove(conn)
+
+    async def start_client(self, client: OracleClient, account: str) -> None:
+        """client.start_client() against this venue instead of the exchange."""
+        real = _oracle.WSClient
+        _oracle.WSClient = self.connect
+        try:
+            await client.start_client(account=account, api_key="replay", domain=self.domain)
+        finally:
+            _oracle.WSClient = real
+
+    def submit(self, conn: ReplayConnection, msg: wire.ClientMessage) -> None:
+        if self.order_latency > 0:
+            asyncio.get_running_loop().call_later(self.order_latency, self.execute, conn, msg)
+        else:
+            self.execute(conn, msg)
+
+    # ----------------------------------------------------
+    # Tape
+    # ----------------------------------------------------
+    async def run(self) -> None:
+        """Replay the whole tape on the running (virtual-time) loop."""
+        loop = asyncio.get_running_loop()
+        tape = self.tape
+        names = tape.names
+        seconds = tape.seconds.tolist()
+        times, markets = tape.time.tolist(), tape.market.tolist()
+        prices, sizes, sides = tape.price.tolist(), tape.size.tolist(), tape.side.tolist()
+
+        real_start = time.perf_counter()
+        self._loop_start = start = loop.time()
+        self._tape_start = times[0] if times else 0
+        for m in names:
+            px = tape.first_price(m)
+            if px is not None:
+                self._recentre(m, px)
+        self.flush()
+
+        i, n = 0, len(times)
+        while i < n:
+            delay = start + seconds[i] - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            t = seconds[i]
+            while i < n and seconds[i] == t:
+                self._replay_trade(names[markets[i]], prices[i], sizes[i], sides[i], times[i])
+                i += 1
+            self.flush()
+        self.tape_events += n
+        self.real_seconds += time.perf_counter() - real_start
+        self.virtual_seconds += loop.time() - start
+
+    def _replay_trade(self, market: str, price: int, size: int, side: int, t: int) -> None:
+        ex = self.exchange
+        traded = ex.volume
+        ex.place(BACKGROUND, market, side, price, size, Tif.Ioc, t)
+        rest = size - (ex.volume - traded)
+        if rest > 0:
+            ex.print_trade(market, price, rest, side, t)
+        self._recentre(market, price)
+
+    def _recentre(self, market: str, price: int) -> None:
+        """Move the background levels to surround `price`."""
+        ex = self.exchange
+        d = self.depth
+        targets = {}
+        for i in range(d.levels):
+            bid = price - d.half_spread - i
+            if bid > 0:
+                targets[bid] = Side.Buy
+            targets[price + d.half_spread + i] = Side.Sell
+
+        current = self._background[market]
+        for px, oid in list(current.items()):
+            order = ex.orders.get(oid)
+            if order is None or targets.get(px) != order.side:
+                if order is not None:
+                    ex.cancel(BACKGROUND, market, oid)
+                del current[px]
+            elif order.size != d.size:
+                ex.amend_size(oid, d.size)
+        for px, side in targets.items():
+            if px not in current:
+                order = ex.place(BACKGROUND, market, side, px, d.size, Tif.Gtc, self.now())
+                if order.size:
+                    current[px] = order.oid
+
+    def now(self) -> int:
+        """Tape time: the first trade's timestamp plus virtual time since run() started."""
+        if self._tape_start is None:
+            return 0
+        unit = _seconds_per_unit(self._tape_start)
+        return self._tape_start + int((asyncio.get_running_loop().time() - self._loop_start) / unit)
+
+    # ----------------------------------------------------
+    # Results
+    # ----------------------------------------------------
+    def stats(self) -> dict:
+        events = self.tape_events + self.requests
+        real = max(self.real_seconds, 1e-9)
+        return {
+            "tape_events": self.tape_events,
+            "requests": self.requests,
+            "frames": self.frames,
+            "fills": len(self.fills),
+            "rejected": self.exchange.rejected,
+            "virtual_seconds": round(self.virtual_seconds, 1),
+            "real_seconds": round(self.real_seconds, 2),
+            "speedup": round(self.virtual_seconds / real, 1),
+            "events_per_sec": round(events / real),
+            "target_events_per_sec": TARGET_EVENTS_PER_SEC,
+        }
+
+
+def run_replay(main):
+    """Run coroutine `main` to completion on a fresh VirtualTimeLoop."""
+    with asyncio.Runner(loop_factory=VirtualTimeLoop) as runner:
+        return runner.run(main)
@@ -1,64 +1,53 @@
 from huqt_oracle_pysdk import OracleClient, Side, Tif
 from dotenv import load_dotenv
-import numpy as np
 import requests, asyncio, os
-
-# class contract:
-#     def __init__(self, name: str, frequency: float):
-#         self.name = name
-#         self.fair = None
-#         self.frequency = frequency
-    
-#     async def trade(self, prices):
-#         # wait time is inverse frequency
-#         wait_time = np.random.exponential(scale=1.0 / self.frequency)
-#         await asyncio.sleep(wait_time)
-#         if not self.fair: return
-
-#         # flip a coin to decide side
-#         side = np.random.choice([Side.Buy, Side.Sell])
-#         price = prices[side]
-#         print(f'attempt to trade on contract {self.name} wait time = {wait_time} with fair = {self.fair} at price = {price}')
-#         if price and side == Side.Buy:
-#             if price <= self.fair + 5:
-#                 await haorzhe.place_limit_order(market = self.name, side=Side.Buy, price=price, size=1, tif=Tif.Ioc)
-#                 print(f'Bought {self.name} for price {price}')
-#         if price and side == Side.Sell:
-#             if price >= self.fair - 5:
-#                 await haorzhe.place_limit_order(market = self.name, side=Side.Sell, price=price, size=1, tif=Tif.Ioc)
-#                 print(f'Sold {self.name} for price {price}')
+from local_book import LocalBook
+from rate_limiter import OrderGateway
+from retail_flow import ContractFlow, RetailFlow
+from instrument import Instrumentation
+from startup import Startup
 
 ## Update the markets list to keep track of those markets.
 haorzhe = OracleClient()
+local_book = LocalBook(haorzhe)
+gateway = OrderGateway(haorzhe, rate=50)
+instruments = Instrumentation(haorzhe)
 markets = ['HRVD', 'YALE', 'TIME', 'RAIN', 'TDS', 'PTS']
+startup = Startup(haorzhe, markets)
+# Orders/sec, size and fair anchor per contract (see retail_flow.py);
+# 2 orders/sec overall, spread evenly
+contracts = [ContractFlow(m, rate=2 / len(markets), size_mean=3, size_sd=1) for m in markets]
+# None for a different flow every run
+SEED = None
 
-async def trade_handler():
-    while True:
-        # snap = requests.get(f"https://api.polygon.io/v3/snapshot/indices", params={"ticker": "I:VIX", "apiKey": 'g4OC2SA8TmEm9RBrD2UfAXnClXwdlHxf'}).json()
-        # vix_meta = snap['results'][0]
-        # tVIX.fair = int(vix_meta['value'] * 5.0)
-        # tCMP.fair = 300 - tVIX.fair
 
-        book = haorzhe.get_book()
-        contract = np.random.choice(markets)
-        contract_book = book[contract]
-        buys = contract_book['bids']
-        sells = contract_book['asks']
+def quote(market, side):
+    return local_book.best_ask(market) if side == Side.Buy else local_book.best_bid(market)
+
 
-        best_buy = buys[0]['price'] if buys else None
-        best_sell = sells[0]['price'] if sells else None
+async def send(participant, market, side, price, size):
+    print(f'{"buying" if side == Side.Buy else "selling"} {market} at price {price} for {size} quantity')
+    await gateway.place_limit_order(market, side, price, size, Tif.Ioc)
 
-        side = np.random.choice([Side.Buy, Side.Sell])
-        if side == Side.Buy:
-            x = max(int(np.random.normal(3, 1)), 1)
-            print(f'buying {contract} at price {best_sell} for {x} quantity')
-            await haorzhe.place_limit_order(contract, side, best_sell, x, Tif.Ioc)
-        if side == Side.Sell:
-            x = max(int(np.random.normal(3, 1)), 1)
-            print(f'selling {contract} at price {best_buy} for {x} quantity')
-            await haorzhe.place_limit_order(contract, side, best_buy, x, Tif.Ioc)
 
-        await asyncio.sleep(0.5)
+async def report_flow(flow, interval: float = 30.0):
+    while True:
+        await asyncio.sleep(interval)
+        s = flow.stats()
+        print(f"[retail] target={s['target_rate']}/s achieved={s['achieved_rate']}/s sent={s['sent_rate']}/s "
+              f"skipped={s['skipped']} late_p99={s['lateness_us'].get('p99')}us")
+
+
+async def trade_handler():
+    await startup.wait_ready()
+    flow = RetailFlow(contracts, quote, send, seed=SEED)
+    reporter = asyncio.create_task(report_flow(flow))
+    instruments.start()
+    try:
+        await flow.run()
+    finally:
+        reporter.cancel()
+        await instruments.stop()
 
 ## ------------ DO NOT CHANGE BELOW THIS LINE ------------
 async def main():
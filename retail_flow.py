@@ -0,0 +1,141 @@
+"""
+Synthetic retail order flow: each contract gets its own Poisson arrival
+rate, size distribution and optional fair-value anchor.
+
+Arrivals for all contracts are drawn together as one Poisson process at
+the summed rate, each arrival assigned to a contract in proportion to its
+rate (the same thing as independent per-contract processes). Gaps,
+contracts, sides, sizes and participants come out of NumPy in batches of
+BATCH, so the send loop only walks precomputed lists.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Union
+
+import numpy as np
+
+from huqt_oracle_pysdk import Side
+
+from metrics import LatencyHistogram
+
+BATCH = 1024
+
+
+@dataclass(frozen=True)
+class ContractFlow:
+    """How retail trades one contract."""
+    name: str
+    rate: float                    # orders per second
+    size_mean: float = 3.0
+    size_sd: float = 1.0
+    fair: Optional[float] = None   # anchor; without one, trade at the touch
+    max_edge: float = 5.0          # don't pay more than fair + max_edge (or sell below fair - max_edge)
+
+
+@dataclass
+class Arrivals:
+    """One precomputed batch; times are loop.time() deadlines."""
+    times: list[float]
+    contracts: list[int]
+    sides: list[int]
+    sizes: list[int]
+    participants: list[int]
+
+
+# (market, side) -> price to cross at, or None if there is none
+Quote = Callable[[str, int], Optional[int]]
+# (participant, market, side, price, size)
+Send = Callable[[int, str, int, int, int], Union[Awaitable[None], None]]
+
+
+class RetailFlow:
+    """
+    Generates arrivals and hands each one to `send(participant, market,
+    side, price, size)` at its time, pricing IOCs off `quote(market, side)`
+    (the price to cross at: best ask to buy, best bid to sell).
+
+    If `send` returns an awaitable it is awaited before the next order, so
+    back-pressure (a rate limit, a slow socket) shows up as orders going
+    out late and the achieved rate falling behind the target.
+    """
+    def __init__(self, contracts: list[ContractFlow], quote: Quote, send: Send, *,
+                 participants: int = 1, seed: Optional[int] = None):
+        self.contracts = list(contracts)
+        self.quote = quote
+        self.send = send
+        self.participants = participants
+        self.rng = np.random.default_rng(seed)
+
+        rates = np.array([c.rate for c in self.contracts], dtype=float)
+        self.target_rate = float(rates.sum())
+        self._p = rates / self.target_rate
+        self._size_mean = np.array([c.size_mean for c in self.contracts])
+        self._size_sd = np.array([c.size_sd for c in self.contracts])
+
+        self.arrived = [0] * len(self.contracts)
+        self.sent = 0
+        self.skipped = 0            # no price to cross at, or outside the fair anchor
+        self.lateness = LatencyHistogram("retail lateness")
+        self._started: Optional[float] = None
+        self._stopped: Optional[float] = None
+
+    def draw(self, start: float, n: int = BATCH) -> Arrivals:
+        rng = self.rng
+        times = start + np.cumsum(rng.exponential(1.0 / self.target_rate, n))
+        contracts = rng.choice(len(self.contracts), n, p=self._p)
+        sides = rng.integers(0, 2, n)
+        sizes = np.maximum(rng.normal(self._size_mean[contracts], self._size_sd[contracts]).astype(np.int64), 1)
+        participants = rng.integers(0, self.participants, n)
+        return Arrivals(times.tolist(), contracts.tolist(), sides.tolist(), sizes.tolist(), participants.tolist())
+
+    def price(self, c: ContractFlow, side: int) -> Optional[int]:
+        px = self.quote(c.name, side)
+        if px is None or c.fair is None:
+            return px
+        if side == Side.Buy:
+            return px if px <= c.fair + c.max_edge else None
+        return px if px >= c.fair - c.max_edge else None
+
+    async def run(self, duration: Optional[float] = None) -> None:
+        loop = asyncio.get_running_loop()
+        self._started = due = loop.time()
+        end = None if duration is None else due + duration
+        try:
+            while True:
+                batch = self.draw(due)
+                for t, ci, side, size, who in zip(batch.times, batch.contracts, batch.sides,
+                                                  batch.sizes, batch.participants):
+                    if end is not None and t >= end:
+                        return
+                    delay = t - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    self.lateness.record(max(int((loop.time() - t) * 1e9), 0))
+                    self.arrived[ci] += 1
+                    c = self.contracts[ci]
+                    price = self.price(c, side)
+                    if price is None:
+                        self.skipped += 1
+                        continue
+                    self.sent += 1
+                    pending = self.send(who, c.name, side, price, size)
+                    if pending is not None:
+                        await pending
+                due = batch.times[-1]
+        finally:
+            self._stopped = loop.time()
+
+    def stats(self) -> dict:
+        if self._started is None:
+            return {"target_rate": self.target_rate}
+        end = self._stopped if self._stopped is not None else asyncio.get_running_loop().time()
+        elapsed = max(end - self._started, 1e-9)
+        return {
+            "target_rate": round(self.target_rate, 2),
+            "achieved_rate": round(sum(self.arrived) / elapsed, 2),
+            "sent_rate": round(self.sent / elapsed, 2),
+            "skipped": self.skipped,
+            "per_contract": {c.name: {"target": c.rate, "achieved": round(n / elapsed, 2)}
+                             for c, n in zip(self.contracts, self.arrived)},
+            "lateness_us": self.lateness.snapshot(),
+        }
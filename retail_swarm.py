@@ -0,0 +1,236 @@
+"""
+Many retail accounts from one process, for load-testing the venue.
+
+    python retail_swarm.py (--credentials accounts.csv | --accounts N)
+                           [--rate 200] [--seconds N] [--report 10]
+
+accounts.csv has one `account,api_key` per line (# starts a comment).
+--accounts N makes up N accounts with no key, for sim_server.py, which
+funds whoever connects; point at it with ORACLE_WS_URL (see endpoint.py).
+
+Every account has its own connection and session, since the gateway binds
+the account to the connection, and its own OrderGateway, so the 50
+orders/s limit applies per account. Market data is only subscribed on the
+first account's connection; one LocalBook on it prices everyone's orders.
+One RetailFlow (retail.py's contracts, scaled to --rate) picks the account
+for each order.
+"""
+import asyncio
+import dataclasses
+import sys
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from huqt_oracle_pysdk import OracleClient, Side, Tif
+from huqt_oracle_pysdk.fbs_gen.gateway.FillsStream import FillsStream
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponse import ServerResponse
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+
+from client_tap import tap
+from endpoint import use_gateway
+from local_book import LocalBook
+from metrics import LoopLagMonitor
+from rate_limiter import OrderGateway
+from retail_flow import ContractFlow, RetailFlow
+from startup import Startup
+
+DOMAIN = "HarvardYale"
+# Accounts connecting at once; the rest wait their turn
+CONNECT_CONCURRENCY = 20
+
+
+def load_credentials(path: str) -> list[tuple[str, str]]:
+    creds = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            account, api_key = (part.strip() for part in line.split(",", 1))
+            creds.append((account, api_key))
+    return creds
+
+
+def _taker_fill_size(msg: bytes) -> int:
+    root = ServerResponse.GetRootAs(msg, 0)
+    tbl = root.Response()
+    fs = FillsStream()
+    fs.Init(tbl.Bytes, tbl.Pos)
+    if fs.IsSnapshot():
+        return 0
+    return sum(f.Sz() for f in (fs.Fills(i) for i in range(fs.FillsLength())) if f.IsTaker())
+
+
+class SwarmAccount:
+    """One simulated trader: its own client, connection and order path."""
+    def __init__(self, account: str, api_key: str, rate: float = 50):
+        self.account = account
+        self.api_key = api_key
+        self.client = OracleClient()
+        self.gateway = OrderGateway(self.client, rate=rate)
+        self.placed_size = 0
+        self.filled_size = 0
+        self._inflight: set[asyncio.Task] = set()
+        tap(self.client, self._on_frame)
+
+    def _on_frame(self, kind: int, market: Optional[str], msg: bytes) -> None:
+        if kind == ServerResponseUnion.FillsStream:
+            self.filled_size += _taker_fill_size(msg)
+
+    async def start(self) -> None:
+        await self.client.start_client(account=self.account, api_key=self.api_key, domain=DOMAIN)
+
+    def place(self, market: str, side: int, price: int, size: int) -> None:
+        """Queue an IOC on this account's gateway without holding up the caller."""
+        self.placed_size += size
+        task = asyncio.create_task(self.gateway.place_limit_order(market, side, price, size, Tif.Ioc))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    def stats(self, elapsed: float) -> dict:
+        g = self.gateway
+        return {
+            "orders_per_sec": round(g.sent["place"] / elapsed, 2),
+            "fill_rate": round(self.filled_size / self.placed_size, 3) if self.placed_size else None,
+            "pending": g.pending(),
+        }
+
+    async def stop(self) -> None:
+        for task in list(self._inflight):
+            task.cancel()
+        await self.gateway.stop()
+        await self.client.stop_client()
+
+
+class RetailSwarm:
+    def __init__(self, credentials: list[tuple[str, str]], contracts: list[ContractFlow], *,
+                 seed: Optional[int] = None):
+        self.accounts = [SwarmAccount(account, key) for account, key in credentials]
+        self.feed = self.accounts[0].client
+        self.book = LocalBook(self.feed)
+        self.startup = Startup(self.feed, [c.name for c in contracts])
+        self.flow = RetailFlow(contracts, self.quote, self.send, participants=len(self.accounts), seed=seed)
+        self.loop_lag = LoopLagMonitor()
+        self._started: Optional[float] = None
+
+    def quote(self, market: str, side: int) -> Optional[int]:
+        return self.book.best_ask(market) if side == Side.Buy else self.book.best_bid(market)
+
+    def send(self, participant: int, market: str, side: int, price: int, size: int) -> None:
+        self.accounts[participant].place(market, side, price, size)
+
+    async def start(self) -> None:
+        sem = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+        async def connect(a: SwarmAccount):
+            async with sem:
+                await a.start()
+
+        async def feed():
+            # Market data goes out as soon as the feed account is up, not after everyone
+            await connect(self.accounts[0])
+            await self.startup.subscribe(self.startup.markets)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(feed(), *(connect(a) for a in self.accounts[1:]))
+        await self.startup.wait_ready()
+        print(f"🧑‍🤝‍🧑 {len(self.accounts)} accounts connected in {time.perf_counter() - t0:.2f}s, "
+              f"target {self.flow.target_rate:g} orders/s")
+
+    async def run(self, duration: Optional[float] = None, report_every: float = 10.0) -> None:
+        self.loop_lag.start()
+        self._started = time.perf_counter()
+        reporter = asyncio.create_task(self._report(report_every))
+        try:
+            await self.flow.run(duration)
+        finally:
+            reporter.cancel()
+            await self.loop_lag.stop()
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(a.stop() for a in self.accounts))
+
+    def stats(self) -> dict:
+        elapsed = max(time.perf_counter() - (self._started or time.perf_counter()), 1e-9)
+        per_account = {a.account: a.stats(elapsed) for a in self.accounts}
+        placed = sum(a.placed_size for a in self.accounts)
+        return {
+            "accounts": len(self.accounts),
+            "flow": self.flow.stats(),
+            "orders_per_sec": round(sum(a.gateway.sent["place"] for a in self.accounts) / elapsed, 2),
+            "fill_rate": round(sum(a.filled_size for a in self.accounts) / placed, 3) if placed else None,
+            "pending": sum(s["pending"] for s in per_account.values()),
+            "loop_lag_us": self.loop_lag.lag.snapshot(),
+            "per_account": per_account,
+        }
+
+    async def _report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            s = self.stats()
+            f = s["flow"]
+            print(f"[swarm] target={f['target_rate']}/s achieved={f['achieved_rate']}/s "
+                  f"skipped={f['skipped']} sent={s['orders_per_sec']}/s "
+                  f"fill_rate={s['fill_rate']} pending={s['pending']} "
+                  f"loop_lag_p99={s['loop_lag_us'].get('p99')}us")
+
+
+def print_accounts(stats: dict) -> None:
+    print(f"{'account':24} {'orders/s':>9} {'fill rate':>10} {'pending':>8}")
+    for name, s in stats["per_account"].items():
+        fill = "-" if s["fill_rate"] is None else f"{s['fill_rate']:.1%}"
+        print(f"{name[:24]:24} {s['orders_per_sec']:>9.2f} {fill:>10} {s['pending']:>8}")
+    fill = "-" if stats["fill_rate"] is None else f"{stats['fill_rate']:.1%}"
+    print(f"{'all ' + str(stats['accounts']):24} {stats['orders_per_sec']:>9.2f} {fill:>10} {stats['pending']:>8}"
+          f"   target {stats['flow']['target_rate']}/s, achieved {stats['flow']['achieved_rate']}/s "
+          f"({stats['flow']['skipped']} skipped with nothing to cross), "
+          f"loop lag p99 {stats['loop_lag_us'].get('p99')}us")
+
+
+async def main(args: list[str]) -> None:
+    load_dotenv()
+    use_gateway()
+    import retail
+    credentials, rate, seconds, report = None, None, None, 10.0
+    it = iter(args)
+    for a in it:
+        if a == "--credentials":
+            credentials = load_credentials(next(it))
+        elif a == "--accounts":
+            credentials = [(f"retail{i}", "") for i in range(int(next(it)))]
+        elif a == "--rate":
+            rate = float(next(it))
+        elif a == "--seconds":
+            seconds = float(next(it))
+        elif a == "--report":
+            report = float(next(it))
+        else:
+            credentials = None
+            break
+    if not credentials:
+        sys.exit("usage: python retail_swarm.py (--credentials FILE | --accounts N) "
+                 "[--rate N] [--seconds N] [--report N]")
+
+    contracts = retail.contracts
+    if rate is not None:
+        scale = rate / sum(c.rate for c in contracts)
+        contracts = [dataclasses.replace(c, rate=c.rate * scale) for c in contracts]
+    swarm = RetailSwarm(credentials, contracts, seed=retail.SEED)
+    await swarm.start()
+    try:
+        await swarm.run(seconds, report)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        stats = swarm.stats()
+        await swarm.stop()
+        print_accounts(stats)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print("\033[1;31mRetail swarm stopped.\033[0m")
@@ -0,0 +1,267 @@
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, Optional
+
+from huqt_oracle_pysdk import OracleClient
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponse import ServerResponse
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+from huqt_oracle_pysdk.fbs_gen.gateway.FillsStream import FillsStream
+from huqt_oracle_pysdk.fbs_gen.gateway.OpenOrdersStream import OpenOrdersStream
+from huqt_oracle_pysdk.fbs_gen.gateway.OrderDeltasData import OrderDeltasData
+from huqt_oracle_pysdk.fbs_gen.gateway.WsOpenOrders import WsOpenOrders
+
+from client_tap import tap
+from local_book import LocalBook, BookSnapshot
+from metrics import LatencyHistogram
+
+MarketCallback = Callable[[str], Awaitable[None]]
+BatchCallback = Callable[[set], Awaitable[None]]
+
+
+def b2s(b):
+    return b.decode("utf-8") if b is not None else None
+
+
+def _fill_markets(msg: bytes) -> set:
+    root = ServerResponse.GetRootAs(msg, 0)
+    tbl = root.Response()
+    fs = FillsStream()
+    fs.Init(tbl.Bytes, tbl.Pos)
+    return {b2s(fs.Fills(i).Market()) for i in range(fs.FillsLength())}
+
+
+def _order_markets(msg: bytes) -> Optional[set]:
+    """Markets touched by an open orders frame, None for a full snapshot."""
+    root = ServerResponse.GetRootAs(msg, 0)
+    tbl = root.Response()
+    oos = OpenOrdersStream()
+    oos.Init(tbl.Bytes, tbl.Pos)
+    if oos.OrdersType() != WsOpenOrders.OrderDeltasData:
+        return None
+    deltas = OrderDeltasData()
+    orders = oos.Orders()
+    deltas.Init(orders.Bytes, orders.Pos)
+    return {b2s(deltas.ClobDeltas(i).Market()) for i in range(deltas.ClobDeltasLength())}
+
+
+@dataclass
+class _MarketState:
+    event: asyncio.Event = field(default_factory=asyncio.Event)
+    pending: int = 0
+    pending_since: Optional[int] = None
+
+
+class MarketScheduler:
+    """
+    Wakes a per-market strategy callback only when that market's book, our
+    fills or our open orders in it change, instead of polling on a timer.
+
+      - `debounce`: after a wakeup, wait this long so a burst of updates
+        results in a single callback run
+      - `max_staleness`: run the callback at least this often even if
+        nothing changed (None to only ever run on events)
+      - `serial`: never run two markets' callbacks at the same time, for
+        strategies written as a single loop over markets
+      - `log_errors`: print a failing callback's traceback and keep
+        scheduling; by default the exception ends run()/run_batch(), so a
+        strategy's invariant asserts still stop it
+
+    Metrics: wakeups, stale wakeups (timer instead of event), skipped
+    ticks (events folded into an already pending run), dispatch latency
+    (event -> callback start) and reaction latency (event -> callback done,
+    i.e. its orders have been sent).
+
+    Create it before client.start_client(), since it taps the message handler.
+    """
+    def __init__(self,
+                 client: OracleClient,
+                 local_book: LocalBook,
+                 *,
+                 debounce: float = 0.005,
+                 max_staleness: Optional[float] = 1.0,
+                 serial: bool = False,
+                 log_errors: bool = False):
+        self.debounce = debounce
+        self.log_errors = log_errors
+        self.max_staleness = max_staleness
+        self._serial = asyncio.Lock() if serial else None
+        self._markets: dict[str, _MarketState] = {}
+        self._any = asyncio.Event()
+        # Set while run() is active, so markets added later get a worker
+        self._callback: Optional[MarketCallback] = None
+        self._tasks: list[asyncio.Task] = []
+        # Set by add_market() so run() starts watching the new worker
+        self._tasks_changed = asyncio.Event()
+
+        self.events = 0
+        self.wakeups = 0
+        self.stale_wakeups = 0
+        self.skipped = 0
+        self.dispatch_latency = LatencyHistogram("dispatch")
+        self.reaction_latency = LatencyHistogram("reaction")
+
+        local_book.add_listener(self._on_book)
+        tap(client, self._on_frame)
+
+    def notify(self, market: str) -> None:
+        """Mark `market` as changed. Also usable for non-exchange events (e.g. config edits)."""
+        st = self._markets.get(market)
+        if st is None:
+            return
+        self.events += 1
+        st.pending += 1
+        if st.pending_since is None:
+            st.pending_since = time.perf_counter_ns()
+        st.event.set()
+        self._any.set()
+
+    def add_market(self, market: str) -> None:
+        """Start scheduling a market that appeared after run()/run_batch() started."""
+        if market in self._markets:
+            return
+        self._markets[market] = _MarketState()
+        if self._callback is not None:
+            self._tasks.append(asyncio.create_task(self._worker(market, self._callback)))
+            self._tasks_changed.set()
+        self.notify(market)
+
+    def notify_all(self) -> None:
+        for market in self._markets:
+            self.notify(market)
+
+    async def run(self, callback: MarketCallback, markets: Iterable[str]) -> None:
+        """Run `callback(market)` for each market as events arrive, until cancelled."""
+        for market in markets:
+            self._markets.setdefault(market, _MarketState())
+        self._callback = callback
+        self._tasks = [asyncio.create_task(self._worker(m, callback)) for m in list(self._markets)]
+        # Every market gets one initial run
+        self.notify_all()
+        changed = asyncio.create_task(self._tasks_changed.wait())
+        try:
+            # Workers only end by raising; add_market() may append more
+            while True:
+                self._tasks_changed.clear()
+                if changed.done():
+                    changed = asyncio.create_task(self._tasks_changed.wait())
+                done, _ = await asyncio.wait([*self._tasks, changed], return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t is not changed:
+                        t.result()
+        finally:
+            changed.cancel()
+            self._callback = None
+            for t in self._tasks:
+                t.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+
+    async def run_batch(self, callback: BatchCallback, markets: Iterable[str]) -> None:
+        """
+        Like run(), but with a single worker: each wakeup calls
+        `callback(changed_markets)` once with every market that changed since
+        the previous call (all markets on a max_staleness wakeup), so the
+        callback can plan and send actions for all of them together.
+        """
+        for market in markets:
+            self._markets.setdefault(market, _MarketState())
+        self.notify_all()
+        while True:
+            stale = False
+            try:
+                await asyncio.wait_for(self._any.wait(), self.max_staleness)
+                if self.debounce:
+                    await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                self.stale_wakeups += 1
+                stale = True
+
+            self._any.clear()
+            since = None
+            changed = set()
+            for market, st in self._markets.items():
+                if st.pending or stale:
+                    changed.add(market)
+                if st.pending > 1:
+                    self.skipped += st.pending - 1
+                if st.pending_since is not None and (since is None or st.pending_since < since):
+                    since = st.pending_since
+                st.event.clear()
+                st.pending = 0
+                st.pending_since = None
+
+            start = time.perf_counter_ns()
+            if since is not None:
+                self.dispatch_latency.record(start - since)
+            try:
+                await callback(changed)
+            except Exception:
+                if not self.log_errors:
+                    raise
+                print("⚠️ Strategy callback failed:")
+                traceback.print_exc()
+            if since is not None:
+                self.reaction_latency.record_since(since)
+            self.wakeups += 1
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "wakeups": self.wakeups,
+            "stale_wakeups": self.stale_wakeups,
+            "skipped": self.skipped,
+            "dispatch_us": self.dispatch_latency.snapshot(),
+            "reaction_us": self.reaction_latency.snapshot(),
+        }
+
+    async def _worker(self, market: str, callback: MarketCallback) -> None:
+        st = self._markets[market]
+        while True:
+            try:
+                await asyncio.wait_for(st.event.wait(), self.max_staleness)
+                if self.debounce:
+                    await asyncio.sleep(self.debounce)
+            except asyncio.TimeoutError:
+                self.stale_wakeups += 1
+
+            st.event.clear()
+            since, st.pending_since = st.pending_since, None
+            if st.pending > 1:
+                self.skipped += st.pending - 1
+            st.pending = 0
+
+            start = time.perf_counter_ns()
+            if since is not None:
+                self.dispatch_latency.record(start - since)
+            try:
+                if self._serial:
+                    async with self._serial:
+                        await callback(market)
+                else:
+                    await callback(market)
+            except Exception:
+                if not self.log_errors:
+                    raise
+                print(f"⚠️ Strategy callback for {market} failed:")
+                traceback.print_exc()
+            if since is not None:
+                self.reaction_latency.record_since(since)
+            self.wakeups += 1
+
+    def _on_book(self, snap: BookSnapshot) -> None:
+        self.notify(snap.market)
+
+    def _on_frame(self, kind: int, market: Optional[str], msg: bytes) -> None:
+        if kind == ServerResponseUnion.FillsStream:
+            changed = _fill_markets(msg)
+        elif kind == ServerResponseUnion.OpenOrdersStream:
+            changed = _order_markets(msg)
+        else:
+            return
+        if changed is None:
+            self.notify_all()
+        else:
+            for m in changed:
+                self.notify(m)
@@ -0,0 +1,231 @@
+"""
+Markets split across worker processes, each with its own connection and
+event loop, for domains with more markets than one core keeps up with.
+
+    ring = HashRing(4)
+    ring.shard_of("HRVD")                       # 0..3, the same in every process and run
+
+    coordinator = ShardCoordinator(worker, 4)   # async worker(link, *args) in each process
+    coordinator.start()                         # on the coordinator's loop
+    coordinator.rows, coordinator.status()      # merged dashboard rows, per-shard stats
+    await coordinator.call("HRVD", "set_config", ...)
+
+A market's shard comes from consistent hashing: every shard owns REPLICAS
+points on a 64-bit ring and a market goes to the next point after its own
+hash. Adding a market never moves the others, and going from N to N + 1
+shards moves about 1/(N + 1) of them.
+
+Workers get a ShardLink: owns(market) picks their share of the markets,
+publish(rows) and report(stats) send state up, serve(handlers) runs the
+commands the coordinator routes to a market's owner. Everything crosses
+the process boundary through multiprocessing queues, pickled.
+"""
+import asyncio
+import bisect
+import concurrent.futures
+import hashlib
+import itertools
+import multiprocessing
+import threading
+from typing import Awaitable, Callable, Iterable, Optional
+
+REPLICAS = 64
+STOP_TIMEOUT = 5.0      # seconds a worker gets to exit before it is terminated
+
+
+def _point(key: str) -> int:
+    # Not hash(): it is salted per process
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, shards: int, replicas: int = REPLICAS):
+        points = sorted((_point(f"shard-{s}#{r}"), s) for s in range(shards) for r in range(replicas))
+        self.shards = shards
+        self._points = [p for p, _ in points]
+        self._owners = [s for _, s in points]
+        self._cache: dict[str, int] = {}
+
+    def shard_of(self, key: str) -> int:
+        shard = self._cache.get(key)
+        if shard is None:
+            i = bisect.bisect(self._points, _point(key)) % len(self._points)
+            shard = self._cache[key] = self._owners[i]
+        return shard
+
+    def partition(self, keys: Iterable[str]) -> list[list[str]]:
+        parts = [[] for _ in range(self.shards)]
+        for k in keys:
+            parts[self.shard_of(k)].append(k)
+        return parts
+
+
+# ----------------------------------------------------
+# Worker side
+# ----------------------------------------------------
+class ShardLink:
+    """One worker's end of the coordinator's queues."""
+    def __init__(self, shard: int, shards: int, up, down):
+        self.shard = shard
+        self.shards = shards
+        self.ring = HashRing(shards)
+        self._up = up
+        self._down = down
+        self.published = 0
+
+    def owns(self, market: str) -> bool:
+        return self.ring.shard_of(market) == self.shard
+
+    def publish(self, rows: dict[str, Optional[dict]]) -> None:
+        """Dashboard rows of this shard's markets that changed; None hides a market."""
+        self.published += 1
+        self._up.put(("rows", self.shard, rows))
+
+    def report(self, stats: dict) -> None:
+        self._up.put(("stats", self.shard, stats))
+
+    async def serve(self, handlers: dict[str, Callable]) -> None:
+        """
+        Run the coordinator's commands on this loop, handlers[name](*args),
+        until it stops the shard. A daemon thread does the blocking reads.
+        """
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+
+        def run(msg):
+            if msg is None:
+                stopped.set()
+                return
+            cid, name, args = msg
+            try:
+                self._up.put(("reply", cid, True, handlers[name](*args)))
+            except Exception as e:
+                self._up.put(("reply", cid, False, f"{type(e).__name__}: {e}"))
+
+        def read():
+            while True:
+                msg = self._down.get()
+                loop.call_soon_threadsafe(run, msg)
+                if msg is None:
+                    return
+
+        threading.Thread(target=read, name=f"shard-{self.shard}-commands", daemon=True).start()
+        await stopped.wait()
+
+
+def _worker_main(target, shard: int, shards: int, up, down, args: tuple) -> None:
+    link = ShardLink(shard, shards, up, down)
+    try:
+        asyncio.run(target(link, *args))
+    except KeyboardInterrupt:
+        pass
+
+
+# ----------------------------------------------------
+# Coordinator side
+# ----------------------------------------------------
+class ShardCoordinator:
+    """
+    Starts `shards` worker processes running `target(link, *args)` (a
+    module-level coroutine function, since it is pickled by name) and
+    merges what they publish. Listeners run on the loop that called
+    start(), with the set of markets whose rows changed.
+    """
+    def __init__(self, target: Callable[..., Awaitable], shards: int, *, args: tuple = ()):
+        ctx = multiprocessing.get_context("spawn")
+        self.ring = HashRing(shards)
+        self._up = ctx.Queue()
+        self._down = [ctx.Queue() for _ in range(shards)]
+        self.processes = [
+            ctx.Process(target=_worker_main, args=(target, s, shards, self._up, self._down[s], args),
+                        name=f"shard-{s}", daemon=True)
+            for s in range(shards)
+        ]
+        self.rows: dict[str, dict] = {}
+        self.stats: dict[int, dict] = {}
+        self._replies: dict[int, concurrent.futures.Future] = {}
+        self._ids = itertools.count()
+        self._listeners: list[Callable[[set], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self.messages = 0
+
+    def add_listener(self, callback: Callable[[set], None]) -> None:
+        self._listeners.append(callback)
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        for p in self.processes:
+            p.start()
+        self._reader = threading.Thread(target=self._read, name="shard-coordinator", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        while True:
+            msg = self._up.get()
+            if msg is None:
+                return
+            if msg[0] == "reply":
+                _, cid, ok, value = msg
+                fut = self._replies.pop(cid, None)
+                if fut is not None:
+                    if ok:
+                        fut.set_result(value)
+                    else:
+                        fut.set_exception(RuntimeError(value))
+            else:
+                self._loop.call_soon_threadsafe(self._on_message, msg)
+
+    def _on_message(self, msg: tuple) -> None:
+        self.messages += 1
+        kind, shard, body = msg
+        if kind == "stats":
+            self.stats[shard] = body
+            return
+        for market, row in body.items():
+            if row is None:
+                self.rows.pop(market, None)
+            else:
+                self.rows[market] = row
+        changed = set(body)
+        for cb in self._listeners:
+            cb(changed)
+
+    async def call(self, market: str, name: str, *args):
+        """handlers[name](*args) on the shard that owns `market`; safe from any loop or thread."""
+        cid = next(self._ids)
+        fut = self._replies[cid] = concurrent.futures.Future()
+        self._down[self.ring.shard_of(market)].put((cid, name, args))
+        return await asyncio.wrap_future(fut)
+
+    def status(self) -> dict:
+        """
+        Per-shard markets, liveness and last reported stats, plus totals:
+        sums, except latencies (keys ending in _us), which take the worst shard.
+        """
+        totals: dict[str, float] = {}
+        for s in list(self.stats.values()):
+            for k, v in s.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    totals[k] = max(totals.get(k, v), v) if k.endswith("_us") else totals.get(k, 0) + v
+        owned = self.ring.partition(list(self.rows))
+        return {
+            "shards": [
+                {"shard": i, "alive": p.is_alive(), "markets": owned[i], "stats": self.stats.get(i)}
+                for i, p in enumerate(self.processes)
+            ],
+            "totals": totals,
+        }
+
+    async def stop(self) -> None:
+        for q in self._down:
+            q.put(None)
+        for p in self.processes:
+            await asyncio.to_thread(p.join, STOP_TIMEOUT)
+            if p.is_alive():
+                p.terminate()
+        self._up.put(None)
+        if self._reader:
+            await asyncio.to_thread(self._reader.join)
+        for fut in self._replies.values():
+            fut.cancel()
@@ -0,0 +1,313 @@
+"""
+In-process matching engine for backtests and simulated venues.
+
+Price-time priority limit order books with the venue's spot rules: a buy
+must be covered by quote cash and a sell by base inventory, net of what
+the account's other resting orders already hold (no shorting, no
+borrowing). Accounts listed as `unlimited` skip those checks; they are
+used for liquidity that stands in for the rest of the market.
+
+Every state change is appended to `events` for the caller to turn into
+stream frames:
+
+    ("order", account, market, oid, price, new_size, side, is_add, is_remove)
+    ("fill", account, market, oid, price, size, side, is_taker, time)
+    ("position", account, symbol, delta)
+    ("trade", market, price, size, taker_side, time)
+
+and markets whose levels changed are collected (in order) in `dirty_books`.
+"""
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Iterable, Optional
+
+from huqt_oracle_pysdk import Side, Tif
+
+from market_registry import MarketInfo
+
+
+class OrderRejected(Exception):
+    """Raised for an order or cancel the venue would answer with an error."""
+
+
+class SimOrder:
+    __slots__ = ("oid", "account", "market", "side", "price", "size")
+
+    def __init__(self, oid: int, account: str, market: str, side: int, price: int, size: int):
+        self.oid = oid
+        self.account = account
+        self.market = market
+        self.side = side
+        self.price = price
+        self.size = size
+
+
+class _Side:
+    """One side of a book: price -> FIFO of orders, plus the sorted prices."""
+    __slots__ = ("side", "levels", "prices")
+
+    def __init__(self, side: int):
+        self.side = side
+        self.levels: dict[int, deque] = {}
+        # Ascending; the best price is prices[-1] for bids and prices[0] for asks
+        self.prices: list[int] = []
+
+    def best(self) -> Optional[int]:
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.side == Side.Buy else self.prices[0]
+
+    def add(self, order: SimOrder) -> None:
+        q = self.levels.get(order.price)
+        if q is None:
+            q = self.levels[order.price] = deque()
+            insort(self.prices, order.price)
+        q.append(order)
+
+    def remove(self, order: SimOrder) -> None:
+        q = self.levels[order.price]
+        q.remove(order)
+        if not q:
+            self._drop_level(order.price)
+
+    def _drop_level(self, price: int) -> None:
+        del self.levels[price]
+        del self.prices[bisect_left(self.prices, price)]
+
+    def depth(self, n: Optional[int] = None) -> list[tuple[int, int, int]]:
+        """(price, size, order count) per level, best first."""
+        prices = reversed(self.prices) if self.side == Side.Buy else iter(self.prices)
+        out = []
+        for p in prices:
+            q = self.levels[p]
+            out.append((p, sum(o.size for o in q), len(q)))
+            if n is not None and len(out) >= n:
+                break
+        return out
+
+
+class SimBook:
+    __slots__ = ("market", "bids", "asks")
+
+    def __init__(self, market: str):
+        self.market = market
+        self.bids = _Side(Side.Buy)
+        self.asks = _Side(Side.Sell)
+
+    def side(self, side: int) -> _Side:
+        return self.bids if side == Side.Buy else self.asks
+
+
+class SimExchange:
+    """
+    Matching engine for a set of spot markets.
+
+    Positions are kept per account and symbol (all on the main account);
+    `reserved` holds what resting orders have locked up: quote for bids
+    (price * size), base for asks.
+    """
+    def __init__(self, markets: Iterable[MarketInfo], *, unlimited: Iterable[str] = ()):
+        self.markets = {m.name: m for m in markets}
+        self.books = {name: SimBook(name) for name in self.markets}
+        self.unlimited = set(unlimited)
+        self.positions: dict[str, dict[str, int]] = {}
+        self.reserved: dict[str, dict[str, int]] = {}
+        self.orders: dict[int, SimOrder] = {}
+        self.last_price: dict[str, int] = {}
+        self.events: list[tuple] = []
+        # Insertion-ordered, so frames go out in the same order on every run
+        self.dirty_books: dict[str, None] = {}
+        self._next_oid = 1
+
+        self.placed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.trades = 0
+        self.volume = 0
+
+    # ----------------------------------------------------
+    # Accounts
+    # ----------------------------------------------------
+    def deposit(self, account: str, symbol: str, amount: int) -> None:
+        acct = self.positions.setdefault(account, {})
+        acct[symbol] = acct.get(symbol, 0) + amount
+        if account not in self.unlimited:
+            self.events.append(("position", account, symbol, amount))
+
+    def position(self, account: str, symbol: str) -> int:
+        return self.positions.get(account, {}).get(symbol, 0)
+
+    def available(self, account: str, symbol: str) -> int:
+        """Position not locked up by resting orders."""
+        return self.position(account, symbol) - self.reserved.get(account, {}).get(symbol, 0)
+
+    def open_orders(self, account: str) -> list[SimOrder]:
+        return [o for o in self.orders.values() if o.account == account]
+
+    def equity(self, account: str, quote: str = "QTC") -> int:
+        """Quote cash plus every other holding marked at its market's last trade."""
+        total = 0
+        marks = {info.base: self.last_price.get(name) for name, info in self.markets.items()}
+        for symbol, pos in self.positions.get(account, {}).items():
+            if symbol == quote:
+                total += pos
+            elif marks.get(symbol) is not None:
+                total += pos * marks[symbol]
+        return total
+
+    def _reserve(self, account: str, symbol: str, amount: int) -> None:
+        if account in self.unlimited or not amount:
+            return
+        acct = self.reserved.setdefault(account, {})
+        acct[symbol] = acct.get(symbol, 0) + amount
+
+    def _move(self, account: str, symbol: str, delta: int) -> None:
+        acct = self.positions.setdefault(account, {})
+        acct[symbol] = acct.get(symbol, 0) + delta
+        if account not in self.unlimited:
+            self.events.append(("position", account, symbol, delta))
+
+    # ----------------------------------------------------
+    # Orders
+    # ----------------------------------------------------
+    def place(self, account: str, market: str, side: int, price: int, size: int,
+              tif: int = Tif.Gtc, time: int = 0) -> SimOrder:
+        """
+        Match an incoming limit order and rest what is left (GTC/ALO).
+        Returns the order; its size is what rested (0 if it fully traded or
+        was IOC). Raises OrderRejected when the venue would refuse it.
+        """
+        info = self.markets.get(market)
+        if info is None:
+            self.rejected += 1
+            raise OrderRejected(f"Unknown market {market}")
+        if size <= 0 or price <= 0:
+            self.rejected += 1
+            raise OrderRejected("Price and size must be positive")
+        book = self.books[market]
+        opposite = book.side(1 - side)
+        best = opposite.best()
+        crosses = best is not None and (price >= best if side == Side.Buy else price <= best)
+        if tif == Tif.Alo and crosses:
+            self.rejected += 1
+            raise OrderRejected("Post-only order would cross")
+
+        if account not in self.unlimited:
+            if side == Side.Buy:
+                if price * size > self.available(account, info.quote):
+                    self.rejected += 1
+                    raise OrderRejected(f"Insufficient {info.quote} balance")
+            elif size > self.available(account, info.base):
+                self.rejected += 1
+                raise OrderRejected(f"Insufficient {info.base} balance (no short selling)")
+
+        order = SimOrder(self._next_oid, account, market, side, price, size)
+        self._next_oid += 1
+        self.placed += 1
+        if crosses:
+            self._match(order, opposite, info, time)
+        if order.size and tif != Tif.Ioc:
+            book.side(side).add(order)
+            self.orders[order.oid] = order
+            if side == Side.Buy:
+                self._reserve(account, info.quote, price * order.size)
+            else:
+                self._reserve(account, info.base, order.size)
+            self._order_event(order, is_add=True)
+            self.dirty_books[market] = None
+        elif order.size:
+            order.size = 0
+        return order
+
+    def cancel(self, account: str, market: str, oid: int) -> SimOrder:
+        order = self.orders.get(oid)
+        if order is None or order.account != account or order.market != market:
+            self.rejected += 1
+            raise OrderRejected(f"Order {oid} not found")
+        self._unrest(order)
+        self.cancelled += 1
+        self._order_event(order, is_remove=True)
+        return order
+
+    def amend_size(self, oid: int, size: int) -> None:
+        """Change a resting order's size in place, keeping its queue position."""
+        order = self.orders[oid]
+        info = self.markets[order.market]
+        delta = size - order.size
+        if order.side == Side.Buy:
+            self._reserve(order.account, info.quote, order.price * delta)
+        else:
+            self._reserve(order.account, info.base, delta)
+        order.size = size
+        self._order_event(order)
+        self.dirty_books[order.market] = None
+
+    def print_trade(self, market: str, price: int, size: int, taker_side: int, time: int = 0) -> None:
+        """Record a trade against liquidity that is not in the simulated book."""
+        self.events.append(("trade", market, price, size, taker_side, time))
+        self.last_price[market] = price
+        self.trades += 1
+
+    def depth(self, market: str, levels: Optional[int] = None) -> tuple[list, list]:
+        book = self.books[market]
+        return book.bids.depth(levels), book.asks.depth(levels)
+
+    def _unrest(self, order: SimOrder) -> None:
+        info = self.markets[order.market]
+        self.books[order.market].side(order.side).remove(order)
+        del self.orders[order.oid]
+        if order.side == Side.Buy:
+            self._reserve(order.account, info.quote, -order.price * order.size)
+        else:
+            self._reserve(order.account, info.base, -order.size)
+        self.dirty_books[order.market] = None
+
+    def _match(self, taker: SimOrder, opposite: _Side, info: MarketInfo, time: int) -> None:
+        market = taker.market
+        buy = taker.side == Side.Buy
+        while taker.size and opposite.prices:
+            px = opposite.prices[0] if buy else opposite.prices[-1]
+            if (buy and px > taker.price) or (not buy and px < taker.price):
+                break
+            q = opposite.levels[px]
+            while taker.size and q:
+                maker = q[0]
+                qty = min(taker.size, maker.size)
+                taker.size -= qty
+                maker.size -= qty
+                # The maker's lock is released as it trades
+                if maker.side == Side.Buy:
+                    self._reserve(maker.account, info.quote, -px * qty)
+                else:
+                    self._reserve(maker.account, info.base, -qty)
+                self._settle(taker, px, qty, is_taker=True, time=time)
+                self._settle(maker, px, qty, is_taker=False, time=time)
+                self.events.append(("trade", market, px, qty, taker.side, time))
+                self.trades += 1
+                self.volume += qty
+                if maker.size == 0:
+                    q.popleft()
+                    del self.orders[maker.oid]
+                    self._order_event(maker, is_remove=True)
+                else:
+                    self._order_event(maker)
+            if not q:
+                opposite._drop_level(px)
+            self.last_price[market] = px
+            self.dirty_books[market] = None
+
+    def _settle(self, order: SimOrder, px: int, qty: int, *, is_taker: bool, time: int) -> None:
+        if order.account in self.unlimited:
+            return
+        info = self.markets[order.market]
+        sign = 1 if order.side == Side.Buy else -1
+        self._move(order.account, info.base, sign * qty)
+        self._move(order.account, info.quote, -sign * px * qty)
+        self.events.append(("fill", order.account, order.market, order.oid, px, qty,
+                            order.side, is_taker, time))
+
+    def _order_event(self, order: SimOrder, *, is_add: bool = False, is_remove: bool = False) -> None:
+        if order.account in self.unlimited:
+            return
+        self.events.append(("order", order.account, order.market, order.oid, order.price,
+                            order.size, order.side, is_add, is_remove))
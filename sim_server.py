@@ -0,0 +1,326 @@
+"""
+Local stand-in for the exchange gateway, for load tests and offline
+benchmarks.
+
+    python sim_server.py [--port 8765] [--flow 50] [--latency-ms 0] [--jitter-ms 0]
+                         [--order-rate 50]
+
+Speaks the gateway's websocket protocol (sim_wire.py) in front of the same
+matching engine the replays use (SimVenue/SimExchange), so WSClient,
+OracleClient and the bots run against it unmodified: set
+ORACLE_WS_URL=ws://localhost:8765/ws (see endpoint.py).
+
+- Every account that sets a session is funded with DEFAULT_BALANCES.
+- Orders and cancels are limited per account like the venue: at most 50
+  in any one second (WindowLimit); over the limit they get an ErrorMessage.
+- `latency` (+ up to `jitter`) seconds are added to every frame in each
+  direction, without reordering a connection's frames.
+- FlowConfig drives synthetic participants: Poisson-timed passive orders
+  around a drifting fair price and IOC orders that take them out.
+
+Tick-to-order latency is measured here: from the first book update for a
+market pushed to a connection since it last sent an order or cancel there,
+to the next one it sends. Updates that don't move the bot's quotes count
+too, so this is an upper bound on reaction time; an order more than
+REACTION_WINDOW after the update is a periodic requote rather than a
+reaction and is only counted in `unanswered`.
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import websockets
+
+from huqt_oracle_pysdk import Side, Tif
+from huqt_oracle_pysdk.fbs_gen.gateway.Subscription import Subscription
+
+import sim_wire as wire
+from market_registry import MarketInfo
+from metrics import LatencyHistogram
+from rate_limiter import WindowLimit
+from sim_venue import SimVenue
+
+MARKETS = ["HRVD", "YALE", "TIME", "RAIN", "PTS", "TDS", "SUM", "DIFF"]
+DEFAULT_BALANCES = {"QTC": 100_000, **{m: 100 for m in MARKETS}}
+FLOW = "flow"
+REACTION_WINDOW = 1.0       # seconds
+
+
+@dataclass(frozen=True)
+class FlowConfig:
+    """Synthetic order flow from the rest of the market."""
+    rate: float = 50.0          # orders per second, across all markets
+    take_ratio: float = 0.3     # share of orders that are IOC and cross
+    max_size: int = 5
+    max_offset: int = 5         # passive orders rest 1..max_offset ticks from fair
+    max_resting: int = 40       # per market; the oldest is cancelled beyond this
+    drift: float = 0.05         # chance per order that fair moves a tick
+    fair: int = 50
+    tick: float = 0.005         # seconds between batches
+    seed: int = 1
+
+
+class ServerConnection:
+    """One websocket client; frames go out in order after the injected latency."""
+    def __init__(self, server: "ExchangeServer", ws):
+        self.server = server
+        self.ws = ws
+        self.account: Optional[str] = None
+        self.subscriptions: set = set()
+        self.closed = False
+        self.book_sent: dict[str, int] = {}      # market -> perf_counter_ns of the unanswered update
+        self._outbox: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._last_due = 0.0
+
+    def due(self) -> float:
+        """When a frame handed over now should arrive, never before the previous one."""
+        s = self.server
+        delay = s.latency + (s.rng.random() * s.jitter if s.jitter else 0.0)
+        self._last_due = max(self._last_due, asyncio.get_running_loop().time() + delay)
+        return self._last_due
+
+    def push(self, frame: bytes) -> None:
+        if self.closed:
+            return
+        self._outbox.append((self.due() if self.server.latency or self.server.jitter else 0.0, frame))
+        self._wakeup.set()
+
+    async def write(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._outbox:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            due, frame = self._outbox[0]
+            wait = due - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._outbox.popleft()
+            await self.ws.send(frame)
+
+
+class ExchangeServer(SimVenue):
+    """A SimVenue served over websockets, with synthetic flow running on it."""
+    def __init__(self, markets: Optional[Iterable[MarketInfo]] = None, *,
+                 flow: Optional[FlowConfig] = FlowConfig(),
+                 latency: float = 0.0, jitter: float = 0.0,
+                 order_rate: int = 50,
+                 balances: dict[str, int] = DEFAULT_BALANCES,
+                 domain: str = "HarvardYale"):
+        markets = list(markets or [MarketInfo(m, m, "QTC", 0, 0, 0, 1) for m in MARKETS])
+        super().__init__(markets, domain=domain, unlimited=[FLOW])
+        self.flow = flow
+        self.latency = latency
+        self.jitter = jitter
+        self.order_rate = order_rate
+        self.balances = balances
+        self.rng = np.random.default_rng(flow.seed if flow else 0)
+        self._limits: dict[str, WindowLimit] = {}
+        self._server = None
+        self._address = ("localhost", 8765)
+        self._flow_task: Optional[asyncio.Task] = None
+        self._fair = {m.name: flow.fair if flow else 50 for m in markets}
+        self._flow_resting: dict[str, deque] = {m.name: deque() for m in markets}
+
+        self.throttled = 0
+        self.flow_orders = 0
+        self.flow_seconds = 0.0
+        self.tick_to_order = LatencyHistogram("tick-to-order")
+        self.unanswered = 0
+
+    # ----------------------------------------------------
+    # Server
+    # ----------------------------------------------------
+    async def start(self, host: str = "localhost", port: int = 8765, *, run_flow: bool = True) -> None:
+        self._address = (host, port)
+        self._server = await websockets.serve(self._serve, host, port, max_size=None)
+        if run_flow:
+            self.start_flow()
+        print(f"🏦 Sim exchange on ws://{host}:{port}/ws ({len(self.exchange.markets)} markets, "
+              f"flow {self.flow.rate if self.flow else 0:g}/s, latency {self.latency * 1000:g}ms)")
+
+    async def stop(self) -> None:
+        await self.stop_flow()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def outage(self, seconds: float) -> None:
+        """
+        Cut every connection without a close handshake and refuse new ones
+        for `seconds`, like a dropped link or a gateway restart. The
+        exchange and the flow keep running, so clients miss what trades.
+        """
+        self._server.close()
+        for conn in list(self.connections):
+            conn.ws.transport.abort()
+        await self._server.wait_closed()
+        await asyncio.sleep(seconds)
+        self._server = await websockets.serve(self._serve, *self._address, max_size=None)
+
+    async def _serve(self, ws) -> None:
+        conn = ServerConnection(self, ws)
+        self.connections.append(conn)
+        writer = asyncio.create_task(conn.write())
+        loop = asyncio.get_running_loop()
+        try:
+            async for data in ws:
+                msg = wire.decode_request(data)
+                self._tick_to_order(conn, msg)
+                if self.latency or self.jitter:
+                    loop.call_at(conn.due(), self.dispatch, conn, msg)
+                else:
+                    self.dispatch(conn, msg)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            conn.closed = True
+            self.connections.remove(conn)
+            writer.cancel()
+
+    # ----------------------------------------------------
+    # Venue hooks
+    # ----------------------------------------------------
+    def open_session(self, conn: ServerConnection, msg: wire.ClientMessage) -> None:
+        if msg.account not in self.starting:
+            self.fund(msg.account, self.balances)
+
+    def submit(self, conn: ServerConnection, msg: wire.ClientMessage) -> None:
+        limit = self._limits.get(msg.account)
+        if limit is None:
+            limit = self._limits[msg.account] = WindowLimit(self.order_rate)
+        if not limit.try_acquire():
+            self.throttled += 1
+            conn.push(wire.error_message(msg.uuid, "Rate limit exceeded"))
+            return
+        self.execute(conn, msg)
+
+    def flush(self) -> None:
+        dirty = list(self.exchange.dirty_books)
+        super().flush()
+        if not dirty:
+            return
+        now = time.perf_counter_ns()
+        for conn in self.connections:
+            for market in dirty:
+                if (Subscription.L2BookSubscription, market) in conn.subscriptions:
+                    conn.book_sent.setdefault(market, now)
+
+    def _tick_to_order(self, conn: ServerConnection, msg: wire.ClientMessage) -> None:
+        if conn.book_sent and msg.kind in ("add_order", "cancel_order"):
+            sent = conn.book_sent.pop(msg.market, None)
+            if sent is None:
+                return
+            if time.perf_counter_ns() - sent > REACTION_WINDOW * 1e9:
+                self.unanswered += 1
+            else:
+                self.tick_to_order.record_since(sent)
+
+    # ----------------------------------------------------
+    # Synthetic flow
+    # ----------------------------------------------------
+    def start_flow(self) -> None:
+        if self.flow and self.flow.rate > 0 and self._flow_task is None:
+            self._flow_task = asyncio.create_task(self._run_flow())
+
+    async def stop_flow(self) -> None:
+        if self._flow_task:
+            self._flow_task.cancel()
+            await asyncio.gather(self._flow_task, return_exceptions=True)
+            self._flow_task = None
+
+    async def _run_flow(self) -> None:
+        """Orders arrive as a Poisson process, drawn in batches every `tick` seconds."""
+        f = self.flow
+        names = list(self._fair)
+        loop = asyncio.get_running_loop()
+        last = loop.time()
+        while True:
+            await asyncio.sleep(f.tick)
+            now = loop.time()
+            n = int(self.rng.poisson(f.rate * (now - last)))
+            self.flow_seconds += now - last
+            last = now
+            if not n:
+                continue
+            markets = self.rng.integers(0, len(names), n)
+            takes = self.rng.random(n) < f.take_ratio
+            sides = self.rng.integers(0, 2, n)
+            sizes = self.rng.integers(1, f.max_size + 1, n)
+            offsets = self.rng.integers(1, f.max_offset + 1, n)
+            moves = np.where(self.rng.random(n) < f.drift, self.rng.choice([-1, 1], n), 0)
+            for m, take, side, size, off, move in zip(markets.tolist(), takes.tolist(), sides.tolist(),
+                                                      sizes.tolist(), offsets.tolist(), moves.tolist()):
+                self._flow_order(names[m], take, side, size, off, move)
+            self.flow_orders += n
+            self.flush()
+
+    def _flow_order(self, market: str, take: bool, side: int, size: int, offset: int, move: int) -> None:
+        ex = self.exchange
+        f = self.flow
+        fair = self._fair[market] = max(self._fair[market] + move, f.max_offset + 1)
+        sign = 1 if side == Side.Buy else -1
+        if take:
+            ex.place(FLOW, market, side, fair + sign * f.max_offset, size, Tif.Ioc, self.now())
+            return
+        order = ex.place(FLOW, market, side, fair - sign * offset, size, Tif.Gtc, self.now())
+        resting = self._flow_resting[market]
+        if order.size:
+            resting.append(order.oid)
+        while len(resting) > f.max_resting:
+            oid = resting.popleft()
+            if oid in ex.orders:
+                ex.cancel(FLOW, market, oid)
+
+    def stats(self) -> dict:
+        ex = self.exchange
+        return {
+            "connections": len(self.connections),
+            "requests": self.requests,
+            "frames": self.frames,
+            "throttled": self.throttled,
+            "rejected": ex.rejected,
+            "flow_orders": self.flow_orders,
+            "flow_rate": round(self.flow_orders / max(self.flow_seconds, 1e-9), 1),
+            "trades": ex.trades,
+            "tick_to_order_us": self.tick_to_order.snapshot(),
+            "unanswered": self.unanswered,
+        }
+
+
+async def serve(server: ExchangeServer, host: str = "localhost", port: int = 8765,
+                report_every: float = 10.0) -> None:
+    await server.start(host, port)
+    try:
+        while True:
+            await asyncio.sleep(report_every)
+            print(f"[sim] {server.stats()}")
+    finally:
+        await server.stop()
+
+
+def main(args: list[str]) -> None:
+    opts = {"--port": 8765, "--flow": 50.0, "--latency-ms": 0.0, "--jitter-ms": 0.0,
+            "--order-rate": 50}
+    it = iter(args)
+    for a in it:
+        if a not in opts:
+            sys.exit(f"usage: python sim_server.py {' '.join(f'[{k} N]' for k in opts)}")
+        opts[a] = type(opts[a])(next(it))
+    server = ExchangeServer(flow=FlowConfig(rate=opts["--flow"]),
+                            latency=opts["--latency-ms"] / 1000, jitter=opts["--jitter-ms"] / 1000,
+                            order_rate=opts["--order-rate"])
+    try:
+        asyncio.run(serve(server, port=opts["--port"]))
+    except KeyboardInterrupt:
+        print(f"\033[1;31mSim exchange stopped.\033[0m {server.stats()}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
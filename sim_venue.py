@@ -0,0 +1,213 @@
+"""
+Gateway-side half of a simulated venue, shared by replay.py (in-process,
+virtual time) and sim_server.py (real websockets).
+
+SimVenue keeps sessions and subscriptions, answers requests (decoded by
+sim_wire) with a SimExchange behind them, and turns the exchange's events
+into the stream frames each connection follows. A connection is anything
+with `account`, `subscriptions` (a set of (Subscription, market or None)),
+`closed` and `push(frame)`.
+"""
+import hashlib
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from huqt_oracle_pysdk.fbs_gen.gateway.Subscription import Subscription
+
+import sim_wire as wire
+from market_registry import MarketInfo
+from sim_exchange import SimExchange, OrderRejected
+
+BOOK_LEVELS = 20
+# Trades a trade subscription's snapshot starts with, like the gateway's recent trades
+RECENT_TRADES = 50
+
+
+class SimVenue:
+    """
+    `accounts` maps account -> {symbol: starting balance}; accounts in
+    `unlimited` trade without balance checks and get no streams.
+    """
+    def __init__(self, markets: Iterable[MarketInfo], *,
+                 accounts: Optional[dict[str, dict[str, int]]] = None,
+                 domain: str = "HarvardYale",
+                 unlimited: Iterable[str] = ()):
+        self.domain = domain
+        self.exchange = SimExchange(markets, unlimited=unlimited)
+        self.connections: list = []
+        self.recent: dict[str, deque] = {m: deque(maxlen=RECENT_TRADES) for m in self.exchange.markets}
+        self.starting: dict[str, dict[str, int]] = {}
+        for account, balances in (accounts or {}).items():
+            self.fund(account, balances)
+        self.exchange.events.clear()
+
+        self.fills: list[tuple] = []
+        self.requests = 0
+        self.frames = 0
+
+    def fund(self, account: str, balances: dict[str, int]) -> None:
+        self.starting[account] = dict(balances)
+        for symbol, amount in balances.items():
+            self.exchange.deposit(account, symbol, amount)
+
+    def now(self) -> int:
+        """Exchange timestamp for orders and fills (epoch ms)."""
+        return int(time.time() * 1000)
+
+    # ----------------------------------------------------
+    # Requests
+    # ----------------------------------------------------
+    def handle(self, conn, data: bytes) -> None:
+        self.dispatch(conn, wire.decode_request(data))
+
+    def dispatch(self, conn, msg: wire.ClientMessage) -> None:
+        self.requests += 1
+        if msg.kind == "subscribe":
+            self._subscribe(conn, msg)
+        elif msg.kind == "set_session":
+            conn.account = msg.account
+            self.open_session(conn, msg)
+            conn.push(wire.simple_success(msg.uuid))
+        elif msg.kind in ("add_order", "cancel_order"):
+            self.submit(conn, msg)
+        else:
+            conn.push(wire.error_message(msg.uuid, "Unsupported request"))
+
+    def open_session(self, conn, msg: wire.ClientMessage) -> None:
+        """Called when a connection sets its session, before the reply."""
+
+    def submit(self, conn, msg: wire.ClientMessage) -> None:
+        """An order or cancel arrived; subclasses may delay or limit it."""
+        self.execute(conn, msg)
+
+    def execute(self, conn, msg: wire.ClientMessage) -> None:
+        if conn.closed:
+            return
+        try:
+            if msg.kind == "add_order":
+                order = self.exchange.place(msg.account, msg.market, msg.side, msg.price, msg.size,
+                                            msg.tif, self.now())
+                conn.push(wire.add_order_response(msg.uuid, msg.market, order.oid, msg.side))
+            else:
+                self.exchange.cancel(msg.account, msg.market, msg.oid)
+                conn.push(wire.simple_success(msg.uuid))
+        except OrderRejected as e:
+            conn.push(wire.error_message(msg.uuid, str(e)))
+        self.flush()
+
+    def _subscribe(self, conn, msg: wire.ClientMessage) -> None:
+        key = (msg.subscription, msg.market)
+        conn.push(wire.subscription_response(msg.uuid, msg.subscribe))
+        if not msg.subscribe:
+            conn.subscriptions.discard(key)
+            return
+        conn.subscriptions.add(key)
+
+        ex = self.exchange
+        match msg.subscription:
+            case Subscription.DomainsSubscription:
+                conn.push(wire.domains_stream([self.domain]))
+            case Subscription.LedgerMetaSubscription:
+                symbols = sorted({s for m in ex.markets.values() for s in (m.base, m.quote)})
+                conn.push(wire.ledger_meta_stream(symbols))
+            case Subscription.DomainMetaSubscription:
+                conn.push(wire.domain_meta_stream(self.domain, ex.markets.values()))
+            case Subscription.OpenOrdersSubscription:
+                orders = [(o.market, o.oid, o.price, o.size, o.side) for o in ex.open_orders(conn.account)]
+                conn.push(wire.open_orders_snapshot(self.domain, conn.account, orders))
+            case Subscription.PositionsSubscription:
+                positions = [(s, 0, p) for s, p in ex.positions.get(conn.account, {}).items()]
+                conn.push(wire.positions_snapshot(self.domain, conn.account, positions))
+            case Subscription.FillsSubscription:
+                conn.push(wire.fills_stream(self.domain, conn.account, [], snapshot=True))
+            case Subscription.L2BookSubscription:
+                conn.push(self._book_frame(msg.market))
+            case Subscription.TradeSubscription:
+                recent = list(self.recent.get(msg.market, ()))
+                conn.push(wire.trades_stream(self.domain, msg.market, recent,
+                                             ts=recent[-1][3] if recent else 0, snapshot=True))
+
+    # ----------------------------------------------------
+    # Frames
+    # ----------------------------------------------------
+    def _book_frame(self, market: str) -> bytes:
+        bids, asks = self.exchange.depth(market, BOOK_LEVELS)
+        return wire.l2_book_stream(self.domain, market, bids, asks)
+
+    def flush(self) -> None:
+        """Send every pending exchange event to the connections that follow it."""
+        ex = self.exchange
+        events, ex.events = ex.events, []
+        dirty, ex.dirty_books = ex.dirty_books, {}
+        if not self.connections:
+            for e in events:
+                if e[0] == "trade":
+                    self.recent[e[1]].append(e[2:])
+                elif e[0] == "fill":
+                    self.fills.append(e[1:])
+            return
+
+        orders: dict[str, list] = {}
+        positions: dict[str, list] = {}
+        fills: dict[str, list] = {}
+        trades: dict[str, list] = {}
+        for e in events:
+            kind = e[0]
+            if kind == "trade":
+                trades.setdefault(e[1], []).append(e[2:])
+                self.recent[e[1]].append(e[2:])
+            elif kind == "order":
+                orders.setdefault(e[1], []).append(e[2:])
+            elif kind == "position":
+                positions.setdefault(e[1], []).append((e[2], 0, e[3]))
+            else:
+                fills.setdefault(e[1], []).append(e[2:])
+                self.fills.append(e[1:])
+
+        for conn in self.connections:
+            acct, subs = conn.account, conn.subscriptions
+            if acct in orders and (Subscription.OpenOrdersSubscription, None) in subs:
+                self._send(conn, wire.order_deltas(self.domain, acct, orders[acct]))
+            if acct in positions and (Subscription.PositionsSubscription, None) in subs:
+                self._send(conn, wire.position_deltas(self.domain, acct, positions[acct]))
+            if acct in fills and (Subscription.FillsSubscription, None) in subs:
+                self._send(conn, wire.fills_stream(self.domain, acct, fills[acct]))
+
+        for market, ts in trades.items():
+            frame = None
+            for conn in self.connections:
+                if (Subscription.TradeSubscription, market) in conn.subscriptions:
+                    frame = frame or wire.trades_stream(self.domain, market, ts, ts=ts[-1][3])
+                    self._send(conn, frame)
+        for market in dirty:
+            frame = None
+            for conn in self.connections:
+                if (Subscription.L2BookSubscription, market) in conn.subscriptions:
+                    frame = frame or self._book_frame(market)
+                    self._send(conn, frame)
+
+    def _send(self, conn, frame: bytes) -> None:
+        self.frames += 1
+        conn.push(frame)
+
+    # ----------------------------------------------------
+    # Results
+    # ----------------------------------------------------
+    def fills_digest(self) -> str:
+        """Hash of every fill in order; equal digests mean identical runs."""
+        return hashlib.sha1(repr(self.fills).encode()).hexdigest()[:16]
+
+    def pnl(self, account: str, quote: str = "QTC") -> int:
+        """
+        Equity now minus the starting balances valued at the same marks,
+        i.e. what trading added over holding the starting inventory.
+        """
+        ex = self.exchange
+        start = 0
+        for symbol, amount in self.starting.get(account, {}).items():
+            if symbol == quote:
+                start += amount
+            elif ex.last_price.get(symbol) is not None:
+                start += amount * ex.last_price[symbol]
+        return ex.equity(account, quote) - start
@@ -0,0 +1,485 @@
+"""
+Server side of the gateway's FlatBuffers protocol, for simulated venues.
+
+Encoders build the ServerResponse frames OracleClient.message_handler
+understands; decode_request() parses what OracleClient sends. Only the
+parts of the protocol the SDK actually uses are covered.
+"""
+import struct
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import flatbuffers
+
+from huqt_oracle_pysdk.fbs_gen.client import (
+    AddOrderRequest,
+    CancelOrderRequest,
+    ClientRequest,
+    SetSessionRequest,
+    SubscriptionRequest,
+    UnaryRequest,
+)
+from huqt_oracle_pysdk.fbs_gen.client.ClientRequestUnion import ClientRequestUnion
+from huqt_oracle_pysdk.fbs_gen.client.UnaryRequestUnion import UnaryRequestUnion
+from huqt_oracle_pysdk.fbs_gen.gateway import (
+    AccountPosition,
+    DomainMetaStream,
+    DomainsStream,
+    ErrorMessage,
+    L2BookSubscription,
+    LedgerMetaStream,
+    MarketMeta,
+    OpenOrdersSnapshot,
+    OpenOrdersStream,
+    Order,
+    PositionsSnapshot,
+    PositionsStream,
+    ServerResponse,
+    SubscriptionResponse,
+    SymbolMeta,
+)
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+from huqt_oracle_pysdk.fbs_gen.gateway.Subscription import Subscription
+from huqt_oracle_pysdk.fbs_gen.gateway.WsOpenOrders import WsOpenOrders
+from huqt_oracle_pysdk.fbs_gen.gateway.WsPositions import WsPositions
+
+from market_registry import MarketInfo
+
+
+def b2s(b):
+    return b.decode("utf-8") if b is not None else None
+
+
+# ----------------------------------------------------
+# Client requests
+# ----------------------------------------------------
+@dataclass
+class ClientMessage:
+    """
+    One decoded client request. `kind` is "subscribe", "set_session",
+    "add_order", "cancel_order" or "unsupported"; only the fields that
+    kind carries are set.
+    """
+    kind: str
+    uuid: str
+    account: Optional[str] = None
+    domain: Optional[str] = None
+    # subscriptions
+    subscribe: bool = True
+    subscription: int = Subscription.NONE
+    market: Optional[str] = None
+    # orders
+    side: int = 0
+    price: int = 0
+    size: int = 0
+    tif: int = 0
+    order_type: int = 0
+    oid: int = 0
+
+
+def decode_request(msg: bytes) -> ClientMessage:
+    root = ClientRequest.ClientRequest.GetRootAs(msg, 0)
+    body = root.Request()
+    kind = root.RequestType()
+
+    if kind == ClientRequestUnion.SubscriptionRequest:
+        req = SubscriptionRequest.SubscriptionRequest()
+        req.Init(body.Bytes, body.Pos)
+        out = ClientMessage("subscribe", b2s(req.Uuid()), subscribe=req.Subscribe(),
+                            subscription=req.SubscriptionType())
+        sub = req.Subscription()
+        if sub is not None and out.subscription in (Subscription.L2BookSubscription, Subscription.TradeSubscription):
+            # Both keep domain and market in the first two slots
+            t = L2BookSubscription.L2BookSubscription()
+            t.Init(sub.Bytes, sub.Pos)
+            out.domain, out.market = b2s(t.Domain()), b2s(t.Market())
+        return out
+
+    if kind == ClientRequestUnion.SetSessionRequest:
+        req = SetSessionRequest.SetSessionRequest()
+        req.Init(body.Bytes, body.Pos)
+        return ClientMessage("set_session", b2s(req.Uuid()), account=b2s(req.Account()), domain=b2s(req.Domain()))
+
+    if kind == ClientRequestUnion.UnaryRequest:
+        unary = UnaryRequest.UnaryRequest()
+        unary.Init(body.Bytes, body.Pos)
+        uuid, account = b2s(unary.Uuid()), b2s(unary.Account())
+        inner = unary.Request()
+        if unary.RequestType() == UnaryRequestUnion.AddOrderRequest:
+            req = AddOrderRequest.AddOrderRequest()
+            req.Init(inner.Bytes, inner.Pos)
+            return ClientMessage("add_order", uuid, account=account, domain=b2s(req.Domain()),
+                                 market=b2s(req.Market()), side=req.Side(), price=req.Px(),
+                                 size=req.Sz(), tif=req.Tif(), order_type=req.OrderType())
+        if unary.RequestType() == UnaryRequestUnion.CancelOrderRequest:
+            req = CancelOrderRequest.CancelOrderRequest()
+            req.Init(inner.Bytes, inner.Pos)
+            return ClientMessage("cancel_order", uuid, account=account, domain=b2s(req.Domain()),
+                                 market=b2s(req.Market()), oid=req.Oid())
+        return ClientMessage("unsupported", uuid, account=account)
+
+    return ClientMessage("unsupported", "")
+
+
+# ----------------------------------------------------
+# Server frames
+# ----------------------------------------------------
+def _finish(b: flatbuffers.Builder, kind: int, body: int) -> bytes:
+    ServerResponse.Start(b)
+    ServerResponse.AddResponseType(b, kind)
+    ServerResponse.AddResponse(b, body)
+    b.Finish(ServerResponse.End(b))
+    return bytes(b.Output())
+
+
+def _vector(b: flatbuffers.Builder, start, offsets: list) -> int:
+    start(b, len(offsets))
+    for off in reversed(offsets):
+        b.PrependUOffsetTRelative(off)
+    return b.EndVector()
+
+
+def subscription_response(uuid: str, subscribe: bool = True) -> bytes:
+    b = flatbuffers.Builder(64)
+    u = b.CreateString(uuid)
+    SubscriptionResponse.Start(b)
+    SubscriptionResponse.AddUuid(b, u)
+    SubscriptionResponse.AddSubscribe(b, subscribe)
+    return _finish(b, ServerResponseUnion.SubscriptionResponse, SubscriptionResponse.End(b))
+
+
+
+
+
+
+def error_message(uuid: str, message: str) -> bytes:
+    b = flatbuffers.Builder(96)
+    u = b.CreateString(uuid)
+    m = b.CreateString(message)
+    ErrorMessage.Start(b)
+    ErrorMessage.AddUuid(b, u)
+    ErrorMessage.AddMessage(b, m)
+    return _finish(b, ServerResponseUnion.ErrorMessage, ErrorMessage.End(b))
+
+
+def domains_stream(domains: Iterable[str]) -> bytes:
+    b = flatbuffers.Builder(64)
+    names = [b.CreateString(d) for d in domains]
+    vec = _vector(b, DomainsStream.StartDomainsVector, names)
+    DomainsStream.Start(b)
+    DomainsStream.AddDomains(b, vec)
+    return _finish(b, ServerResponseUnion.DomainsStream, DomainsStream.End(b))
+
+
+def ledger_meta_stream(symbols: Iterable[str]) -> bytes:
+    b = flatbuffers.Builder(128)
+    metas = []
+    for s in symbols:
+        name = b.CreateString(s)
+        SymbolMeta.Start(b)
+        SymbolMeta.AddName(b, name)
+        SymbolMeta.AddMovable(b, True)
+        metas.append(SymbolMeta.End(b))
+    vec = _vector(b, LedgerMetaStream.StartSymbolsVector, metas)
+    LedgerMetaStream.Start(b)
+    LedgerMetaStream.AddSymbols(b, vec)
+    return _finish(b, ServerResponseUnion.LedgerMetaStream, LedgerMetaStream.End(b))
+
+
+def domain_meta_stream(domain: str, markets: Iterable[MarketInfo]) -> bytes:
+    b = flatbuffers.Builder(256)
+    metas = []
+    for info in markets:
+        name, base, quote = b.CreateString(info.name), b.CreateString(info.base), b.CreateString(info.quote)
+        MarketMeta.Start(b)
+        MarketMeta.AddName(b, name)
+        MarketMeta.AddBase(b, base)
+        MarketMeta.AddQuote(b, quote)
+        MarketMeta.AddFlatFee(b, info.flat_fee)
+        MarketMeta.AddTakerFee(b, info.taker_fee)
+        MarketMeta.AddMakerFee(b, info.maker_fee)
+        MarketMeta.AddFeeDenom(b, info.fee_denom)
+        metas.append(MarketMeta.End(b))
+    vec = _vector(b, DomainMetaStream.StartMarketsVector, metas)
+    d = b.CreateString(domain)
+    DomainMetaStream.Start(b)
+    DomainMetaStream.AddDomain(b, d)
+    DomainMetaStream.AddMarkets(b, vec)
+    return _finish(b, ServerResponseUnion.DomainMetaStream, DomainMetaStream.End(b))
+
+
+
+
+
+
+
+
+
+
+def _open_orders(b: flatbuffers.Builder, domain: str, account: str, kind: int, body: int, ts: int) -> bytes:
+    d, acct = b.CreateString(domain), b.CreateString(account)
+    OpenOrdersStream.Start(b)
+    OpenOrdersStream.AddDomain(b, d)
+    OpenOrdersStream.AddAccount(b, acct)
+    OpenOrdersStream.AddTs(b, ts)
+    OpenOrdersStream.AddEndTs(b, ts)
+    OpenOrdersStream.AddOrdersType(b, kind)
+    OpenOrdersStream.AddOrders(b, body)
+    return _finish(b, ServerResponseUnion.OpenOrdersStream, OpenOrdersStream.End(b))
+
+
+def open_orders_snapshot(domain: str, account: str, orders, *, ts: int = 0) -> bytes:
+    """`orders` are (market, oid, price, size, side) tuples."""
+    b = flatbuffers.Builder(64 + 48 * len(orders))
+    markets = {}
+    offs = []
+    for market, oid, px, sz, side in orders:
+        m = markets.get(market)
+        if m is None:
+            m = markets[market] = b.CreateString(market)
+        Order.Start(b)
+        Order.AddMarket(b, m)
+        Order.AddOid(b, oid)
+        Order.AddPx(b, px)
+        Order.AddSide(b, side)
+        Order.AddSz(b, sz)
+        offs.append(Order.End(b))
+    vec = _vector(b, OpenOrdersSnapshot.StartClobOrdersVector, offs)
+    OpenOrdersSnapshot.Start(b)
+    OpenOrdersSnapshot.AddClobOrders(b, vec)
+    return _open_orders(b, domain, account, WsOpenOrders.OpenOrdersSnapshot, OpenOrdersSnapshot.End(b), ts)
+
+
+
+
+def _positions(b: flatbuffers.Builder, domain: str, account: str, kind: int, body: int, ts: int) -> bytes:
+    d, acct = b.CreateString(domain), b.CreateString(account)
+    PositionsStream.Start(b)
+    PositionsStream.AddDomain(b, d)
+    PositionsStream.AddAccount(b, acct)
+    PositionsStream.AddTs(b, ts)
+    PositionsStream.AddEndTs(b, ts)
+    PositionsStream.AddPositionsType(b, kind)
+    PositionsStream.AddPositions(b, body)
+    return _finish(b, ServerResponseUnion.PositionsStream, PositionsStream.End(b))
+
+
+def positions_snapshot(domain: str, account: str, positions, *, ts: int = 0) -> bytes:
+    """`positions` are (symbol, account type, position) tuples."""
+    b = flatbuffers.Builder(64 + 40 * len(positions))
+    offs = []
+    for symbol, acct_type, pos in positions:
+        s = b.CreateString(symbol)
+        AccountPosition.Start(b)
+        AccountPosition.AddAccountType(b, acct_type)
+        AccountPosition.AddSymbol(b, s)
+        AccountPosition.AddPosition(b, pos)
+        AccountPosition.AddMovable(b, True)
+        offs.append(AccountPosition.End(b))
+    vec = _vector(b, PositionsSnapshot.StartPositionsVector, offs)
+    PositionsSnapshot.Start(b)
+    PositionsSnapshot.AddPositions(b, vec)
+    return _positions(b, domain, account, WsPositions.PositionsSnapshot, PositionsSnapshot.End(b), ts)
+
+
+# ----------------------------------------------------
+# Hot frames
+# ----------------------------------------------------
+# Acks, books, trades, fills and deltas go out on every replayed event, and
+# flatbuffers.Builder spends ~100-250us per frame on them. These are laid
+# out by hand instead (~10x faster): each table shape is packed with one
+# precomputed struct, children and then strings are written after their
+# parent so every uoffset points forward, and every table starts 8-aligned
+# so its int64 fields are too.
+_U32 = struct.Struct("<I")
+_WIDTH = {"q": 8, "o": 4, "b": 1, "B": 1, "?": 1}
+
+
+class _Shape:
+    """
+    Fixed layout of one table type, from (slot, kind) pairs declared widest
+    first; kind is a struct code ("q", "b", "B", "?") or "o" for an offset
+    that is linked after the table is written.
+    """
+    __slots__ = ("vtable", "body", "fields")
+
+    def __init__(self, *fields):
+        widths = [_WIDTH[k] for _, k in fields]
+        assert widths == sorted(widths, reverse=True), "declare wider fields first"
+        fmt, pos = "<i", 4
+        self.fields: dict[int, int] = {}
+        for slot, kind in fields:
+            pad = -pos % _WIDTH[kind]
+            fmt += "x" * pad
+            pos += pad
+            self.fields[slot] = pos
+            fmt += "I" if kind == "o" else kind
+            pos += _WIDTH[kind]
+        n = max(self.fields) + 1
+        self.vtable = struct.pack(f"<{n + 2}H", 4 + 2 * n, pos, *(self.fields.get(i, 0) for i in range(n)))
+        self.body = struct.Struct(fmt)
+
+
+_RESPONSE = _Shape((1, "o"), (0, "B"))
+_UUID_ONLY = _Shape((0, "o"))                        # SimpleSuccessResponse, OrderDeltasData, PositionDeltasData
+_ADD_ORDER = _Shape((1, "q"), (0, "o"), (6, "o"), (2, "b"))
+_L2 = _Shape((0, "o"), (1, "o"), (2, "o"), (3, "o"))
+_LEVEL = _Shape((0, "q"), (1, "q"), (2, "q"))
+_STREAM = _Shape((3, "q"), (4, "q"), (0, "o"), (1, "o"), (5, "o"), (2, "?"))   # TradesStream, FillsStream
+_TRADE = _Shape((0, "q"), (2, "q"), (3, "q"), (5, "q"), (1, "o"), (4, "b"))
+_FILL = _Shape((0, "q"), (1, "q"), (4, "q"), (5, "q"), (8, "q"), (2, "o"), (3, "o"), (6, "b"), (7, "?"))
+_ACCOUNT_STREAM = _Shape((2, "q"), (3, "q"), (0, "o"), (1, "o"), (5, "o"), (4, "B"))  # OpenOrders/PositionsStream
+_ORDER_DELTA = _Shape((0, "q"), (1, "q"), (5, "q"), (6, "q"), (2, "o"), (3, "?"), (4, "?"), (7, "b"))
+_POSITION_DELTA = _Shape((0, "q"), (3, "q"), (2, "o"), (1, "b"))
+
+
+class _Writer:
+    __slots__ = ("buf", "root", "_vtables", "_strings")
+
+    def __init__(self, kind: int):
+        self.buf = bytearray(4)
+        self._vtables: dict[_Shape, int] = {}
+        self._strings: dict[str, list[int]] = {}
+        self.root = self.table(_RESPONSE, 0, kind)
+
+    def table(self, shape: _Shape, *values) -> int:
+        buf = self.buf
+        vt = self._vtables.get(shape)
+        if vt is None:
+            buf += b"\0" * (len(buf) & 1)
+            vt = self._vtables[shape] = len(buf)
+            buf += shape.vtable
+        buf += b"\0" * (-len(buf) % 8)
+        pos = len(buf)
+        buf += shape.body.pack(pos - vt, *values)
+        return pos
+
+    def string(self, table: int, shape: _Shape, slot: int, s: str) -> None:
+        """Point a field at `s`; strings are written once each, after every table."""
+        self._strings.setdefault(s, []).append(table + shape.fields[slot])
+
+    def vector(self, n: int) -> int:
+        """An offset vector of n slots; fill them with link_item()."""
+        buf = self.buf
+        buf += b"\0" * (-len(buf) % 4)
+        pos = len(buf)
+        buf += _U32.pack(n) + bytes(4 * n)
+        return pos
+
+    def link(self, table: int, shape: _Shape, slot: int, target: int) -> None:
+        at = table + shape.fields[slot]
+        _U32.pack_into(self.buf, at, target - at)
+
+    def link_item(self, vector: int, i: int, target: int) -> None:
+        at = vector + 4 + 4 * i
+        _U32.pack_into(self.buf, at, target - at)
+
+    def finish(self, body: int) -> bytes:
+        buf = self.buf
+        _U32.pack_into(buf, 0, self.root)
+        self.link(self.root, _RESPONSE, 1, body)
+        for s, fields in self._strings.items():
+            data = s.encode()
+            buf += b"\0" * (-len(buf) % 4)
+            pos = len(buf)
+            buf += _U32.pack(len(data)) + data + b"\0"
+            for at in fields:
+                _U32.pack_into(buf, at, pos - at)
+        return bytes(buf)
+
+
+def simple_success(uuid: str) -> bytes:
+    w = _Writer(ServerResponseUnion.SimpleSuccessResponse)
+    body = w.table(_UUID_ONLY, 0)
+    w.string(body, _UUID_ONLY, 0, uuid)
+    return w.finish(body)
+
+
+def add_order_response(uuid: str, market: str, oid: int, side: int) -> bytes:
+    w = _Writer(ServerResponseUnion.AddOrderResponse)
+    body = w.table(_ADD_ORDER, oid, 0, 0, side)
+    w.string(body, _ADD_ORDER, 0, uuid)
+    w.string(body, _ADD_ORDER, 6, market)
+    return w.finish(body)
+
+
+def l2_book_stream(domain: str, market: str, bids, asks) -> bytes:
+    """`bids`/`asks` are (price, size, order count) tuples, best first."""
+    w = _Writer(ServerResponseUnion.L2BookStream)
+    body = w.table(_L2, 0, 0, 0, 0)
+    w.string(body, _L2, 0, domain)
+    w.string(body, _L2, 1, market)
+    for slot, levels in ((2, bids), (3, asks)):
+        vec = w.vector(len(levels))
+        w.link(body, _L2, slot, vec)
+        for i, (px, sz, n) in enumerate(levels):
+            w.link_item(vec, i, w.table(_LEVEL, px, sz, n))
+    return w.finish(body)
+
+
+def trades_stream(domain: str, market: str, trades, *, ts: int = 0, snapshot: bool = False) -> bytes:
+    """`trades` are (price, size, taker side, time) tuples, oldest first."""
+    w = _Writer(ServerResponseUnion.TradesStream)
+    body = w.table(_STREAM, ts, ts, 0, 0, 0, snapshot)
+    w.string(body, _STREAM, 0, domain)
+    w.string(body, _STREAM, 1, market)
+    vec = w.vector(len(trades))
+    w.link(body, _STREAM, 5, vec)
+    for i, (px, sz, side, t) in enumerate(trades):
+        trade = w.table(_TRADE, t, px, sz, t, 0, side)
+        w.string(trade, _TRADE, 1, market)
+        w.link_item(vec, i, trade)
+    return w.finish(body)
+
+
+def fills_stream(domain: str, account: str, fills, *, ts: int = 0, snapshot: bool = False) -> bytes:
+    """`fills` are (market, oid, price, size, side, is_taker, time) tuples."""
+    w = _Writer(ServerResponseUnion.FillsStream)
+    body = w.table(_STREAM, ts, ts, 0, 0, 0, snapshot)
+    w.string(body, _STREAM, 0, domain)
+    w.string(body, _STREAM, 1, account)
+    vec = w.vector(len(fills))
+    w.link(body, _STREAM, 5, vec)
+    for i, (market, oid, px, sz, side, is_taker, t) in enumerate(fills):
+        fill = w.table(_FILL, t, oid, px, sz, t, 0, 0, side, is_taker)
+        w.string(fill, _FILL, 2, account)
+        w.string(fill, _FILL, 3, market)
+        w.link_item(vec, i, fill)
+    return w.finish(body)
+
+
+def _account_stream(kind: int, domain: str, account: str, body_kind: int, ts: int) -> tuple[_Writer, int, int]:
+    """OpenOrdersStream/PositionsStream header; returns the writer, stream and the deltas table."""
+    w = _Writer(kind)
+    stream = w.table(_ACCOUNT_STREAM, ts, ts, 0, 0, 0, body_kind)
+    w.string(stream, _ACCOUNT_STREAM, 0, domain)
+    w.string(stream, _ACCOUNT_STREAM, 1, account)
+    data = w.table(_UUID_ONLY, 0)
+    w.link(stream, _ACCOUNT_STREAM, 5, data)
+    return w, stream, data
+
+
+def order_deltas(domain: str, account: str, deltas, *, ts: int = 0) -> bytes:
+    """`deltas` are (market, oid, price, new size, side, is_add, is_remove) tuples."""
+    w, stream, data = _account_stream(ServerResponseUnion.OpenOrdersStream, domain, account,
+                                      WsOpenOrders.OrderDeltasData, ts)
+    vec = w.vector(len(deltas))
+    w.link(data, _UUID_ONLY, 0, vec)
+    for i, (market, oid, px, sz, side, is_add, is_remove) in enumerate(deltas):
+        delta = w.table(_ORDER_DELTA, ts, oid, px, sz, 0, is_add, is_remove, side)
+        w.string(delta, _ORDER_DELTA, 2, market)
+        w.link_item(vec, i, delta)
+    return w.finish(stream)
+
+
+def position_deltas(domain: str, account: str, deltas, *, ts: int = 0) -> bytes:
+    """`deltas` are (symbol, account type, delta) tuples."""
+    w, stream, data = _account_stream(ServerResponseUnion.PositionsStream, domain, account,
+                                      WsPositions.PositionDeltasData, ts)
+    vec = w.vector(len(deltas))
+    w.link(data, _UUID_ONLY, 0, vec)
+    for i, (symbol, acct_type, delta) in enumerate(deltas):
+        row = w.table(_POSITION_DELTA, ts, delta, 0, acct_type)
+        w.string(row, _POSITION_DELTA, 2, symbol)
+        w.link_item(vec, i, row)
+    return w.finish(stream)
@@ -0,0 +1,241 @@
+"""
+Concurrent startup with readiness gating.
+
+    startup = Startup(client, markets)      # before start_client(), like LocalBook
+    ...                                     # main: start_client(), subscribe_market(m) for each m
+    await startup.wait_ready()              # trade_handler: first book of every market is in
+
+The client's subscribe_market() sends a market's two subscriptions and then
+polls until every outstanding subscription is acknowledged, so a loop over
+the markets costs one round trip per market. Startup wraps it on the
+instance (as instrument.Instrumentation does with the order calls): the
+first call subscribes every market in `markets` at once and later calls
+for those markets just wait for that to finish. Bots whose main() loops
+over subscribe_market() go from N round trips to one without changing
+main().
+
+A market is ready once its first L2 book snapshot arrives, the account
+once its positions and open orders snapshots have; wait_ready() returns
+as soon as both are, or after `timeout`, and report() gives each market's
+time to ready from the start_client() call.
+
+AckWaiter does the same for a bare connection (persistence.WSClient, whose
+request() uses it): send every request at once, then wait on the
+acknowledgements by uuid.
+"""
+import asyncio
+import functools
+import time
+from typing import Iterable, Optional
+
+from huqt_oracle_pysdk import OracleClient
+from huqt_oracle_pysdk.fbs_gen.gateway.ErrorMessage import ErrorMessage
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponse import ServerResponse
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+from huqt_oracle_pysdk.fbs_gen.gateway.SimpleSuccessResponse import SimpleSuccessResponse
+from huqt_oracle_pysdk.fbs_gen.gateway.SubscriptionResponse import SubscriptionResponse
+
+from client_tap import tap
+from trade_decode import peek_response
+
+READY_TIMEOUT = 5.0     # seconds
+ACCOUNT = "account"
+
+
+class Startup:
+    def __init__(self, client: OracleClient, markets: Optional[Iterable[str]] = None, *,
+                 timeout: float = READY_TIMEOUT):
+        self.client = client
+        self.markets = list(markets or [])
+        self.timeout = timeout
+        self.started: Optional[float] = None
+        self.session: Optional[float] = None        # seconds start_client() took
+        self.ready_at: dict[str, float] = {}        # market (or ACCOUNT) -> seconds from start
+        self._account_frames: set[int] = set()
+        self._events: dict[str, asyncio.Event] = {}
+        self._subscribing: dict[str, asyncio.Future] = {}
+
+        self._start_client = client.start_client
+        self._subscribe_market = client.subscribe_market
+
+        @functools.wraps(self._start_client)
+        async def start_client(*args, **kwargs):
+            return await self._timed_start(*args, **kwargs)
+
+        @functools.wraps(self._subscribe_market)
+        async def subscribe_market(market: str):
+            return await self._subscribe_one(market)
+
+        client.start_client = start_client
+        client.subscribe_market = subscribe_market
+        tap(client, self._on_frame)
+
+    # ----------------------------------------------------
+    # Subscribing
+    # ----------------------------------------------------
+    async def _timed_start(self, *args, **kwargs):
+        self.started = time.perf_counter()
+        try:
+            return await self._start_client(*args, **kwargs)
+        finally:
+            self.session = time.perf_counter() - self.started
+
+    async def _subscribe_one(self, market: str):
+        if market not in self._subscribing:
+            await self.subscribe([market] if market not in self.markets else self.markets)
+        await self._subscribing[market]
+
+    async def subscribe(self, markets: Iterable[str]) -> None:
+        """Subscribe every market not already subscribed, all at once."""
+        todo = [m for m in markets if m not in self._subscribing]
+        for m in todo:
+            if m not in self.markets:
+                self.markets.append(m)
+            self._subscribing[m] = asyncio.get_running_loop().create_future()
+        results = await asyncio.gather(*(self._subscribe_market(m) for m in todo), return_exceptions=True)
+        for m, result in zip(todo, results):
+            if isinstance(result, BaseException):
+                self._subscribing[m].set_exception(result)
+                # Retrieved here so an unawaited failure does not warn at exit
+                self._subscribing[m].exception()
+            else:
+                self._subscribing[m].set_result(None)
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if failed:
+            raise failed[0]
+
+    def subscribed(self, market: str) -> bool:
+        """Whether subscribing `market` has finished without an error."""
+        fut = self._subscribing.get(market)
+        return fut is not None and fut.done() and not fut.cancelled() and fut.exception() is None
+
+    # ----------------------------------------------------
+    # Readiness
+    # ----------------------------------------------------
+    def _event(self, key: str) -> asyncio.Event:
+        event = self._events.get(key)
+        if event is None:
+            event = self._events[key] = asyncio.Event()
+            if key in self.ready_at:
+                event.set()
+        return event
+
+    def _mark(self, key: str) -> None:
+        if key in self.ready_at:
+            return
+        self.ready_at[key] = time.perf_counter() - (self.started or time.perf_counter())
+        event = self._events.get(key)
+        if event is not None:
+            event.set()
+
+    def _on_frame(self, kind: int, market: Optional[str], msg: bytes) -> None:
+        if kind == ServerResponseUnion.L2BookStream and market is not None:
+            if market not in self.ready_at:
+                self._mark(market)
+        elif ACCOUNT not in self.ready_at and kind in (ServerResponseUnion.PositionsStream,
+                                                       ServerResponseUnion.OpenOrdersStream):
+            self._account_frames.add(kind)
+            if len(self._account_frames) == 2:
+                self._mark(ACCOUNT)
+
+    def is_ready(self, market: str) -> bool:
+        return market in self.ready_at
+
+    async def wait_ready(self, markets: Optional[Iterable[str]] = None,
+                         timeout: Optional[float] = None) -> list[str]:
+        """
+        Wait for the account and every market's first book, at most
+        `timeout` seconds. Prints the report; returns what is still not ready.
+        """
+        keys = [ACCOUNT, *(self.markets if markets is None else markets)]
+        timeout = self.timeout if timeout is None else timeout
+        waits = [self._event(k).wait() for k in keys if k not in self.ready_at]
+        if waits:
+            try:
+                await asyncio.wait_for(asyncio.gather(*waits), timeout)
+            except asyncio.TimeoutError:
+                pass
+        missing = [k for k in keys if k not in self.ready_at]
+        print(self.log_line(keys))
+        if missing:
+            print(f"\033[1;33m[startup] not ready after {timeout:g}s: {', '.join(missing)}\033[0m")
+        return missing
+
+    def report(self) -> dict:
+        """Seconds from start_client() to ready, per market and for the account."""
+        return {
+            "session": self.session,
+            "ready": dict(self.ready_at),
+            "all": max(self.ready_at.values()) if self.ready_at else None,
+        }
+
+    def log_line(self, keys: Optional[Iterable[str]] = None) -> str:
+        keys = list(keys) if keys is not None else [ACCOUNT, *self.markets]
+        ms = lambda s: "-" if s is None else f"{s * 1000:.0f}ms"
+        parts = [f"{k}={ms(self.ready_at.get(k))}" for k in keys]
+        ready = [self.ready_at[k] for k in keys if k in self.ready_at]
+        total = ms(max(ready)) if len(ready) == len(keys) else "incomplete"
+        return f"🚀 [startup] ready in {total} (session {ms(self.session)}): {' '.join(parts)}"
+
+
+class AckWaiter:
+    """
+    Futures for request acknowledgements on a bare connection, keyed by the
+    uuid each request's to_bytes() returned. Put on_frame() in front of the
+    message handler; it consumes acknowledgements and passes the rest on.
+    """
+    def __init__(self):
+        self._pending: dict[str, asyncio.Future] = {}
+        self.sent: dict[str, float] = {}
+        self.acked: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+
+    def expect(self, uuid: str) -> asyncio.Future:
+        fut = self._pending[uuid] = asyncio.get_running_loop().create_future()
+        self.sent[uuid] = time.perf_counter()
+        # A request sent again (after a reconnect) needs a fresh ack
+        self.acked.pop(uuid, None)
+        self.errors.pop(uuid, None)
+        return fut
+
+    def on_frame(self, msg: bytes) -> bool:
+        """True if `msg` was an acknowledgement someone is waiting on."""
+        if not self._pending:
+            return False
+        kind, _ = peek_response(msg)
+        if kind == ServerResponseUnion.SubscriptionResponse:
+            body = SubscriptionResponse()
+        elif kind == ServerResponseUnion.SimpleSuccessResponse:
+            body = SimpleSuccessResponse()
+        elif kind == ServerResponseUnion.ErrorMessage:
+            body = ErrorMessage()
+        else:
+            return False
+        tbl = ServerResponse.GetRootAs(msg, 0).Response()
+        body.Init(tbl.Bytes, tbl.Pos)
+        uuid = body.Uuid().decode() if body.Uuid() else None
+        fut = self._pending.pop(uuid, None)
+        if fut is None:
+            return False
+        if kind == ServerResponseUnion.ErrorMessage:
+            self.errors[uuid] = body.Message().decode()
+            print(f"\033[1;33m[Warning]\033[0m request {uuid} failed from '{self.errors[uuid]}'")
+        else:
+            self.acked[uuid] = time.perf_counter()
+        if not fut.done():
+            fut.set_result(None)
+        return True
+
+    async def wait(self, uuids: Iterable[str], timeout: float = READY_TIMEOUT) -> list[str]:
+        """Wait for every uuid at most `timeout` seconds; returns the ones not acknowledged (or refused)."""
+        uuids = list(uuids)
+        futs = [self._pending[u] for u in uuids if u in self._pending]
+        if futs:
+            await asyncio.wait(futs, timeout=timeout)
+        return [u for u in uuids if u not in self.acked]
+
+    def latency(self, uuid: str) -> Optional[float]:
+        """Seconds from expect() to the acknowledgement."""
+        if uuid not in self.acked:
+            return None
+        return self.acked[uuid] - self.sent[uuid]
@@ -0,0 +1,155 @@
+"""
+Parameter sweep for the winner bot and gui.py's market maker over a
+replayed session (see replay.py and bench_replay.py).
+
+    python sweep.py winner                               # 32 random points
+    python sweep.py winner --samples 100 --seed 3
+    python sweep.py gui --grid spread=2,4,6 position_ub=10,20
+    python sweep.py winner chase_depth=4,8 --workers 4
+
+`name=v1,v2,...` narrows that parameter to the listed values; with --grid
+every combination is run, otherwise --samples points are drawn at random
+from the space. Each point is one replay in its own process (the bots keep
+their client and gateway in module globals). The session is saved once as
+.npy columns and memory-mapped read-only by every worker rather than
+pickled to each one, so workers only exchange parameters and results.
+"""
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from bench_replay import load_tape, run_one
+
+# Candidate values per parameter. Winner names are the bot's module-level
+# constants (min_spread/min_sell set every market they list); gui's are
+# MarketConfig fields, with fair as an offset from each market's open.
+SPACES = {
+    "winner": {
+        "min_spread": [2, 3, 4, 5],
+        "min_sell": [0, 250, 500],
+        "narrow_size": [2, 3, 4],
+        "wide_size": [4, 5, 8],
+        "chase_depth": [4, 8, 12, 16],
+        "join_depth": [10, 20, 40],
+        "budget_cap": [1800, 3600, 7200],
+    },
+    "gui": {
+        "fair_offset": [-2, -1, 0, 1, 2],
+        "spread": [2, 3, 4, 6, 8],
+        "position_ub": [10, 20, 40],
+        "position_lb": [0, 5],
+    },
+}
+DEFAULT_SAMPLES = 32
+
+
+def grid(space: dict[str, list]) -> list[dict]:
+    names = list(space)
+    return [dict(zip(names, combo)) for combo in itertools.product(*space.values())]
+
+
+def sample(space: dict[str, list], n: int, seed: int = 0) -> list[dict]:
+    """Up to n distinct random points (fewer if the space is smaller)."""
+    rng = random.Random(seed)
+    total = 1
+    for values in space.values():
+        total *= len(values)
+    seen, points = set(), []
+    while len(points) < min(n, total):
+        point = tuple(rng.choice(values) for values in space.values())
+        if point not in seen:
+            seen.add(point)
+            points.append(dict(zip(space, point)))
+    return points
+
+
+def _run(strategy: str, params: dict, tape_dir: str) -> dict:
+    result = run_one(strategy, params=params, tape_dir=tape_dir)
+    result["params"] = params
+    # The worker process is fresh per point, so this covers imports too
+    result["cpu_seconds"] = time.process_time()
+    return result
+
+
+def sweep(strategy: str, points: list[dict], workers: Optional[int] = None) -> tuple[list[dict], float]:
+    """Replay every point; returns the results best PnL first and the wall time."""
+    workers = workers or os.cpu_count() or 1
+    # Same hash seed everywhere, so a point replays identically in any worker
+    os.environ["PYTHONHASHSEED"] = "0"
+    ctx = multiprocessing.get_context("spawn")
+    tape, source = load_tape()
+    print(f"{strategy}: {len(points)} points on {workers} workers, {source} session of "
+          f"{len(tape)} trades ({tape.duration / 3600:.2f}h)")
+
+    results = []
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="sweep-tape-") as tape_dir:
+        tape.save(tape_dir)
+        del tape
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=ctx, max_tasks_per_child=1) as pool:
+            futures = [pool.submit(_run, strategy, p, tape_dir) for p in points]
+            for i, fut in enumerate(concurrent.futures.as_completed(futures), 1):
+                r = fut.result()
+                results.append(r)
+                print(f"  [{i}/{len(points)}] pnl {r['pnl']:>7d}  {r['params']}")
+    wall = time.perf_counter() - start
+    results.sort(key=lambda r: r["pnl"], reverse=True)
+    return results, wall
+
+
+def print_table(results: list[dict], wall: float, workers: int, top: Optional[int] = None) -> None:
+    names = list(results[0]["params"]) if results else []
+    widths = [max(len(n), 5) for n in names]
+    header = f"{'#':>3} {'pnl':>8} {'fills':>6} {'reqs':>6} " + " ".join(f"{n:>{w}}" for n, w in zip(names, widths))
+    print(header)
+    for rank, r in enumerate(results[:top], 1):
+        cells = " ".join(f"{str(r['params'][n]):>{w}}" for n, w in zip(names, widths))
+        print(f"{rank:3d} {r['pnl']:8d} {r['fills']:6d} {r['requests']:6d} {cells}")
+    # CPU seconds of all replays over wall time: how many cores the sweep kept busy
+    cpu = sum(r["cpu_seconds"] for r in results)
+    print(f"{len(results)} replays in {wall:.1f}s on {workers} workers ({os.cpu_count()} cores): "
+          f"{cpu:.1f} CPU s, {cpu / max(wall, 1e-9):.2f}x a single process "
+          f"({cpu / max(len(results), 1):.1f}s per replay)")
+
+
+def parse(args: list[str]) -> tuple[str, dict]:
+    strategy, opts = None, {"grid": False, "samples": DEFAULT_SAMPLES, "seed": 0, "workers": None, "top": None}
+    narrow = {}
+    it = iter(args)
+    for a in it:
+        if a == "--grid":
+            opts["grid"] = True
+        elif a in ("--samples", "--seed", "--workers", "--top"):
+            opts[a[2:]] = int(next(it))
+        elif "=" in a:
+            name, values = a.split("=", 1)
+            narrow[name] = [int(v) for v in values.split(",")]
+        else:
+            strategy = a
+    if strategy not in SPACES:
+        sys.exit(f"usage: python sweep.py {{{'|'.join(SPACES)}}} [name=v1,v2 ...] "
+                 f"[--grid | --samples N] [--seed S] [--workers N] [--top K]")
+    unknown = set(narrow) - set(SPACES[strategy])
+    if unknown:
+        sys.exit(f"unknown {strategy} parameters: {', '.join(sorted(unknown))}")
+    opts["space"] = {**SPACES[strategy], **narrow}
+    return strategy, opts
+
+
+def main(args: list[str]) -> None:
+    strategy, opts = parse(args)
+    space = opts["space"]
+    points = grid(space) if opts["grid"] else sample(space, opts["samples"], opts["seed"])
+    workers = opts["workers"] or os.cpu_count() or 1
+    results, wall = sweep(strategy, points, workers)
+    print_table(results, wall, workers, opts["top"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,141 @@
+"""
+Zero-copy decoder for TradesStream frames.
+
+The generated FlatBuffers classes build one Python object per Trade and read
+each field through several method calls. For the trade logs we only need
+Px/Sz/TakerSide/Time, so this decoder walks the FlatBuffers layout directly:
+the received bytes are wrapped (never copied into a bytearray), the trades
+vector offsets are read as one NumPy array and every field is gathered for
+all trades of the frame at once into a preallocated TRADE_DTYPE array.
+"""
+import sys
+import struct
+from typing import Optional
+
+import numpy as np
+
+from trade_store import TRADE_DTYPE
+
+from huqt_oracle_pysdk.fbs_gen.gateway.ServerResponseUnion import ServerResponseUnion
+
+_u32 = struct.Struct("<I").unpack_from
+_i32 = struct.Struct("<i").unpack_from
+_u16 = struct.Struct("<H").unpack_from
+
+# Field slots from the gateway schema
+_SR_RESPONSE_TYPE, _SR_RESPONSE = 0, 1
+_TS_MARKET, _TS_IS_SNAPSHOT, _TS_TRADES = 1, 2, 5
+_TRADE_FIELDS = (
+    # column, slot, dtype
+    ("price", 2, np.dtype("<i8")),
+    ("size", 3, np.dtype("<i8")),
+    ("side", 4, np.dtype("<i1")),
+    ("time", 5, np.dtype("<i8")),
+)
+
+
+def _field(buf, table: int, slot: int) -> int:
+    """Absolute position of a scalar/offset field of `table`, or 0 if absent."""
+    vt = table - _i32(buf, table)[0]
+    voff = 4 + 2 * slot
+    if voff >= _u16(buf, vt)[0]:
+        return 0
+    o = _u16(buf, vt + voff)[0]
+    return table + o if o else 0
+
+
+def _gather(raw: np.ndarray, pos: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Read one little-endian `dtype` value at each byte position in `pos`."""
+    idx = pos[:, None] + np.arange(dtype.itemsize)
+    return raw[idx].view(dtype).ravel()
+
+
+_market_names: dict[bytes, str] = {}
+
+def _market_name(buf, pos: int) -> str:
+    n = _u32(buf, pos)[0]
+    key = bytes(buf[pos + 4:pos + 4 + n])
+    name = _market_names.get(key)
+    if name is None:
+        name = _market_names[key] = sys.intern(key.decode("utf-8"))
+    return name
+
+
+def peek_response(msg: bytes) -> tuple[int, Optional[str]]:
+    """
+    (response type, market) of a ServerResponse without decoding the body.
+    The market is only read for TradesStream and L2BookStream, which both keep
+    it in field slot 1; it is None for every other response.
+    """
+    buf = memoryview(msg)
+    root = _u32(buf, 0)[0]
+    p = _field(buf, root, _SR_RESPONSE_TYPE)
+    kind = buf[p] if p else ServerResponseUnion.NONE
+    if kind not in (ServerResponseUnion.TradesStream, ServerResponseUnion.L2BookStream):
+        return kind, None
+    p = _field(buf, root, _SR_RESPONSE)
+    body = p + _u32(buf, p)[0]
+    p = _field(buf, body, _TS_MARKET)
+    return kind, _market_name(buf, p + _u32(buf, p)[0]) if p else None
+
+
+class TradesFrameDecoder:
+    """
+    decode(msg) returns (market, trades) for TradesStream frames and None for
+    every other response type. `trades` is a view into a buffer that is reused
+    by the next decode() call, so copy it if it has to outlive the frame.
+    `snapshot` tells whether the last frame decoded was the recent-trades
+    snapshot a subscription starts with.
+    """
+    def __init__(self, capacity: int = 256):
+        self._out = np.zeros(capacity, dtype=TRADE_DTYPE)
+        self.snapshot = False
+
+    def decode(self, msg: bytes) -> Optional[tuple[str, np.ndarray]]:
+        buf = memoryview(msg)
+        root = _u32(buf, 0)[0]
+
+        p = _field(buf, root, _SR_RESPONSE_TYPE)
+        if not p or buf[p] != ServerResponseUnion.TradesStream:
+            return None
+        p = _field(buf, root, _SR_RESPONSE)
+        ts = p + _u32(buf, p)[0]
+
+        p = _field(buf, ts, _TS_MARKET)
+        market = _market_name(buf, p + _u32(buf, p)[0]) if p else None
+        p = _field(buf, ts, _TS_IS_SNAPSHOT)
+        self.snapshot = bool(p and buf[p])
+
+        p = _field(buf, ts, _TS_TRADES)
+        if not p:
+            return market, self._out[:0]
+        vec = p + _u32(buf, p)[0]
+        n = _u32(buf, vec)[0]
+        if n > len(self._out):
+            self._out = np.zeros(max(n, 2 * len(self._out)), dtype=TRADE_DTYPE)
+        out = self._out[:n]
+        if n == 0:
+            return market, out
+
+        raw = np.frombuffer(msg, dtype=np.uint8)
+        elems = vec + 4 + 4 * np.arange(n, dtype=np.int64)
+        tables = elems + np.frombuffer(msg, dtype="<u4", count=n, offset=vec + 4)
+        vtables = tables - _gather(raw, tables, np.dtype("<i4"))
+
+        # Trades written by one builder share a handful of vtables, so field
+        # offsets are resolved once per distinct vtable
+        uniq, inverse = np.unique(vtables, return_inverse=True)
+        for column, slot, dtype in _TRADE_FIELDS:
+            offsets = np.zeros(len(uniq), dtype=np.int64)
+            for i, vt in enumerate(uniq.tolist()):
+                voff = 4 + 2 * slot
+                if voff < _u16(buf, vt)[0]:
+                    offsets[i] = _u16(buf, vt + voff)[0]
+            field = offsets[inverse]
+            present = field != 0
+            if present.all():
+                out[column] = _gather(raw, tables + field, dtype)
+            else:
+                out[column] = 0
+                out[column][present] = _gather(raw, (tables + field)[present], dtype)
+        return market, out
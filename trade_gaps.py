@@ -0,0 +1,83 @@
+"""
+Per-market trade cursors, for stitching a trade stream back together after
+a reconnect.
+
+Trades carry no sequence number, so a market's cursor is the time of the
+last trade seen plus how many trades at that time were seen. Resubscribing
+to a market starts with a snapshot of its recent trades; backfill() keeps
+the ones past the cursor, which are the trades that happened while the
+connection was down. If even the oldest trade of the snapshot is past the
+cursor, the snapshot may not reach back far enough and the stream has a
+gap: it is counted, with how long it spans, since those trades are gone.
+"""
+from typing import Union
+
+import numpy as np
+
+Trades = Union[np.ndarray, list]
+
+
+def _times(trades: Trades) -> np.ndarray:
+    if isinstance(trades, np.ndarray):
+        return trades["time"]
+    return np.fromiter((t["time"] for t in trades), np.int64, len(trades))
+
+
+class TradeGapTracker:
+    def __init__(self):
+        # market -> (time of the last trade, trades seen at that time)
+        self._cursor: dict[str, tuple[int, int]] = {}
+        self.recovered = 0
+        self.gaps = 0
+        self.gap_time = 0                   # summed span of the gaps, in trade time units
+        self.by_market: dict[str, int] = {}     # market -> trades recovered
+
+    def advance(self, market: str, trades: Trades) -> None:
+        """Live trades: move the cursor past them."""
+        if not len(trades):
+            return
+        t = _times(trades)
+        last = int(t[-1])
+        seen = int(np.count_nonzero(t == last))
+        prev = self._cursor.get(market)
+        if prev is not None and prev[0] == last and seen == len(t):
+            seen += prev[1]
+        self._cursor[market] = (last, seen)
+
+    def backfill(self, market: str, trades: Trades) -> Trades:
+        """
+        A recent-trades snapshot: returns the trades in it that were not seen
+        yet, oldest first. The first snapshot of a market is all new.
+        """
+        prev = self._cursor.get(market)
+        if prev is None:
+            self.advance(market, trades)
+            return trades
+        if not len(trades):
+            return trades
+        t = _times(trades)
+        at, seen = prev
+        if t[0] > at:
+            self.gaps += 1
+            self.gap_time += int(t[0]) - at
+        keep = t > at
+        same = np.flatnonzero(t == at)
+        keep[same[seen:]] = True
+        if isinstance(trades, np.ndarray):
+            new = trades[keep]
+        else:
+            new = [tr for tr, k in zip(trades, keep) if k]
+        if len(new):
+            self.recovered += len(new)
+            self.by_market[market] = self.by_market.get(market, 0) + len(new)
+            self.advance(market, new)
+        return new
+
+    def stats(self) -> dict:
+        return {
+            "markets": len(self._cursor),
+            "recovered": self.recovered,
+            "gaps": self.gaps,
+            "gap_time": self.gap_time,
+            "by_market": dict(self.by_market),
+        }
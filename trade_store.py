@@ -0,0 +1,301 @@
+"""
+Append-only columnar trade store.
+
+Each market lives in its own directory with one fixed-width file per column
+and a small index file:
+
+    {root}/{market}/time.i8     int64   trade time
+    {root}/{market}/price.i4    int32   price
+    {root}/{market}/size.i4     int32   size
+    {root}/{market}/side.u1     uint8   taker side (0 = buy, 1 = sell)
+    {root}/{market}/index.bin   header + sparse time index
+
+The header records how many rows are committed, so a reader never sees a
+partially written row, and a sparse index holding the time of every
+`INDEX_STRIDE`-th row. Columns are opened with numpy.memmap, so range scans
+by time are zero-copy slices of the mapped files.
+
+Convert the existing JSON-lines logs with:
+
+    python trade_store.py import logs store
+"""
+import os
+import sys
+import json
+import struct
+from typing import Optional
+
+import numpy as np
+
+COLUMNS = {
+    "time": np.dtype("<i8"),
+    "price": np.dtype("<i4"),
+    "size": np.dtype("<i4"),
+    "side": np.dtype("u1"),
+}
+COLUMN_FILES = {
+    "time": "time.i8",
+    "price": "price.i4",
+    "size": "size.i4",
+    "side": "side.u1",
+}
+TRADE_DTYPE = np.dtype([(name, dtype) for name, dtype in COLUMNS.items()])
+
+MAGIC = b"HUQTTRD1"
+VERSION = 1
+INDEX_STRIDE = 4096
+# magic, version, flags, rows, first time, last time, index stride, index entries
+_HEADER = struct.Struct("<8sHHqqqII")
+_FLAG_UNSORTED = 1
+
+
+class _Header:
+    __slots__ = ("rows", "first_time", "last_time", "unsorted", "index")
+
+    def __init__(self):
+        self.rows = 0
+        self.first_time = 0
+        self.last_time = 0
+        self.unsorted = False
+        self.index = np.empty(0, dtype="<i8")
+
+    @classmethod
+    def read(cls, path: str) -> "_Header":
+        h = cls()
+        if not os.path.exists(path):
+            return h
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, version, flags, rows, first, last, stride, n_index = _HEADER.unpack_from(raw, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} trade store index")
+        if stride != INDEX_STRIDE:
+            raise ValueError(f"{path} uses index stride {stride}, expected {INDEX_STRIDE}")
+        h.rows, h.first_time, h.last_time = rows, first, last
+        h.unsorted = bool(flags & _FLAG_UNSORTED)
+        h.index = np.frombuffer(raw, dtype="<i8", count=n_index, offset=_HEADER.size).copy()
+        return h
+
+    def write(self, path: str, fsync: bool = False) -> None:
+        flags = _FLAG_UNSORTED if self.unsorted else 0
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, flags, self.rows, self.first_time,
+                                 self.last_time, INDEX_STRIDE, len(self.index)))
+            f.write(self.index.tobytes())
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def truncate(self, rows: int, times: np.ndarray) -> None:
+        """Commit only the first `rows` rows; `times` is the time column."""
+        self.rows = rows
+        self.index = self.index[:-(-rows // INDEX_STRIDE)]
+        if rows:
+            self.last_time = int(times[rows - 1])
+        else:
+            self.first_time = self.last_time = 0
+
+
+class MarketColumns:
+    """Read-only memory-mapped view of one market's committed rows."""
+    def __init__(self, path: str):
+        self.path = path
+        self.header = _Header.read(os.path.join(path, "index.bin"))
+        n = self.header.rows
+        for name, dtype in COLUMNS.items():
+            if n:
+                col = np.memmap(os.path.join(path, COLUMN_FILES[name]), dtype=dtype, mode="r", shape=(n,))
+            else:
+                col = np.empty(0, dtype=dtype)
+            setattr(self, name, col)
+
+    def __len__(self) -> int:
+        return self.header.rows
+
+    def range(self, start_time: Optional[int] = None, end_time: Optional[int] = None) -> slice:
+        """Row slice covering start_time <= time < end_time."""
+        if self.header.unsorted:
+            raise ValueError(f"{self.path} was appended out of time order, use a mask instead")
+        lo = 0 if start_time is None else self._search(start_time)
+        hi = len(self) if end_time is None else self._search(end_time)
+        return slice(lo, hi)
+
+    def scan(self, start_time: Optional[int] = None, end_time: Optional[int] = None) -> dict[str, np.ndarray]:
+        """Zero-copy column views for start_time <= time < end_time."""
+        s = self.range(start_time, end_time)
+        return {name: getattr(self, name)[s] for name in COLUMNS}
+
+    def _search(self, t: int) -> int:
+        # Narrow to one stride with the sparse index, then bisect inside it
+        block = int(np.searchsorted(self.header.index, t, side="left")) - 1
+        lo = max(block, 0) * INDEX_STRIDE
+        hi = min(lo + INDEX_STRIDE + 1, len(self)) if block >= 0 else min(INDEX_STRIDE, len(self))
+        return lo + int(np.searchsorted(self.time[lo:hi], t, side="left"))
+
+
+def _file_rows(path: str, dtype: np.dtype) -> int:
+    return os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+
+
+class _MarketWriter:
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.header = _Header.read(os.path.join(path, "index.bin"))
+        # After a crash the header can count rows whose column bytes never
+        # reached disk: only an fsynced flush orders the two
+        held = min(_file_rows(os.path.join(path, COLUMN_FILES[name]), dtype) for name, dtype in COLUMNS.items())
+        if held < self.header.rows:
+            times = np.fromfile(os.path.join(path, COLUMN_FILES["time"]), dtype=COLUMNS["time"], count=held)
+            self.header.truncate(held, times)
+        self.files = {}
+        for name, dtype in COLUMNS.items():
+            f = open(os.path.join(path, COLUMN_FILES[name]), "ab", buffering=1 << 16)
+            # Drop any rows written after the last committed header
+            f.truncate(self.header.rows * dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            self.files[name] = f
+        self.dirty = False
+
+    def append(self, columns: dict[str, np.ndarray]) -> int:
+        times = columns["time"]
+        n = len(times)
+        if n == 0:
+            return 0
+        for name, dtype in COLUMNS.items():
+            self.files[name].write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+        h = self.header
+        if n > 1 and np.any(np.diff(times) < 0):
+            h.unsorted = True
+        if h.rows and times[0] < h.last_time:
+            h.unsorted = True
+        if h.rows == 0:
+            h.first_time = int(times[0])
+        h.last_time = int(times[-1])
+
+        # Record the time of every INDEX_STRIDE-th row
+        first_entry = -(-h.rows // INDEX_STRIDE) * INDEX_STRIDE
+        picks = np.arange(first_entry, h.rows + n, INDEX_STRIDE) - h.rows
+        if len(picks):
+            h.index = np.concatenate([h.index, np.asarray(times)[picks].astype("<i8")])
+        h.rows += n
+        self.dirty = True
+        return n
+
+    def flush(self, fsync: bool = False) -> None:
+        if not self.dirty:
+            return
+        for f in self.files.values():
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        # The header is only made durable together with the columns it
+        # commits, so a durable row count never covers unsynced rows
+        self.header.write(os.path.join(self.path, "index.bin"), fsync)
+        self.dirty = False
+
+    def close(self) -> None:
+        self.flush(fsync=True)
+        for f in self.files.values():
+            f.close()
+
+
+def records_to_columns(records) -> dict[str, np.ndarray]:
+    """Convert JSON-log style trade dicts (or a TRADE_DTYPE array) to columns."""
+    if isinstance(records, np.ndarray):
+        return {name: records[name] for name in COLUMNS}
+    n = len(records)
+    return {
+        "time": np.fromiter((t["time"] for t in records), dtype="<i8", count=n),
+        "price": np.fromiter((t["price"] for t in records), dtype="<i4", count=n),
+        "size": np.fromiter((t["size"] for t in records), dtype="<i4", count=n),
+        "side": np.fromiter((0 if t["taker_side"] == "buy" else 1 for t in records), dtype="u1", count=n),
+    }
+
+
+class TradeStore:
+    def __init__(self, root: str = "store"):
+        self.root = root
+        self._writers: dict[str, _MarketWriter] = {}
+
+    def markets(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(m for m in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, m, "index.bin")))
+
+    def open(self, market: str) -> MarketColumns:
+        return MarketColumns(os.path.join(self.root, market))
+
+    def append(self, market: str, records) -> int:
+        w = self._writers.get(market)
+        if w is None:
+            w = self._writers[market] = _MarketWriter(os.path.join(self.root, market))
+        return w.append(records_to_columns(records))
+
+    def flush(self, fsync: bool = False) -> None:
+        for w in self._writers.values():
+            w.flush(fsync)
+
+    def close(self) -> None:
+        for w in self._writers.values():
+            w.close()
+        self._writers = {}
+
+
+class ColumnarSink:
+    """TradeLogWriter sink that appends to a TradeStore."""
+    def __init__(self, store: TradeStore):
+        self.store = store
+
+    def write(self, market: str, trades) -> int:
+        return self.store.append(market, trades)
+
+    def flush(self) -> None:
+        self.store.flush()
+
+    def fsync(self) -> None:
+        self.store.flush(fsync=True)
+
+    def close(self) -> None:
+        self.store.close()
+
+
+def import_json_logs(log_dir: str = "logs", store_root: str = "store", chunk: int = 65536) -> dict[str, int]:
+    """Append every logs/{market}.json file to the store. Returns rows per market."""
+    store = TradeStore(store_root)
+    imported = {}
+    try:
+        for name in sorted(os.listdir(log_dir)):
+            if not name.endswith(".json"):
+                continue
+            market = name[:-len(".json")]
+            if market in store.markets() and len(store.open(market)):
+                print(f"Skipping {market}: already in {store_root}")
+                continue
+            batch = []
+            total = 0
+            with open(os.path.join(log_dir, name)) as f:
+                for line in f:
+                    if line.strip():
+                        batch.append(json.loads(line))
+                    if len(batch) >= chunk:
+                        total += store.append(market, batch)
+                        batch = []
+            total += store.append(market, batch)
+            store.flush(fsync=True)
+            imported[market] = total
+            print(f"Imported {total} trades for {market}")
+    finally:
+        store.close()
+    return imported
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "import":
+        import_json_logs(*sys.argv[2:4])
+    else:
+        print("usage: python trade_store.py import [log_dir] [store_dir]")
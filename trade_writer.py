@@ -0,0 +1,202 @@
+import os
+import json
+import queue
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+
+class JsonLinesSink:
+    """
+    Appends trades to {directory}/{market}.json, one JSON object per line.
+    File handles stay open for the lifetime of the sink instead of being
+    reopened for every frame.
+    """
+    def __init__(self, directory: str = "logs"):
+        self.directory = directory
+        self._files = {}
+
+    def _file(self, market: str):
+        f = self._files.get(market)
+        if f is None:
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(os.path.join(self.directory, f"{market}.json"), "a", buffering=1 << 16)
+            self._files[market] = f
+        return f
+
+    def write(self, market: str, trades) -> int:
+        if isinstance(trades, np.ndarray):
+            trades = [
+                {"market": market, "price": px, "size": sz, "taker_side": "buy" if side == 0 else "sell", "time": t}
+                for px, sz, side, t in zip(trades["price"].tolist(), trades["size"].tolist(),
+                                           trades["side"].tolist(), trades["time"].tolist())
+            ]
+        self._file(market).write("".join(json.dumps(t) + "\n" for t in trades))
+        return len(trades)
+
+    def flush(self) -> None:
+        for f in self._files.values():
+            f.flush()
+
+    def fsync(self) -> None:
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def _merge(frames: list) -> list:
+    """Join queued frames (lists of dicts or structured arrays) into one batch per kind."""
+    arrays = [f for f in frames if isinstance(f, np.ndarray)]
+    lists = [t for f in frames if not isinstance(f, np.ndarray) for t in f]
+    merged = []
+    if arrays:
+        merged.append(arrays[0] if len(arrays) == 1 else np.concatenate(arrays))
+    if lists:
+        merged.append(lists)
+    return merged
+
+
+_STOP = object()
+
+class TradeLogWriter:
+    """
+    Dedicated writer stage for the trade logs.
+
+    A frame is either a list of trade dicts or a TRADE_DTYPE structured array
+    (see trade_decode.py).
+
+    The event loop only calls submit(), which never blocks: frames go on a
+    bounded queue and a background thread batches them per market, writes
+    them to the sink when `flush_trades` are pending or `flush_interval`
+    seconds have passed, and fsyncs every `fsync_interval` seconds
+    (None disables fsync, 0 fsyncs on every flush).
+
+    If the queue is full the frame is dropped and counted in `dropped`.
+    """
+    def __init__(self,
+                 sink=None,
+                 *,
+                 max_queue: int = 10000,
+                 flush_trades: int = 512,
+                 flush_interval: float = 0.5,
+                 fsync_interval: Optional[float] = 5.0):
+        self.sink = sink if sink is not None else JsonLinesSink()
+        self.flush_trades = flush_trades
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._pending: dict[str, list] = {}
+        self._pending_count = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="trade-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, market: str, trades) -> bool:
+        """Queue one frame worth of trades. Safe to call from the event loop."""
+        n = len(trades)
+        if n == 0:
+            return True
+        try:
+            self._queue.put_nowait((market, trades))
+        except queue.Full:
+            self.dropped += n
+            return False
+        self.queued += n
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Drain everything still queued, fsync and close the sink."""
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "backlog": self.queued - self.written - self._pending_count,
+            "pending": self._pending_count,
+            "alive": self.alive(),
+        }
+
+    def alive(self) -> bool:
+        """Whether the writer thread is running; if it died, submit() only fills the queue."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        now = time.monotonic()
+        last_flush = now
+        last_fsync = now
+        stopping = False
+
+        while not stopping:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # Drain whatever else is already waiting without blocking
+            while item is not None:
+                if item is _STOP:
+                    stopping = True
+                    break
+                market, trades = item
+                self._pending.setdefault(market, []).append(trades)
+                self._pending_count += len(trades)
+                if self._pending_count >= self.flush_trades:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            now = time.monotonic()
+            if stopping or self._pending_count >= self.flush_trades or now - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = now
+
+            if self.fsync_interval is not None and (stopping or now - last_fsync >= self.fsync_interval):
+                try:
+                    self.sink.fsync()
+                except OSError as e:
+                    print(f"⚠️ Trade log fsync failed: {e}")
+                last_fsync = now
+
+        self.sink.close()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        for market, frames in pending.items():
+            for trades in _merge(frames):
+                try:
+                    self.written += self.sink.write(market, trades)
+                except OSError as e:
+                    print(f"⚠️ Failed to write {len(trades)} trades for {market}: {e}")
+                    self.dropped += len(trades)
+        self._pending_count = 0
+        try:
+            self.sink.flush()
+        except OSError as e:
+            print(f"⚠️ Trade log flush failed: {e}")